@@ -3,7 +3,7 @@ control example
 """
 
 import logging
-from mecom import MeCom, ResponseException, WrongChecksum, LT_download_manager
+from mecom import MeComPool, ResponseException, WrongChecksum, LT_download_manager, LUT_DownloadEngine, RetryPolicy, Waveform
 from serial import SerialException
 import warnings
 import numpy as np
@@ -31,7 +31,8 @@ class BlueLDD(object):
     """
 
     def _tearDown(self):
-        self.session().stop()
+        self.session().release()
+        self._session = None
 
     def __init__(self, port="COM6", channel=1, queries=DEFAULT_QUERIES, *args, **kwars):
         assert channel in (1, 2)
@@ -39,11 +40,13 @@ class BlueLDD(object):
         self.port = port
         self.queries = queries
         self._session = None
+        self._lut_engine = None
         self._connect()
 
     def _connect(self):
-        # open session
-        self._session = MeCom(serialport=self.port,metype = 'LDD')
+        # open session, shared with the other channels and devices on the same port
+        # transient frame errors are retried instead of reopening the port
+        self._session = MeComPool.default().acquire(self.port,metype = 'LDD', retry=RetryPolicy())
         # get device address
         self.address = self._session.identify()
         logging.info("connected to {}".format(self.address))
@@ -55,14 +58,15 @@ class BlueLDD(object):
 
     def get_data(self):
         data = {}
-        for description in self.queries:
-            id, unit = COMMAND_TABLE[description]
-            try:
-                value = self.session().get_parameter(parameter_id=id, address=self.address, parameter_instance=self.channel)
-                data.update({description: (value, unit)})
-            except (ResponseException, WrongChecksum) as ex:
-                self.session().stop()
-                self._session = None
+        ids = [COMMAND_TABLE[description][0] for description in self.queries]
+        try:
+            # all queries are sent within one transaction
+            values = self.session().get_parameters(ids, address=self.address, parameter_instance=self.channel)
+            for description, value in zip(self.queries, values):
+                data.update({description: (value, COMMAND_TABLE[description][1])})
+        except (ResponseException, WrongChecksum) as ex:
+            # the port is reopened with the next query
+            self.session().invalidate()
         return data
     
     def single_sequence(self, get = False, set = None ):
@@ -101,16 +105,45 @@ class BlueLDD(object):
         else:
             print('There was an eror sending the command')
     
-    def download_lookup_table(self, file):
+    def download_lookup_table(self, file, progress=None):
         """
-        Downloads lookup table
+        Downloads lookup table, pages already on the device are skipped
         file: path (str)
-        table_instances: list 
+        progress: callable(bytes_done, bytes_total)
         """
-        DM = LT_download_manager(file, self.session())
+        DM = LT_download_manager(file, self.session(), engine=self._engine(progress))
         download = DM.download_table()
         
         return DM
+
+    def download_waveform(self, sequence, table_instance=1, progress=None, interval=None, limits=None):
+        """
+        Downloads a sequence (e.g. from pulses.py) or a Waveform as lookup table without writing a CSV file,
+        pages already on the device are skipped
+        sequence: array of float or Waveform
+        table_instance: int (1...4)
+        progress: callable(bytes_done, bytes_total)
+        interval: int. Table interval in us, required for a Waveform, which is checked and compiled for it
+        limits: (float, float). Min and max value of the table, required for a Waveform
+        """
+        if isinstance(sequence, Waveform):
+            assert interval is not None, "a Waveform needs the table interval"
+            assert limits is not None, "a Waveform needs the limits of the table values"
+            image = sequence.compile(interval, limits)
+            if not all(self.set_lookup_table_setings(Interval=interval).values()):
+                raise ResponseException("the table interval of {} us was not set".format(interval))
+            return self._engine(progress).download({table_instance: image})
+        return self._engine(progress).download_tables({table_instance: sequence})
+
+    def _engine(self, progress=None):
+        """
+        Returns the lookup table download engine, which remembers the pages on the device
+        """
+        if self._lut_engine is None:
+            self._lut_engine = LUT_DownloadEngine(self.session(), address=self.address)
+        self._lut_engine.session = self.session()
+        self._lut_engine.progress = progress
+        return self._lut_engine
     
     def set_power_input_source(self, option:int):
         """
@@ -152,10 +185,10 @@ class BlueLDD(object):
         params = [high_power,low_power, high_time, low_time, rise_time, fall_time]
         commands = ['High Power', 'Low Power', 'High Time', 'Low Time', 'Rise Time', 'Fall Time']
         params_units = ['W','W', 's', 's','s','s']
-        response = []
-        for i in range(6):
-            id= 5002 + i
-            response.append(self.session().set_parameter(value=params[i], parameter_id=id, address=self.address, parameter_instance=self.channel))
+        # all six values are sent within one transaction
+        values = {5002 + i: params[i] for i in range(6)}
+        result = self.session().set_parameters(values, address=self.address, parameter_instance=self.channel)
+        response = [result[5002 + i] for i in range(6)]
 
         if all(response) == True:
             print('Ramp pulse parameters succesfully loaded')
@@ -174,11 +207,12 @@ class BlueLDD(object):
         params = [Kp, Ki, Kd, slope_lim]
         params_name = ['Kp','Ki', 'Kd', 'slope limit']
         params_units = ['A/W', 's', 's', 'W/us']
+        values = {}
         for i in range(4):
             if params[i] != None:
                 logging.info("Set "+params_name[i]+"  to "+str(params[i])+" " +params_units[i])
-                id= 5010 + i
-                self.session().set_parameter(value=params[i], parameter_id=id, address=self.address, parameter_instance=self.channel)
+                values[5010 + i] = params[i]
+        return self.session().set_parameters(values, address=self.address, parameter_instance=self.channel)
 
     def get_PD_current(self):
         """
@@ -210,11 +244,12 @@ class BlueLDD(object):
         params = [Interval, selection]
         params_name = ['Interval', 'Table']
         params_units = ['us', '']
+        values = {}
         for i in range(2):
             if params[i] != None:
                 logging.info("Set "+params_name[i]+"  to "+str(params[i])+" " +params_units[i])
-                id= 4200 + 10*i
-                self.session().set_parameter(value=params[i], parameter_id=id, address=self.address, parameter_instance=self.channel)
+                values[4200 + 10*i] = params[i]
+        return self.session().set_parameters(values, address=self.address, parameter_instance=self.channel)
 
     def set_current_limit(self, value):
         """
@@ -0,0 +1,82 @@
+"""
+Frames per second of MeCom with the chunked frame reader and with the former one-byte reader, against a simulated
+device on a pseudo terminal (real read syscalls) and on the in-process FakeSerial.
+
+    python benchmarks/frame_reader.py [--seconds 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# the package of this checkout, not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# from this package
+from mecom import MeCom
+from mecom.simulator import SimulatedDevice, FakeSerial, PtySimulator
+
+
+class ByteReaderMeCom(MeCom):
+    """
+    MeCom reading responses byte by byte, as before the chunked reader.
+    """
+
+    def _read_frame(self):
+        frame = b""
+        while True:
+            byte = self._read(size=1)
+            if byte == b"\r":
+                return frame
+            frame += byte
+
+
+def rate(session, seconds, depth=None):
+    """
+    Returns the VR round trips per second, single queries if depth is None, else pipelined transactions.
+    """
+    parameter = "Object Temperature"
+    frames = 0
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        if depth is None:
+            session.get_parameter(parameter_name=parameter, address=1)
+            frames += 1
+        else:
+            session.get_parameters([parameter] * depth, address=1, depth=depth)
+            frames += depth
+    return frames / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration of every run")
+    args = parser.parse_args(argv)
+
+    print("{:<12} {:<10} {:>12} {:>12} {:>8}".format("port", "mode", "byte reader", "chunked", "speedup"))
+    for port in ("pty", "fake"):
+        for mode, depth in (("single", None), ("pipelined", 8)):
+            results = []
+            for cls in (ByteReaderMeCom, MeCom):
+                device = SimulatedDevice(address=1)
+                if port == "pty":
+                    sim = PtySimulator(device)
+                    session = cls(sim.port, metype="TEC")
+                else:
+                    sim = None
+                    session = cls(serial_instance=FakeSerial(device), metype="TEC")
+                try:
+                    results.append(rate(session, args.seconds, depth))
+                finally:
+                    session.stop()
+                    if sim is not None:
+                        sim.stop()
+            print("{:<12} {:<10} {:>10.0f}/s {:>10.0f}/s {:>7.2f}x".format(port, mode, results[0], results[1],
+                                                                         results[1] / results[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
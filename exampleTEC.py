@@ -2,7 +2,7 @@
 
 """
 import logging
-from mecom import MeCom, ResponseException, WrongChecksum
+from mecom import MeComPool, ResponseException, WrongChecksum, RetryPolicy
 from serial import SerialException
 
 
@@ -34,7 +34,8 @@ class MeerstetterTEC(object):
     """
 
     def _tearDown(self):
-        self.session().stop()
+        self.session().release()
+        self._session = None
 
     def __init__(self, port="/dev/ttyUSB0", channel=1, queries=DEFAULT_QUERIES, *args, **kwars):
         assert channel in (1, 2)
@@ -45,8 +46,9 @@ class MeerstetterTEC(object):
         self._connect()
 
     def _connect(self):
-        # open session
-        self._session = MeCom(serialport=self.port)
+        # open session, shared with the other channels and devices on the same port
+        # transient frame errors are retried instead of reopening the port
+        self._session = MeComPool.default().acquire(self.port, retry=RetryPolicy())
         # get device address
         self.address = self._session.identify()
         logging.info("connected to {}".format(self.address))
@@ -58,14 +60,15 @@ class MeerstetterTEC(object):
 
     def get_data(self):
         data = {}
-        for description in self.queries:
-            id, unit = COMMAND_TABLE[description]
-            try:
-                value = self.session().get_parameter(parameter_id=id, address=self.address, parameter_instance=self.channel)
-                data.update({description: (value, unit)})
-            except (ResponseException, WrongChecksum) as ex:
-                self.session().stop()
-                self._session = None
+        ids = [COMMAND_TABLE[description][0] for description in self.queries]
+        try:
+            # all queries are sent within one transaction
+            values = self.session().get_parameters(ids, address=self.address, parameter_instance=self.channel)
+            for description, value in zip(self.queries, values):
+                data.update({description: (value, COMMAND_TABLE[description][1])})
+        except (ResponseException, WrongChecksum) as ex:
+            # the port is reopened with the next query
+            self.session().invalidate()
         return data
 
     def set_temp(self, value):
@@ -1,13 +1,42 @@
 """
-The package consists of 3 files.
+The package consists of these files.
 
 commands.py contains a dictionary parameters which can be get/set
 exceptions.py defines the error thrown by this pockage
 mecom.py contains the communication logic
 lookup_table.py has auxiliary functions for lookup table downloading.
+crc.py computes the frame and lookup table checksums.
+codec.py encodes and decodes frames.
+async_mecom.py contains the asyncio version of the communication logic.
+bus.py schedules the polling of several devices sharing one serial port.
+telemetry.py samples parameters in the background into ring buffers.
+cache.py caches read parameter values.
+metrics.py records latencies, traffic and errors of a session.
+retry.py defines which failed queries are sent again.
+pool.py shares one session per serial port within a process.
+profile.py captures, compares and restores the device configuration.
+waveform.py builds and checks waveforms for the LDD lookup tables.
+recorder.py records telemetry into memory-mappable columnar files.
+pyramid.py indexes recorded telemetry for fast downsampled reads.
+subscriptions.py polls the parameters subscribed with MeCom.subscribe().
+remote.py is the client of mecom-server, a drop-in replacement of MeCom.
+server.py is mecom-server, which shares serial ports between processes (import mecom.server, needs a POSIX system).
+simulator.py simulates devices for tests and benchmarks (import mecom.simulator, needs a POSIX system).
 
 """
 
 from .mecom import MeCom, VR, VS, TD, Parameter
 from .exceptions import ResponseException, WrongChecksum
-from .lookup_table import LT_download_manager
+from .lookup_table import LT_download_manager, LUT_DownloadEngine
+from .async_mecom import AsyncMeCom
+from .bus import MeComBus
+from .telemetry import TelemetryPoller
+from .cache import ParameterCache
+from .metrics import Metrics
+from .retry import RetryPolicy
+from .pool import MeComPool
+from .profile import DeviceProfile
+from .waveform import Waveform
+from .recorder import TelemetryRecorder, TelemetryFile
+from .pyramid import TelemetryReader
+from .remote import RemoteMeCom
@@ -0,0 +1,329 @@
+"""
+asyncio version of MeCom, one event loop can drive many devices without a thread per serial port.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# more special pip packages
+from serial import Serial, SerialException
+
+# from this package
+from .exceptions import ResponseTimeout
+from .mecom import MeCom, ParameterList, VR, VS, RS, IF, ACK
+
+
+class AsyncMeCom(object):
+    """
+    Same interface as MeCom, but every query is a coroutine.
+    The serial port is read by a reader callback of the event loop (loop.add_reader on the file descriptor) and
+    replies are handed to the waiting query by their sequence number. Frames are written by a single worker thread,
+    hence a slow port does not block the event loop. Concurrent awaits are allowed, at most pipeline_depth queries
+    are on the wire at the same time.
+
+    async with AsyncMeCom("/dev/ttyUSB0") as mc:
+        temperature = await mc.get_parameter(parameter_name="Object Temperature", address=1)
+    """
+    SEQUENCE_COUNTER = 1
+
+    def __init__(self, serialport="/dev/ttyUSB0", timeout=1, baudrate=57600, metype='LDD', pipeline_depth=1,
+                 serial_instance=None):
+        """
+        Initialize communication with serial port, call open() (or use async with) inside the event loop.
+        :param serialport: str
+        :param timeout: float: default timeout of a query
+        :param baudrate: int
+        :param metype: str: either 'TEC' or 'LDD'
+        :param pipeline_depth: int: max number of queries in flight
+        :param serial_instance: an already opened Serial to use instead of serialport, it needs a fileno()
+        """
+        if serial_instance is not None:
+            self.ser = serial_instance
+        else:
+            # reads do not block, the event loop tells us when data is waiting
+            self.ser = Serial(port=serialport, timeout=0, write_timeout=timeout, baudrate=baudrate)
+        self.timeout = timeout
+        self.pipeline_depth = pipeline_depth
+        self._rx_buffer = bytearray()
+        # sequence -> (query, future)
+        self._pending = {}
+        self._slots = None
+        self._loop = None
+        # file descriptor watched by the event loop, None if not open or the port failed
+        self._fd = None
+        # one thread keeps the frames of concurrent queries from interleaving, created by open()
+        self._writer = None
+
+        # initialize parameters
+        self.PARAMETERS = ParameterList.get(metype)
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def open(self):
+        """
+        Register the serial port with the running event loop, reopens the port after stop().
+        :return:
+        """
+        if not self.ser.is_open:
+            self.ser.open()
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.pipeline_depth)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncMeCom")
+        self._rx_buffer.clear()
+        self._fd = self.ser.fileno()
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    async def stop(self):
+        """
+        Unregister from the event loop, fail all pending queries and close the port.
+        :return:
+        """
+        self._detach(ResponseTimeout("connection closed"))
+        if self._writer is not None:
+            # let a frame being written finish before the port is closed, without blocking the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._writer.shutdown)
+            self._writer = None
+        self._loop = None
+        self.ser.close()
+
+    def _detach(self, error):
+        """
+        Stop watching the serial port and fail all pending queries with error.
+        :param error: Exception
+        :return:
+        """
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        for query, future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    # shared with the blocking implementation
+    _find_parameter = MeCom._find_parameter
+    _lookup = MeCom._lookup
+    _inc = MeCom._inc
+    _raise = staticmethod(MeCom._raise)
+    _status_name = staticmethod(MeCom._status_name)
+
+    def _on_readable(self):
+        """
+        Called by the event loop if the serial port has data, splits the received bytes into frames.
+        :return:
+        """
+        buffer = self._rx_buffer
+        try:
+            buffer += self.ser.read(max(1, self.ser.in_waiting))
+        except (SerialException, OSError) as ex:
+            # nothing will answer the pending queries, do not wait for their timeouts
+            logging.error("serial port error: {}".format(ex))
+            self._detach(ex)
+            return
+        end = buffer.find(b"\r")
+        while end >= 0:
+            frame = bytes(buffer[:end])
+            del buffer[:end + 1]
+            self._dispatch(frame)
+            end = buffer.find(b"\r")
+
+    def _dispatch(self, response_frame):
+        """
+        Hand a received frame to the query with the same sequence number, frames of queries which already timed out
+        are dropped.
+        :param response_frame: bytes
+        :return:
+        """
+        try:
+            # response is !AASSSS...
+            pending = self._pending.pop(int(response_frame[3:7], 16), None)
+        except ValueError:
+            return
+        if pending is None:
+            return
+        query, future = pending
+        if future.done():
+            return
+        try:
+            # strip source byte
+            query.set_response(response_frame[1:])
+        except Exception as ex:
+            future.set_exception(ex)
+        else:
+            future.set_result(query)
+
+    async def _execute(self, query, timeout=None):
+        """
+        Send a query and wait for the response.
+        :param query: Query
+        :param timeout: float: defaults to the timeout given at initialization
+        :return: Query
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if self._fd is None:
+            raise SerialException("serial port is not open, call open() or use async with")
+        async with self._slots:
+            query.set_sequence(self.SEQUENCE_COUNTER)
+            self._inc()
+            future = self._loop.create_future()
+            self._pending[query.SEQUENCE] = (query, future)
+            try:
+                await self._loop.run_in_executor(self._writer, self.ser.write, query.compose())
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise ResponseTimeout("timeout while communication via serial")
+            finally:
+                self._pending.pop(query.SEQUENCE, None)
+
+        # did we encounter an error?
+        self._raise(query)
+
+        return query
+
+    async def get_parameter(self, parameter_name=None, parameter_id=None, timeout=None, *args, **kwargs):
+        """
+        Get the value of a parameter given by name or id.
+        :param parameter_name: str
+        :param parameter_id: int
+        :param timeout: float
+        :param args:
+        :param kwargs:
+        :return: int or float
+        """
+        assert parameter_name is not None or parameter_id is not None
+
+        parameter = self._find_parameter(parameter_name, parameter_id)
+        vr = await self._execute(VR(parameter=parameter, *args, **kwargs), timeout=timeout)
+        return vr.RESPONSE.PAYLOAD[0]
+
+    async def get_parameters(self, parameters, timeout=None, *args, **kwargs):
+        """
+        Get the values of several parameters given by name (str) or id (int), the queries are awaited concurrently.
+        :param parameters: list of str or int
+        :param timeout: float
+        :param args:
+        :param kwargs:
+        :return: list of int or float
+        """
+        queries = [self._execute(VR(parameter=self._lookup(parameter), *args, **kwargs), timeout=timeout)
+                   for parameter in parameters]
+        return [vr.RESPONSE.PAYLOAD[0] for vr in await asyncio.gather(*queries)]
+
+    async def set_parameter(self, value, parameter_name=None, parameter_id=None, timeout=None, *args, **kwargs):
+        """
+        Set the new value of a parameter given by name or id.
+        Returns success.
+        :param value: int or float
+        :param parameter_name: str
+        :param parameter_id: int
+        :param timeout: float
+        :param args:
+        :param kwargs:
+        :return: bool
+        """
+        assert parameter_name is not None or parameter_id is not None
+
+        parameter = self._find_parameter(parameter_name, parameter_id)
+        vs = await self._execute(VS(value=value, parameter=parameter, *args, **kwargs), timeout=timeout)
+        return type(vs.RESPONSE) == ACK
+
+    async def reset_device(self, timeout=None, *args, **kwargs):
+        """
+        Resets the device after an error has occured
+        """
+        rs = await self._execute(RS(*args, **kwargs), timeout=timeout)
+        return type(rs.RESPONSE) == ACK
+
+    async def info(self, timeout=None, *args, **kwargs):
+        """
+        Returns the device identification string.
+        """
+        info = await self._execute(IF(*args, **kwargs), timeout=timeout)
+        return info.RESPONSE.PAYLOAD
+
+    async def identify(self, *args, **kwargs):
+        """
+        Returns the device address as int.
+        """
+        return await self.get_parameter(parameter_name="Device Address", *args, **kwargs)
+
+    async def status(self, *args, **kwargs):
+        """
+        Get the device status as readable str.
+        :param args:
+        :param kwargs:
+        :return: str
+        """
+        status_id = await self.get_parameter(parameter_name="Device Status", *args, **kwargs)
+        return self._status_name(status_id)
+
+    async def enable_autosave(self, *args, **kwargs):
+        return await self.set_parameter(value=0, parameter_name="Save Data to Flash", *args, **kwargs)
+
+    async def disable_autosave(self, *args, **kwargs):
+        return await self.set_parameter(value=1, parameter_name="Save Data to Flash", *args, **kwargs)
+
+    async def wait_for(self, parameter, predicate, timeout=10.0, interval=0.005, max_interval=0.5, **kwargs):
+        """
+        Poll a parameter until predicate(value) is true (or value == predicate), see MeCom.wait_for().
+        Returns the last value and the elapsed time in seconds.
+        :param parameter: str or int
+        :param predicate: callable(value) -> bool, or the expected value
+        :param timeout: float
+        :param interval: float
+        :param max_interval: float
+        :param kwargs:
+        :return: (int or float, float)
+        """
+        parameter = self._lookup(parameter)
+        if not callable(predicate):
+            expected = predicate
+            predicate = lambda value: value == expected
+        start = time.monotonic()
+        delay = interval
+
+        while True:
+            value = await self.get_parameter(parameter_id=parameter.id, **kwargs)
+            elapsed = time.monotonic() - start
+            if predicate(value):
+                return value, elapsed
+            if elapsed >= timeout:
+                raise ResponseTimeout("{} = {} after {:.1f} s".format(parameter.name, value, elapsed))
+            await asyncio.sleep(min(delay, timeout - elapsed))
+            delay = min(2 * delay, max_interval)
+
+    async def wait_until_stable(self, timeout=60.0, **kwargs):
+        """
+        Wait until the temperature control loop is stable (TEC only).
+        Returns the time waited in seconds.
+        """
+        # value 2 means "stable"
+        value, elapsed = await self.wait_for("Temperature is Stable", 2, timeout=timeout, max_interval=1.0,
+                                             **kwargs)
+        return elapsed
+
+    async def write_to_flash(self, timeout=10.0, **kwargs):
+        """
+        Write parameters to flash.
+        :param timeout: float
+        :param kwargs:
+        :return: bool
+        """
+        await self.enable_autosave(**kwargs)
+
+        try:
+            # value 0 means "All Parameters are saved to Flash"
+            await self.wait_for("Flash Status", 0, timeout=timeout, **kwargs)
+        except ResponseTimeout:
+            raise ResponseTimeout("writing to flash timed out!")
+
+        await self.disable_autosave(**kwargs)
+
+        return True
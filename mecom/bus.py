@@ -0,0 +1,257 @@
+"""
+Scheduler for several devices sharing one serial port (RS-485 daisy chain).
+"""
+
+import time
+import logging
+
+# from this package
+from .exceptions import ResponseException, ResponseTimeout, WrongChecksum
+from .mecom import VR
+
+
+class PollItem(object):
+    """
+    A parameter which is read periodically from one device.
+    """
+    __slots__ = ("parameter", "instance", "interval", "next_due")
+
+    def __init__(self, parameter, instance, interval):
+        """
+        :param parameter: Parameter
+        :param instance: int
+        :param interval: float: seconds between two reads
+        """
+        self.parameter = parameter
+        self.instance = instance
+        self.interval = interval
+        self.next_due = 0.0
+
+
+class BusDevice(object):
+    """
+    A device on the bus with its poll list and statistics.
+    """
+
+    def __init__(self, address):
+        """
+        :param address: int
+        """
+        self.address = address
+        self.items = []
+
+        # statistics
+        self.queries = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency_total = 0.0
+        self.latency_min = None
+        self.latency_max = None
+        self.first_query = None
+        self.last_query = None
+
+    def due(self, now):
+        """
+        Returns the items which have to be read, the most overdue first.
+        :param now: float
+        :return: list of PollItem
+        """
+        return sorted((item for item in self.items if item.next_due <= now), key=lambda item: item.next_due)
+
+    def next_due(self):
+        """
+        Returns the time of the next read or None if the poll list is empty.
+        :return: float
+        """
+        return min((item.next_due for item in self.items), default=None)
+
+    def record(self, n_queries, latency, now):
+        """
+        Adds a successful transaction to the statistics.
+        :param n_queries: int
+        :param latency: float: seconds per query
+        :param now: float
+        :return:
+        """
+        self.queries += n_queries
+        self.latency_total += latency * n_queries
+        self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+        self.latency_max = latency if self.latency_max is None else max(self.latency_max, latency)
+        if self.first_query is None:
+            self.first_query = now
+        self.last_query = now
+
+    def stats(self):
+        """
+        Returns the statistics as dict, latencies in seconds, throughput in queries per second.
+        :return: dict
+        """
+        duration = 0.0 if self.first_query is None else self.last_query - self.first_query
+        return {
+            "queries": self.queries,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_mean": self.latency_total / self.queries if self.queries else None,
+            "latency_min": self.latency_min,
+            "latency_max": self.latency_max,
+            "throughput": self.queries / duration if duration > 0 else None,
+        }
+
+
+class MeComBus(object):
+    """
+    Polls several devices on one MeCom session. Every device has its own poll list with individual intervals.
+    In each turn all devices with due parameters are served once, in a rotating order, hence a device with many or
+    fast parameters cannot starve the others.
+
+    bus = MeComBus(MeCom("/dev/ttyUSB0", metype="TEC"))
+    for address in bus.discover():
+        bus.add(address, "Object Temperature", interval=0.1, instance=1)
+    bus.run(duration=10)
+    """
+
+    def __init__(self, session, batch=None, on_sample=None):
+        """
+        :param session: MeCom
+        :param batch: int: max number of queries per device and turn, defaults to the pipeline depth of the session
+        :param on_sample: callable(address, parameter, instance, value, timestamp), called for every value read
+        """
+        self.session = session
+        self.batch = session.pipeline_depth if batch is None else batch
+        self.on_sample = on_sample
+        self.devices = {}
+        self._turn = 0
+
+    def discover(self, addresses=range(1, 255), timeout=0.05):
+        """
+        Probes the given addresses and registers every device which answers.
+        Address 0 is the broadcast address and must not be probed on a bus with several devices.
+        :param addresses: iterable of int
+        :param timeout: float: time to wait for an answer of a single device
+        :return: list of int
+        """
+        session = self.session
+        parameter = session._lookup("Device Address")
+        found = []
+        # probe within one hold of the serial lock, other threads never run with the short timeout
+        with session.ser_lock:
+            saved_timeout = session.ser.timeout
+            session.ser.timeout = timeout
+            try:
+                for address in addresses:
+                    query = VR(parameter=parameter, address=address)
+                    session.ser.reset_input_buffer()
+                    del session._rx_buffer[:]
+                    try:
+                        session._exchange(query)
+                        session._raise(query)
+                    except (ResponseException, WrongChecksum):
+                        # silent, garbled, malformed or refusing: skip the address
+                        continue
+                    logging.info("found device {} on the bus".format(address))
+                    self.devices.setdefault(address, BusDevice(address))
+                    found.append(address)
+            finally:
+                session.ser.timeout = saved_timeout
+        return found
+
+    def add(self, address, parameter, interval, instance=1):
+        """
+        Add a parameter given by name (str) or id (int) to the poll list of a device.
+        :param address: int
+        :param parameter: str or int
+        :param interval: float: seconds
+        :param instance: int
+        :return: PollItem
+        """
+        item = PollItem(self.session._lookup(parameter), instance, interval)
+        self.devices.setdefault(address, BusDevice(address)).items.append(item)
+        return item
+
+    def remove(self, address, item):
+        """
+        Remove a PollItem from the poll list of a device.
+        :param address: int
+        :param item: PollItem
+        :return:
+        """
+        self.devices[address].items.remove(item)
+
+    def poll(self):
+        """
+        Execute one turn: every device with due parameters gets up to batch queries.
+        Returns the samples read as a list of (address, parameter name, instance, value, timestamp).
+        :return: list of tuple
+        """
+        samples = []
+        addresses = sorted(self.devices)
+        if not addresses:
+            return samples
+
+        # rotate the start so that no device is always served first
+        self._turn = (self._turn + 1) % len(addresses)
+        for address in addresses[self._turn:] + addresses[:self._turn]:
+            device = self.devices[address]
+            items = device.due(time.monotonic())[:self.batch]
+            if not items:
+                continue
+
+            queries = [VR(parameter=item.parameter, address=address, parameter_instance=item.instance)
+                       for item in items]
+            start = time.monotonic()
+            try:
+                self.session.transaction(queries)
+            except ResponseTimeout:
+                device.timeouts += 1
+                queries = []
+            except (ResponseException, WrongChecksum):
+                device.errors += 1
+                queries = []
+            now = time.monotonic()
+
+            for item in items:
+                # skip missed reads instead of catching up
+                item.next_due = max(item.next_due + item.interval, now)
+            if not queries:
+                continue
+
+            device.record(len(queries), (now - start) / len(queries), now)
+            for item, query in zip(items, queries):
+                sample = (address, item.parameter.name, item.instance, query.RESPONSE.PAYLOAD[0], now)
+                samples.append(sample)
+                if self.on_sample is not None:
+                    self.on_sample(*sample)
+        return samples
+
+    def next_due(self):
+        """
+        Returns the time of the next due read or None if nothing is polled.
+        :return: float
+        """
+        times = [t for t in (device.next_due() for device in self.devices.values()) if t is not None]
+        return min(times, default=None)
+
+    def run(self, duration=None):
+        """
+        Poll until duration (seconds) has passed, or forever.
+        :param duration: float
+        :return:
+        """
+        end = None if duration is None else time.monotonic() + duration
+        while end is None or time.monotonic() < end:
+            self.poll()
+            next_due = self.next_due()
+            if next_due is None:
+                return
+            delay = next_due - time.monotonic()
+            if end is not None:
+                delay = min(delay, end - time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+
+    def stats(self):
+        """
+        Returns the statistics of every device.
+        :return: dict: address -> dict
+        """
+        return {address: device.stats() for address, device in self.devices.items()}
@@ -0,0 +1,211 @@
+"""
+Read cache for parameter values, see MeCom(cache=ParameterCache()).
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+# time to live in seconds of parameters which differ from the default
+DEFAULT_TTLS = {
+    "Device Address": float("inf"),
+    # polled while waiting for the device, never cached
+    "Flash Status": 0,
+    "Device Status": 0,
+}
+
+
+class ParameterCache(object):
+    """
+    Bounded cache of read values keyed on (address, parameter id, instance).
+    Every parameter has a time to live, looked up by id first, then by name, else default_ttl applies. A ttl of 0
+    disables caching of that parameter. If more than maxsize values are stored, the least recently used one is
+    evicted.
+    A read which started before an entry was invalidated or written through must not store its (possibly older)
+    value afterwards: take the generation before reading and pass it to put().
+
+    generation = cache.generation
+    value = read_from_device()
+    cache.put(address, parameter, instance, value, generation)
+    """
+
+    def __init__(self, default_ttl=0.1, ttl=None, maxsize=1024, write_through=False):
+        """
+        :param default_ttl: float: seconds
+        :param ttl: dict: parameter name (str) or id (int) -> seconds, updates DEFAULT_TTLS
+        :param maxsize: int
+        :param write_through: bool: store the value of a successful set instead of dropping the entry; the device
+        may round the value, hence this is off by default
+        """
+        self.default_ttl = default_ttl
+        self.ttl = dict(DEFAULT_TTLS)
+        self.ttl.update(ttl or {})
+        self.maxsize = maxsize
+        self.write_through = write_through
+        # (address, id, instance) -> (expiry, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        # number of invalidations and writes, and the number when entries matching (address, id, instance) were
+        # invalidated last, None matches all
+        self._generation = 0
+        self._dropped = {}
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_of(self, parameter):
+        """
+        Returns the time to live of a Parameter.
+        :param parameter: Parameter
+        :return: float
+        """
+        ttl = self.ttl.get(parameter.id)
+        if ttl is None:
+            ttl = self.ttl.get(parameter.name, self.default_ttl)
+        return ttl
+
+    def get(self, address, parameter, instance):
+        """
+        Returns the cached value or None if it is missing or expired.
+        :param address: int
+        :param parameter: Parameter
+        :param instance: int
+        :return: int or float
+        """
+        key = (address, parameter.id, instance)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    @property
+    def generation(self):
+        """
+        The generation to pass to put() of a read starting now.
+        :return: int
+        """
+        return self._generation
+
+    def _dropped_since(self, key, generation):
+        """
+        Returns True if the entry was invalidated or written after generation, call with _lock held.
+        """
+        if generation is None or generation >= self._generation:
+            return False
+        address, parameter_id, instance = key
+        dropped = self._dropped
+        for pattern in ((address, parameter_id, instance), (address, None, None), (None, parameter_id, instance),
+                        (None, None, None), (address, parameter_id, None), (None, parameter_id, None),
+                        (address, None, instance), (None, None, instance)):
+            if dropped.get(pattern, 0) > generation:
+                return True
+        return False
+
+    def _drop(self, pattern):
+        """
+        Start a new generation for the entries matching (address, id, instance), call with _lock held.
+        """
+        self._generation += 1
+        self._dropped[pattern] = self._generation
+
+    def put(self, address, parameter, instance, value, generation=None):
+        """
+        Store a value read from the device. The value is dropped if the entry was invalidated or written after the
+        generation the read started with.
+        :param address: int
+        :param parameter: Parameter
+        :param instance: int
+        :param value: int or float
+        :param generation: int: see generation, None stores the value unconditionally
+        :return:
+        """
+        ttl = self.ttl_of(parameter)
+        if ttl <= 0:
+            return
+        key = (address, parameter.id, instance)
+        with self._lock:
+            if self._dropped_since(key, generation):
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def written(self, address, parameter, instance, value, acknowledged=True):
+        """
+        Update the cache after a value was set: write through or drop the entry.
+        A set on the broadcast address 0 drops the entries of all addresses, a set of the device address drops all
+        entries of the device and a set which was not acknowledged is never written through.
+        :param address: int
+        :param parameter: Parameter
+        :param instance: int
+        :param value: int or float
+        :param acknowledged: bool: whether the device answered with ACK
+        :return:
+        """
+        if parameter.name == "Device Address":
+            # the device answers on a new address now
+            self.invalidate(address=None if address == 0 else address)
+        elif address == 0:
+            self.invalidate(parameter=parameter, instance=instance)
+        elif self.write_through and acknowledged:
+            with self._lock:
+                # reads still in flight must not replace the written value
+                self._drop((address, parameter.id, instance))
+            self.put(address, parameter, instance, value)
+        else:
+            self.invalidate(address, parameter, instance)
+
+    def invalidate(self, address=None, parameter=None, instance=None):
+        """
+        Drop entries, every argument which is None matches all.
+        :param address: int
+        :param parameter: Parameter
+        :param instance: int
+        :return:
+        """
+        parameter_id = None if parameter is None else parameter.id
+        with self._lock:
+            self._drop((address, parameter_id, instance))
+            if None not in (address, parameter_id, instance):
+                self._entries.pop((address, parameter_id, instance), None)
+                return
+            for key in list(self._entries):
+                if (address is None or key[0] == address) and (parameter_id is None or key[1] == parameter_id) \
+                        and (instance is None or key[2] == instance):
+                    del self._entries[key]
+
+    def clear(self):
+        """
+        Drop all entries, the counters are kept.
+        :return:
+        """
+        with self._lock:
+            self._drop((None, None, None))
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Returns the counters and the hit rate.
+        :return: dict
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
@@ -0,0 +1,152 @@
+"""
+Encoding and decoding of frames on bytes, without building intermediate str objects.
+
+A frame is <source><address:2><sequence:4><payload><crc:4><CR>, all numbers as upper case hex digits.
+Run this file to get a micro-benchmark.
+"""
+
+from binascii import hexlify, unhexlify
+from functools import lru_cache
+import math
+from struct import Struct, error as struct_error
+
+# from this package
+from .crc import crc16
+
+EOL = b"\r"
+
+# value formats of the parameters, values are transmitted as 8 hex digits
+STRUCTS = {"UINT8": Struct("!H"), "UINT16": Struct("!L"), "INT32": Struct("!i"), "FLOAT32": Struct("!f")}
+_FLOAT32 = STRUCTS["FLOAT32"]
+
+# checksum of the source byte of responses, decoding continues from here
+_RESPONSE_CRC_START = crc16(b"!")
+
+
+def encode_value(value):
+    """
+    Returns the 8 hex digits of an int (as 32 bit two's complement) or float (as IEEE 754 single).
+    :param value: int or float
+    :return: bytes
+    """
+    if type(value) is float:
+        return hexlify(_FLOAT32.pack(value)).upper()
+    return b"%08X" % (value & 0xFFFFFFFF)
+
+
+def check_value(value, value_format):
+    """
+    Converts a value to the type of a parameter format and checks that it can be transmitted, raises ValueError if
+    not (e.g. 2.5 for an INT32 or 1e39 for a FLOAT32).
+    :param value: int or float
+    :param value_format: str: "INT32" or "FLOAT32"
+    :return: int or float
+    """
+    try:
+        if value_format == "FLOAT32":
+            converted = float(value)
+            if math.isfinite(converted):
+                _FLOAT32.pack(converted)
+        elif value_format == "INT32":
+            converted = int(value)
+            if converted != value:
+                raise ValueError("{!r} is not an integer".format(value))
+            STRUCTS["INT32"].pack(converted)
+        else:
+            raise ValueError("values of format {} can not be set".format(value_format))
+    except (TypeError, OverflowError, struct_error) as ex:
+        raise ValueError("{!r} is no valid {}: {}".format(value, value_format, ex))
+    return converted
+
+
+@lru_cache(maxsize=None)
+def query_payload(command, parameter_id, instance):
+    """
+    Returns the static part of a parameter query, e.g. ?VR<id:4><instance:2>. The result is cached, every
+    (command, parameter, instance) is formatted only once.
+    :param command: str: "?VR" or "VS"
+    :param parameter_id: int
+    :param instance: int
+    :return: bytes
+    """
+    return "{}{:04X}{:02X}".format(command, parameter_id, instance).encode()
+
+
+def compose(source, address, sequence, payload):
+    """
+    Composes a frame into a preallocated bytearray.
+    Returns the frame, ready to be sent, and its checksum.
+    :param source: bytes: b"#" for queries, b"!" for responses
+    :param address: int
+    :param sequence: int
+    :param payload: bytes
+    :return: (bytearray, int)
+    """
+    end = 7 + len(payload)
+    frame = bytearray(end + 5)
+    frame[0:7] = b"%s%02X%04X" % (source, address, sequence)
+    frame[7:end] = payload
+    crc = crc16(memoryview(frame)[:end])
+    frame[end:] = b"%04X\r" % crc
+    return frame, crc
+
+
+def decode_header(frame):
+    """
+    Returns address and sequence of a received frame without source byte.
+    :param frame: memoryview
+    :return: (int, int)
+    """
+    header = unhexlify(frame[0:6])
+    return header[0], (header[1] << 8) | header[2]
+
+
+def decode_value(frame, response_format, offset=6):
+    """
+    Returns the int or float at offset of a received frame.
+    :param frame: memoryview
+    :param response_format: str: e.g. "FLOAT32"
+    :param offset: int
+    :return: int or float
+    """
+    return STRUCTS[response_format].unpack(unhexlify(frame[offset:offset + 8]))[0]
+
+
+def decode_crc(frame):
+    """
+    Returns the checksum at the end of a received frame.
+    :param frame: memoryview
+    :return: int
+    """
+    crc = unhexlify(frame[-4:])
+    return (crc[0] << 8) | crc[1]
+
+
+def response_crc(frame):
+    """
+    Computes the checksum of a received frame without source byte (the response source "!" is included).
+    :param frame: memoryview
+    :return: int
+    """
+    return crc16(frame[:-4], _RESPONSE_CRC_START)
+
+
+if __name__ == "__main__":
+    from timeit import timeit
+
+    from .mecom import ParameterList, VR, VRResponse
+
+    parameter = ParameterList.get("TEC").get_by_name("Object Temperature")
+    # response of device 1 to sequence 0, value 25.0
+    response = b"010000" + b"41C80000"
+    response += b"%04X" % crc16(b"!" + response)
+
+    def compose_vr():
+        VR(parameter=parameter, address=1, parameter_instance=1).compose()
+
+    def decode_vr():
+        VRResponse("FLOAT32").decompose(response)
+
+    number = 100000
+    for name, function in [("VR composed", compose_vr), ("VR response decoded", decode_vr)]:
+        print("{:<20} {:>10.0f} per s".format(name, number / timeit(function, number=number)))
@@ -4,19 +4,20 @@ https://www.meerstetter.ch/category/35-latest-communication-protocols
 """
 
 
+# parameters marked with "access": "RO" are read only, all others can be set
 TEC_PARAMETERS = [
-    {"id": 104, "name": "Device Status", "format": "INT32"},
-    {"id": 105, "name": "Error Number", "format": "INT32"},
+    {"id": 104, "name": "Device Status", "format": "INT32", "access": "RO"},
+    {"id": 105, "name": "Error Number", "format": "INT32", "access": "RO"},
     {"id": 108, "name": "Save Data to Flash", "format": "INT32"},
-    {"id": 109, "name": "Flash Status", "format": "INT32"},
+    {"id": 109, "name": "Flash Status", "format": "INT32", "access": "RO"},
 
-    {"id": 1000, "name": "Object Temperature", "format": "FLOAT32"},
-    {"id": 1001, "name": "Sink Temperature", "format": "FLOAT32"},
-    {"id": 1010, "name": "Target Object Temperature", "format": "FLOAT32"},
-    {"id": 1011, "name": "Ramp Object Temperature", "format": "FLOAT32"},
-    {"id": 1020, "name": "Actual Output Current", "format": "FLOAT32"},
-    {"id": 1021, "name": "Actual Output Voltage", "format": "FLOAT32"},
-    {"id": 1200, "name": "Temperature is Stable", "format": "INT32"},
+    {"id": 1000, "name": "Object Temperature", "format": "FLOAT32", "access": "RO"},
+    {"id": 1001, "name": "Sink Temperature", "format": "FLOAT32", "access": "RO"},
+    {"id": 1010, "name": "Target Object Temperature", "format": "FLOAT32", "access": "RO"},
+    {"id": 1011, "name": "Ramp Object Temperature", "format": "FLOAT32", "access": "RO"},
+    {"id": 1020, "name": "Actual Output Current", "format": "FLOAT32", "access": "RO"},
+    {"id": 1021, "name": "Actual Output Voltage", "format": "FLOAT32", "access": "RO"},
+    {"id": 1200, "name": "Temperature is Stable", "format": "INT32", "access": "RO"},
 
     {"id": 2010, "name": "Status", "format": "INT32"},
     {"id": 2030, "name": "Current Limitation", "format": "FLOAT32"},
@@ -37,7 +38,7 @@ TEC_PARAMETERS = [
     {"id": 52100, "name": "Enable Function", "format": "INT32"},
     {"id": 52101, "name": "Set Output to Push-Pull", "format": "INT32"},
     {"id": 52102, "name": "Set Output States", "format": "INT32"},
-    {"id": 52103, "name": "Read Input States", "format": "INT32"},
+    {"id": 52103, "name": "Read Input States", "format": "INT32", "access": "RO"},
 
     {"id": 50000, "name": "Live Enable", "format": "INT32"},    
     {"id": 50001, "name": "Live Set Current", "format": "FLOAT32"},
@@ -52,12 +53,12 @@ TEC_PARAMETERS = [
 
 
 LDD_PARAMETERS = [
-    {"id": 104, "name": "Device Status", "format": "INT32"},
+    {"id": 104, "name": "Device Status", "format": "INT32", "access": "RO"},
     {"id": 108, "name": "Save Data to Flash", "format": "INT32"},
-    {"id": 109, "name": "Flash Status", "format": "INT32"},
-    {"id": 1016, "name": "Laser Diode Current", "format": "FLOAT32"},
-    {"id": 1017, "name": "Laser Diode Voltage", "format": "FLOAT32"},
-    {"id": 1015, "name": "Laser Diode Temperature", "format": "FLOAT32"},
+    {"id": 109, "name": "Flash Status", "format": "INT32", "access": "RO"},
+    {"id": 1016, "name": "Laser Diode Current", "format": "FLOAT32", "access": "RO"},
+    {"id": 1017, "name": "Laser Diode Voltage", "format": "FLOAT32", "access": "RO"},
+    {"id": 1015, "name": "Laser Diode Temperature", "format": "FLOAT32", "access": "RO"},
     {"id": 3020, "name": "Current Limit Max [A]", "format": "FLOAT32"},
     {"id": 3040, "name": "Device Address", "format": "INT32"},
     #Current Tab
@@ -65,7 +66,7 @@ LDD_PARAMETERS = [
     {"id": 2001, "name": "Current CW", "format": "FLOAT32"},
     {"id": 2000, "name": "Input Source", "format": "INT32"},
     {"id": 2020, "name": "Enable Settings", "format": "INT32"},
-    {"id": 102, "name": "Device Serial Number", "format": "INT32"},
+    {"id": 102, "name": "Device Serial Number", "format": "INT32", "access": "RO"},
     {"id": 3050 , "name": "Baud Rate", "format": "INT32"},
     {"id": 3051 , "name": "Response Delay ", "format": "INT32"},
     {"id": 3080, "name": "Hardware PIN", "format": "INT32"},
@@ -77,7 +78,7 @@ LDD_PARAMETERS = [
     {"id": 52100, "name": "Enable Function", "format": "INT32"},
     {"id": 52101, "name": "Set Output to Push-Pull", "format": "INT32"},
     {"id": 52102, "name": "Set Output States", "format": "INT32"},
-    {"id": 52103, "name": "Read Input States", "format": "INT32"},
+    {"id": 52103, "name": "Read Input States", "format": "INT32", "access": "RO"},
     ## LPC commands # LP settings
     {"id": 5000, "name": "LP Input Source", "format": "INT32"},
     {"id": 5001, "name": "LP CW", "format": "FLOAT32"},
@@ -96,7 +97,7 @@ LDD_PARAMETERS = [
     {"id": 5020, "name": "Current Limiter Start Value", "format": "FLOAT32"},
     {"id": 5021, "name": "Current Limiter Ramp", "format": "FLOAT32"},
     #Monitoring photocurrent(<1mA)
-    {"id": 1060, "name": "Photo Diode Current", "format": "FLOAT32"}, 
+    {"id": 1060, "name": "Photo Diode Current", "format": "FLOAT32", "access": "RO"}, 
     #Lookup table
     {"id": 4200, "name": "Table Interval", "format": "INT32"}, 
     {"id": 4210, "name": "Table Select", "format": "INT32"},
@@ -0,0 +1,178 @@
+"""
+Table driven checksums used by the MeCom protocol.
+
+crc16 is the CRC-16/CCITT (XModem variant) appended to every frame.
+crc32 is the checksum of a lookup table image. It is the CRC-32 (polynomial 0x04C11DB7, start value 0xFFFFFFFF) as
+computed by the STM32 CRC unit: every byte is xored into the register as a 32 bit word and 32 bits are shifted.
+
+Both use 256-entry tables computed at import. If available, binascii.crc_hqx and zlib.crc32 do the work in C.
+Run this file to get a micro-benchmark.
+"""
+
+try:
+    from binascii import crc_hqx
+except ImportError:
+    crc_hqx = None
+
+try:
+    from zlib import crc32 as _zlib_crc32
+except ImportError:
+    _zlib_crc32 = None
+
+CRC16_POLYNOMIAL = 0x1021
+CRC32_POLYNOMIAL = 0x04C11DB7
+CRC32_START = 0xFFFFFFFF
+
+
+def _make_table(polynomial, width):
+    """
+    Returns the 256-entry table of a MSB first CRC.
+    :param polynomial: int
+    :param width: int: 16 or 32
+    :return: tuple of int
+    """
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) if crc & top else (crc << 1)
+        table.append(crc & mask)
+    return tuple(table)
+
+
+CRC16_TABLE = _make_table(CRC16_POLYNOMIAL, 16)
+CRC32_TABLE = _make_table(CRC32_POLYNOMIAL, 32)
+
+# bit reversal of a byte, used to compute the crc32 through zlib
+_REFLECT = bytes(int("{:08b}".format(byte)[::-1], 2) for byte in range(256))
+
+
+def _reflect32(value):
+    """
+    Reverses the bit order of a 32 bit int.
+    :param value: int
+    :return: int
+    """
+    return int.from_bytes(value.to_bytes(4, "little").translate(_REFLECT), "big")
+
+
+def _crc16_table(data, crc=0):
+    """
+    Pure python crc16.
+    :param data: bytes-like
+    :param crc: int
+    :return: int
+    """
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def _crc32_table(data, crc=CRC32_START):
+    """
+    Pure python crc32, every byte is processed as a 32 bit word.
+    :param data: bytes-like
+    :param crc: int
+    :return: int
+    """
+    table = CRC32_TABLE
+    for byte in data:
+        crc ^= byte
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[crc >> 24]
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[crc >> 24]
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[crc >> 24]
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ table[crc >> 24]
+    return crc
+
+
+def _crc32_zlib(data, crc=CRC32_START):
+    """
+    crc32 through zlib. Processing a byte as a word equals processing the bytes 00 00 00 <byte> MSB first, zlib works
+    LSB first, hence the bytes and the register are bit reversed.
+    :param data: bytes-like
+    :param crc: int
+    :return: int
+    """
+    data = bytes(data)
+    words = bytearray(4 * len(data))
+    words[3::4] = data.translate(_REFLECT)
+    return _reflect32(_zlib_crc32(words, _reflect32(crc) ^ 0xFFFFFFFF) ^ 0xFFFFFFFF)
+
+
+def crc16(data, crc=0):
+    """
+    Returns the CRC-16/CCITT of data, continuing from crc.
+    :param data: bytes-like
+    :param crc: int
+    :return: int
+    """
+    if crc_hqx is not None:
+        return crc_hqx(data, crc)
+    return _crc16_table(data, crc)
+
+
+def crc32(data, crc=CRC32_START):
+    """
+    Returns the lookup table CRC-32 of data, continuing from crc.
+    :param data: bytes-like
+    :param crc: int
+    :return: int
+    """
+    if _zlib_crc32 is not None:
+        return _crc32_zlib(data, crc)
+    return _crc32_table(data, crc)
+
+
+class CRC16(object):
+    """
+    Incremental crc16, feed the data with update() and read the checksum from crc.
+    """
+    __slots__ = ("crc",)
+
+    def __init__(self, data=b"", crc=0):
+        self.crc = crc16(data, crc)
+
+    def update(self, data):
+        """
+        Adds data to the checksum.
+        :param data: bytes-like
+        :return: CRC16
+        """
+        self.crc = crc16(data, self.crc)
+        return self
+
+
+class CRC32(object):
+    """
+    Incremental crc32, feed the data with update() and read the checksum from crc.
+    """
+    __slots__ = ("crc",)
+
+    def __init__(self, data=b"", crc=CRC32_START):
+        self.crc = crc32(data, crc)
+
+    def update(self, data):
+        """
+        Adds data to the checksum.
+        :param data: bytes-like
+        :return: CRC32
+        """
+        self.crc = crc32(data, self.crc)
+        return self
+
+
+if __name__ == "__main__":
+    from timeit import timeit
+
+    frame = b"#0112AB?VR03E801"
+    table = bytes(range(256)) * 255  # size of a full table image
+
+    for name, function, data, number in [("crc16 per frame", crc16, frame, 100000),
+                                         ("crc16 per frame, table", _crc16_table, frame, 100000),
+                                         ("crc32 per table", crc32, table, 20),
+                                         ("crc32 per table, table", _crc32_table, table, 2)]:
+        seconds = timeit(lambda: function(data), number=number) / number
+        print("{:<24} {:>10.2f} us".format(name, seconds * 1e6))
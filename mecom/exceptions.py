@@ -15,6 +15,13 @@ class WrongResponseSequence(ResponseException):
     pass
 
 
+class MalformedResponse(ResponseException):
+    """
+    A reply which could not be decoded, e.g. garbled by noise with a matching checksum.
+    """
+    pass
+
+
 class WrongChecksum(Exception):
     pass
 
@@ -1,17 +1,183 @@
 
 import struct
-from .mecom import MeCom
-#from crccheck.crc import Crc32, CrcXmodem
-from PyCRC.CRC32 import CRC32
-from PyCRC.CRCCCITT import CRCCCITT
-from binascii import crc32
+import logging
+import time
+import numpy as np
+from .mecom import MeCom, TD
+from .crc import crc32
+from .exceptions import ResponseException, ResponseTimeout, WrongChecksum, WrongResponseSequence, MalformedResponse
+from .retry import RetryPolicy
+
+# status of a ?TD command reported by the device
+LUT_STATUS_OK = 0
+LUT_STATUS_BUSY = 2
+LUT_STATUS_RECEIVED = 3  # page received, or verification is running
+
+# limits of the tables
+LUT_MAX_FLOAT_COUNT = 16300
+LUT_MAX_INST = 4
+
+# backoff between retries of a page if the session has no retry policy
+LUT_RETRY = RetryPolicy(backoff=0.005)
+
+
+class LUT_DownloadEngine(object):
+    """
+    Downloads table images page by page with TD() queries and verifies them.
+    Every page acknowledged by the device is remembered. A download which was interrupted resumes from the last
+    acknowledged page and pages which are already on the device are skipped, so reloading a table only sends the
+    pages which changed. If the verification fails after pages were skipped, all pages are sent again once.
+    """
+    PAGE_SIZE = TD.PAGE_SIZE
+
+    def __init__(self, session, address=0, retries=3, busy_timeout=5.0, progress=None):
+        """
+        :param session: MeCom
+        :param address: int
+        :param retries: int: retries of a page after a timeout or a corrupted response, the wait before a retry is
+        the backoff of the retry policy of the session (LUT_RETRY if it has none)
+        :param busy_timeout: float: seconds to wait while the device reports busy or the verification is running
+        :param progress: callable(bytes_done, bytes_total), called after every page
+        """
+        self.session = session
+        self.address = address
+        self.retries = retries
+        self.busy_timeout = busy_timeout
+        self.progress = progress
+        # table instance -> {offset: page} acknowledged by the device
+        self._device = {}
+        # statistics of the last download
+        self.pages_sent = 0
+        self.pages_skipped = 0
+
+    def forget(self):
+        """
+        Forget which pages are on the device, e.g. after it was reset. The next download sends all pages.
+        :return:
+        """
+        self._device.clear()
+
+    def _command(self, command, table_instance=1, offset=0, data=b""):
+        """
+        Execute a TD() command, retry on transmission errors and wait while the device is busy.
+        :param command: int
+        :param table_instance: int
+        :param offset: int
+        :param data: bytes
+        :return: int: status
+        """
+        attempt = 0
+        busy_since = None
+        while True:
+            try:
+                status = self.session.table_download(command, table_instance=table_instance, offset=offset, data=data,
+                                                     address=self.address)
+            except (ResponseTimeout, WrongChecksum, WrongResponseSequence, MalformedResponse):
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                logging.warning("lookup table command {} failed, retry {}".format(command, attempt))
+                delay = (self.session.retry or LUT_RETRY).delay(attempt)
+                if delay > 0:
+                    time.sleep(delay)
+                continue
+            if status != LUT_STATUS_BUSY:
+                return status
+            if busy_since is None:
+                busy_since = time.monotonic()
+            elif time.monotonic() - busy_since > self.busy_timeout:
+                raise ResponseTimeout("device busy while downloading the lookup table")
+            time.sleep(0.01)
+
+    def download(self, images, verify=True):
+        """
+        Download table images and verify them.
+        Returns True if the verification passed (or was skipped).
+        :param images: dict: table instance -> bytes, see LT_download_manager.LUT_BuildTableImage()
+        :param verify: bool
+        :return: bool
+        """
+        images = {instance: bytes(image) for instance, image in images.items() if len(image) > 0}
+        self.pages_sent = 0
+        self.pages_skipped = 0
+        total = sum(-(-len(image) // self.PAGE_SIZE) * self.PAGE_SIZE for image in images.values())
+        done = 0
+
+        for instance in sorted(images):
+            image = images[instance]
+            pages = self._device.setdefault(instance, {})
+            for offset in range(0, len(image), self.PAGE_SIZE):
+                page = image[offset:offset + self.PAGE_SIZE].ljust(self.PAGE_SIZE, b"\0")
+                if pages.get(offset) == page:
+                    self.pages_skipped += 1
+                else:
+                    # the page is unknown until it is acknowledged
+                    pages.pop(offset, None)
+                    status = self._command(1, table_instance=instance, offset=offset, data=page)
+                    if status != LUT_STATUS_RECEIVED:
+                        raise ResponseException("device rejected page at {} of table {}, status {}".format(
+                            offset, instance, status))
+                    pages[offset] = page
+                    self.pages_sent += 1
+                done += self.PAGE_SIZE
+                if self.progress is not None:
+                    self.progress(done, total)
+
+        if not verify or self.verify():
+            return True
+        self.forget()
+        if self.pages_skipped:
+            logging.warning("lookup table verification failed, downloading all pages")
+            return self.download(images, verify=verify)
+        return False
+
+    def download_tables(self, tables, verify=True):
+        """
+        Download tables given as arrays, e.g. generated waveforms, without going through a CSV file.
+        :param tables: dict: table instance (1...4) -> array-like of float
+        :param verify: bool
+        :return: bool
+        """
+        images = {}
+        for instance, values in tables.items():
+            values = np.asarray(values, dtype=np.float32)
+            if not 1 <= instance <= LUT_MAX_INST:
+                raise LookupError(f"The 'Table Instance' must be between 1-{LUT_MAX_INST}.")
+            if values.ndim != 1 or not 2 <= len(values) <= LUT_MAX_FLOAT_COUNT:
+                raise LookupError(f"A table must have 2-{LUT_MAX_FLOAT_COUNT} values.")
+            images[instance] = LT_download_manager.LUT_BuildTableImage(values)
+        return self.download(images, verify=verify)
+
+    def verify(self):
+        """
+        Let the device verify the downloaded tables.
+        :return: bool
+        """
+        status = self._command(2)
+        start = time.monotonic()
+        while status == LUT_STATUS_RECEIVED:
+            # verification is running
+            if time.monotonic() - start > self.busy_timeout:
+                raise ResponseTimeout("lookup table verification timed out")
+            time.sleep(0.01)
+            status = self._command(0)
+        return status == LUT_STATUS_OK
+
 
 class LT_download_manager():
-    def __init__(self, filepath, session):
+    def __init__(self, filepath, session, address=0, progress=None, engine=None):
+        """
+        :param filepath: str: CSV file
+        :param session: MeCom
+        :param address: int
+        :param progress: callable(bytes_done, bytes_total)
+        :param engine: LUT_DownloadEngine: reuse an engine to skip the pages already on the device
+        """
         self.path = filepath
-        self.LUT_MAX_FLOAT_COUNT = 16300
-        self.LUT_MAX_INST = 4
+        self.LUT_MAX_FLOAT_COUNT = LUT_MAX_FLOAT_COUNT
+        self.LUT_MAX_INST = LUT_MAX_INST
         self.session = session
+        self.engine = engine if engine is not None else LUT_DownloadEngine(session, address=address, progress=progress)
 
     def download_table(self):
         """
@@ -23,266 +189,109 @@ class LT_download_manager():
     
     def LUT_OpenCSVFile(self):
         """
-        Opens, checks and stores the CSV file inputs as float
+        Opens, checks and stores the CSV file inputs as float32.
+        Returns the table images (bytes, empty if the instance is not defined), their lengths and the values.
+        A column ends at its first empty field, every field must be a number.
         """
-        nrOfColumns = 0
-        columns = []
-        sr = None
-
-        # Check if OpenFileDialog result is OK
-        fData = [[0.0] * self.LUT_MAX_FLOAT_COUNT for _ in range(self.LUT_MAX_INST)]
-        fLength = [-1] * self.LUT_MAX_INST
-        detectedTableInstances = [0] * self.LUT_MAX_INST
-
         try:
-            sr = open(self.path, 'r')
-            
-            # Read First Line and do some pre-checks
-            line = sr.readline().strip()
-            columns = line.split(';')
-            nrOfColumns = len(columns)
-
-            # Check the Table header
-            if nrOfColumns < 2:
-                raise LookupError("The CSV file must have at least 2 columns. One 'Table Instance' column and 1-4 Data columns.")
-                
-            if nrOfColumns > self.LUT_MAX_INST + 1:
-                raise LookupError(f"The CSV file is limited to a maximum of {self.LUT_MAX_INST} columns. One 'Table Instance' column and 1-4 Data columns.")
-                return
-            if columns[0] != "Table Instance":
-                raise LookupError("The name of the A1 Cell must be 'Table Instance'.")
-                return
+            with open(self.path, 'r') as sr:
+                # Read First Line and do some pre-checks
+                columns = [column.strip() for column in sr.readline().strip().split(';')]
+                nrOfColumns = len(columns)
 
-            # Check if the header contains nothing else than 1-4, every number should only once be there
-            for inst in range(1, self.LUT_MAX_INST + 1):
-                detectedTableInstances[self.InstToAdr(inst)] = -1
-            for i in range(1, nrOfColumns):
+                # Check the Table header
+                if nrOfColumns < 2:
+                    raise LookupError("The CSV file must have at least 2 columns. One 'Table Instance' column and 1-4 Data columns.")
+                if nrOfColumns > self.LUT_MAX_INST + 1:
+                    raise LookupError(f"The CSV file is limited to a maximum of {self.LUT_MAX_INST} columns. One 'Table Instance' column and 1-4 Data columns.")
+                if columns[0] != "Table Instance":
+                    raise LookupError("The name of the A1 Cell must be 'Table Instance'.")
                 try:
-                    tableInstance = int(columns[i])
+                    detectedTableInstances = np.array(columns[1:], dtype=int)
                 except ValueError:
                     raise LookupError("The 'Table Instance' must be a number.")
-                    return
-                if tableInstance < 1 or tableInstance > self.LUT_MAX_INST:
+                if ((detectedTableInstances < 1) | (detectedTableInstances > self.LUT_MAX_INST)).any():
                     raise LookupError(f"The 'Table Instance' must be between 1-{self.LUT_MAX_INST}.")
-                    return
-                for i2 in range(1, nrOfColumns):
-                    if detectedTableInstances[i2 - 1] == tableInstance:
-                        raise LookupError("The 'Table Instance' number must be different.")
-                        return
-                detectedTableInstances[i - 1] = tableInstance
+                if len(np.unique(detectedTableInstances)) != len(detectedTableInstances):
+                    raise LookupError("The 'Table Instance' number must be different.")
 
-            # Read the Float values
-            for i in range(self.LUT_MAX_INST):
-                fLength[i] = -1
-            valueIndex = 0
-
-            for line in sr:
-                line = line.strip()
-                columns = line.split(';')
-                if len(columns) != nrOfColumns:
+                # Read all fields at once
+                try:
+                    cells = np.loadtxt(sr, dtype=str, delimiter=';', comments=None, ndmin=2)
+                except ValueError:
                     raise LookupError("Some rows do not contain the same number of columns as the header does.")
-                    return
-
-                for columnIndex in range(1, nrOfColumns):
-                    if fLength[self.InstToAdr(detectedTableInstances[columnIndex - 1])] == -1:
-                        # End of this column not yet reached
-                        try:
-                            fData[self.InstToAdr(detectedTableInstances[columnIndex - 1])][valueIndex] = float(columns[columnIndex])
-                        except ValueError:
-                            # Could not convert the column value to a float, assume the last value was the end of this column
-                            fLength[self.InstToAdr(detectedTableInstances[columnIndex - 1])] = valueIndex
-                    else:
-                        # End of the Table already reached, check if no more data is here
-                        if len(columns[columnIndex]) != 0:
-                            raise LookupError(f"Row {valueIndex + 2}; Column {columnIndex + 1}: Contains a non-empty field under a field that could not be converted to a floating point value.")
-                            return
-                valueIndex += 1
-                if valueIndex > self.LUT_MAX_FLOAT_COUNT:
-                    raise LookupError(f"The maximum allowed values is {self.LUT_MAX_FLOAT_COUNT}.")
-                    return
-
-            # Set the lengths of the tables that have still data on this last row
-            for columnIndex in range(1, nrOfColumns):
-                if fLength[self.InstToAdr(detectedTableInstances[columnIndex - 1])] == -1:
-                    fLength[self.InstToAdr(detectedTableInstances[columnIndex - 1])] = valueIndex
-        except Exception as e:
-            print("CSV File read Error!")
+        except OSError as e:
             raise LookupError(str(e))
-            
-            return
-        finally:
-            if sr is not None:
-                sr.close()
-
-        # Define the LutByteLength list to store table lengths
-        LutByteLength = [0] * self.LUT_MAX_INST
-        LUT_HEADER_SIZE = 12
-        # Define LutByteData as a multi-dimensional list
-        LutByteData = [[0.0] * (self.LUT_MAX_FLOAT_COUNT*4 + 12) for _ in range(self.LUT_MAX_INST)] 
-        
-        # Prepare the data for all 4 Tables if the table was defined
-        for tableInst in range(1, self.LUT_MAX_INST + 1):
-            LutByteLength[self.InstToAdr(tableInst)] = 0
-            if fLength[self.InstToAdr(tableInst)] == -1:
-                continue  # Table is not defined
-            if fLength[self.InstToAdr(tableInst)] < 2:
-                raise LookupError("The minimum allowed values / table is 2!")
-                return
 
-            # Add the static Fields
+        if cells.size == 0:
+            cells = cells.reshape(0, nrOfColumns)
+        if cells.shape[1] != nrOfColumns:
+            raise LookupError("Some rows do not contain the same number of columns as the header does.")
+        if cells.shape[0] > self.LUT_MAX_FLOAT_COUNT:
+            raise LookupError(f"The maximum allowed values is {self.LUT_MAX_FLOAT_COUNT}.")
 
-            LutByteLength[self.InstToAdr(tableInst)] = (fLength[self.InstToAdr(tableInst)] * 4) + 12
-            tableType = 0
-            checksum_test = [0]*LutByteLength[self.InstToAdr(tableInst)]
-            LutByteData[self.InstToAdr(tableInst)][4:8] = LutByteLength[self.InstToAdr(tableInst)].to_bytes(4, 'little')
-            checksum_test[4] = LutByteLength[self.InstToAdr(tableInst)]
-            LutByteData[self.InstToAdr(tableInst)][8:12] = tableType.to_bytes(4, 'little')
-            checksum_test[8] = tableType
+        # a column ends at the first empty field
+        cells = np.char.strip(cells[:, 1:])
+        filled = np.char.str_len(cells) > 0
+        lengths = np.where(filled.all(axis=0), filled.shape[0], np.argmin(filled, axis=0))
+        below_end = filled & (np.arange(filled.shape[0])[:, None] >= lengths)
+        if below_end.any():
+            row, column = np.argwhere(below_end)[0]
+            raise LookupError(f"Row {row + 2}; Column {column + 2}: Contains a non-empty field under a field that could not be converted to a floating point value.")
+        if (lengths < 2).any():
+            raise LookupError("The minimum allowed values / table is 2!")
 
-            # Add the data
-            for i in range(fLength[self.InstToAdr(tableInst)]):
-                float_bytes = struct.unpack('<I',struct.pack("<f", fData[self.InstToAdr(tableInst)][i]))[0]
-                LutByteData[self.InstToAdr(tableInst)][12 + i * 4:16 + i * 4:] = float_bytes.to_bytes(4,'little')
-                checksum_test[12+4*i] = float_bytes
-                #crc_buffer += '{:08X}'.format(struct.unpack('<I',float_bytes )[0])
+        LutByteData = [b""] * self.LUT_MAX_INST
+        LutByteLength = [0] * self.LUT_MAX_INST
+        fData = [np.zeros(0, dtype=np.float32) for _ in range(self.LUT_MAX_INST)]
 
-            # Calculate and add the CRC (exclude the first 4 bytes, because this is the place for the CRC)
-            crc = self.LUT_CalcCrcOfByteArray(LutByteData[self.InstToAdr(tableInst)][4:], LutByteLength[self.InstToAdr(tableInst)] - 4)
-            #crc = self.calculate_crc32(crc_buffer)
-            #crc = CRCCCITT().calculate(crc_buffer.encode())
-            #crc = self.LUT_CalcCrcOfByteArray(checksum_test, len(checksum_test))
-            print(crc)
-            LutByteData[self.InstToAdr(tableInst)][0:4] = crc.to_bytes(4, 'little')
-            print(LutByteData[self.InstToAdr(tableInst)])
+        # Prepare the data for the defined tables
+        for columnIndex, tableInst in enumerate(detectedTableInstances):
+            try:
+                # same rounding as float() followed by struct.pack("<f")
+                values = cells[:lengths[columnIndex], columnIndex].astype(np.float64).astype(np.float32)
+            except ValueError:
+                raise LookupError(f"Column {columnIndex + 2}: Contains a field that could not be converted to a floating point value.")
+            fData[self.InstToAdr(tableInst)] = values
+            LutByteData[self.InstToAdr(tableInst)] = self.LUT_BuildTableImage(values)
+            LutByteLength[self.InstToAdr(tableInst)] = len(LutByteData[self.InstToAdr(tableInst)])
 
-        print("Lookup Table loaded successfully.")
+        logging.info("Lookup Table loaded successfully.")
         return LutByteData, LutByteLength , fData
+
+    @staticmethod
+    def LUT_BuildTableImage(values, tableType=0):
+        """
+        Returns the image of a table as downloaded to the device: CRC, byte length and table type as little endian
+        uint32 followed by the values as little endian float32. The CRC covers everything but itself.
+        :param values: array-like of float
+        :param tableType: int
+        :return: bytes
+        """
+        data = np.asarray(values, dtype='<f4').tobytes()
+        body = struct.pack('<II', len(data) + 12, tableType) + data
+        return struct.pack('<I', crc32(body)) + body
     
     def LUT_DownloadManager(self,LutByteData,LutByteLength):
         """
-        Downloads the table in chunks of 256 bits
+        Downloads the defined tables in pages of 256 bytes and verifies them
         """
-        global status, byteOffset, tableInst, totalBytesToDownload, totalBytesDownloaded, cmd
-        status = 0
-        download_completed = False
-        while download_completed is False:
-            if status == 0:
-
-                #progressBar_LUT_Download.Value = 0
-                print( "Start downloading...")
-                tableInst = 0
-                #Computation of the total bytes
-                totalBytesToDownload = 0
-                totalBytesDownloaded = 0
-                for inst in range(1, self.LUT_MAX_INST + 1):
-                    if LutByteLength[self.InstToAdr(inst)] == 0:
-                        continue
-                    totalBytesToDownload += (((LutByteLength[self.InstToAdr(inst)] - 1) // 256) + 1) * 256
-                print('Total Bytes to download: ', totalBytesToDownload)
-                status = 1
-            if status == 1:
-                #check wether the table has data
-                tableInst += 1
-                if tableInst > self.LUT_MAX_INST:
-                    #all tables downloaded, proceed to verification
-                    cmd = 2
-                    status = 3
-                elif LutByteLength[self.InstToAdr(tableInst)] > 0:
-                    #start downloading instance
-                    byteOffset = 0
-                    status = 2
-            if status == 2:
-                #Download the table instance
-                print(f"Downloading table instance {tableInst}")
-                queryResult = self.LUT_DownloadPage(cmd = 1, tableInst= tableInst, byteOffset= byteOffset, data = LutByteData[self.InstToAdr(tableInst)][byteOffset:])
-                if queryResult == 3:
-                    #if command received
-                    byteOffset += 256 #update offset
-                    totalBytesDownloaded += 256 #update bytes downloaded
-                    progress = 95 * totalBytesDownloaded / totalBytesToDownload
-                    if progress > 95:
-                        progress = 95
-                    if progress < 0:
-                        progress = 0
-                    print(progress, '%')
-                    
-                    if byteOffset >= LutByteLength[self.InstToAdr(tableInst)]:
-                        #if offset greater than the length of the table instance, move to the following 
-                        status = 1
-
-                elif queryResult == 2:
-                    print("Device is busy. Waiting...")
-                elif queryResult == 0xFF:
-                    print("Communication Timeout. Please Try again.")
-                    #progressBar_LUT_Download.Value = 0
-                    status = 0
-                else:
-                    print( f"Error. Unexpected Status({queryResult}). Please Try again.")
-                    #progressBar_LUT_Download.Value = 0
-                    status = 0
-
-            if status == 3:
-                #Verification
-
-                queryResult = self.LUT_DownloadPage(cmd, 0, 0, None)
-                queryResult = 0
-                if queryResult == 0:
-                    #progressBar_LUT_Download.Value = 100
-                    print("Download Successful")
-                    download_completed = True
-                    status = 0
-                elif queryResult == 2:
-                    print("Device is busy. Waiting...")
-                elif queryResult == 3:
-                    print( "Verification is running...")
-                    cmd = 0
-                elif queryResult == 0xFF:
-                    print("Communication Timeout. Please Try again.")
-                    #progressBar_LUT_Download.Value = 0
-                    status = 0
-                else:
-                    print( "Error. Tables not ok. Please Try again.")
-                    #progressBar_LUT_Download.Value = 0
-                    status = 0
-        return download_completed
+        images = {}
+        for tableInst in range(1, self.LUT_MAX_INST + 1):
+            if LutByteLength[self.InstToAdr(tableInst)] > 0:
+                images[tableInst] = LutByteData[self.InstToAdr(tableInst)][:LutByteLength[self.InstToAdr(tableInst)]]
+        return self.engine.download(images)
 
     def LUT_DownloadPage(self, data,cmd = 1 , tableInst=1, byteOffset=0 ):
         """
-        Queries the command
+        Queries the command, returns the status
         """
-        #txBuffer = bytearray(600)
-        #txBuffer[0] = ord('?')
-        #txBuffer[1] = ord('T')
-        #txBuffer[2] = ord('D')
-        #txBuffer[3:5] = "{:02X}".format(cmd)
-
-        txBuffer = ''
-        txBuffer += '?TD'
-        txBuffer += "{:02X}".format(cmd)
-
         if cmd == 1:
-            #txBuffer[5:7] = "{:02X}".format(tableInst)
-            txBuffer += "{:02X}".format(tableInst)
-            #txBuffer[7:15] = "{:08X}".format(byteOffset)
-            txBuffer += "{:08X}".format(byteOffset)
-
-        
-            for i in range(256):
-                if type(data[i]) is int:
-                #txBuffer[15 + i * 2:17 + i * 2] = "{:02X}".format(data[i])
-                    txBuffer += "{:02X}".format(data[i])
-                else:
-                    txBuffer += "{:02X}".format(int(0))
-                    
-            print('Sending to mecom')
-            response = self.session.execute_lookup_table(txBuffer)  ## function to send the command
-                #CommError()
-
+            data = data[:TD.PAGE_SIZE]
         else:
-            response = self.session.execute_lookup_table(txBuffer) #function to send the command
-                #CommError()
-
-        return response
+            data = b""
+        return self.session.table_download(cmd, table_instance=tableInst, offset=byteOffset, data=data,
+                                           address=self.engine.address)
     
 
     #Help functions
@@ -291,14 +300,7 @@ class LT_download_manager():
         """
         Computes the CRC32
         """
-        crc = OldCRC ^ data_byte
-        for _ in range(32):
-            if crc & 0x80000000:
-                crc = (crc << 1)%(0xFFFFFFFF + 1)
-                crc = crc ^ 0x04C11DB7
-            else:
-                crc = (crc<<1)%(0xFFFFFFFF)
-        return crc   
+        return crc32(bytes((data_byte,)), OldCRC)
     
     def InstToAdr(self,tableInst):
         """ 
@@ -312,10 +314,7 @@ class LT_download_manager():
         """
         Computes the CRC of a Byte array
         """
-        OldCRC = 0xFFFFFFFF
-        for i in range(length):
-            OldCRC = self.CRC32Calc(OldCRC, data[i])
-        return OldCRC
+        return crc32(bytes(data[:length]))
     
     def calculate_crc32(self, data):
         crc = 0xFFFFFFFF
@@ -2,17 +2,23 @@
 The magic happens in this file.
 """
 
-from struct import pack, unpack
+from collections import deque
+import math
+import struct
 from functools import partialmethod
 import time
-from threading import Lock
+from threading import Lock, Event
+from types import MappingProxyType
+from binascii import hexlify
 
 # more special pip packages
 from serial import Serial
-from PyCRC.CRCCCITT import CRCCCITT
 
 # from this package
-from .exceptions import ResponseException, WrongResponseSequence, WrongChecksum, ResponseTimeout, UnknownParameter, UnknownMeComType
+from .crc import crc16
+from .codec import compose, query_payload, encode_value, check_value, decode_header, decode_value, decode_crc, response_crc, STRUCTS
+from .exceptions import ResponseException, WrongResponseSequence, WrongChecksum, ResponseTimeout, UnknownParameter, UnknownMeComType, \
+    MalformedResponse
 from .commands import TEC_PARAMETERS, LDD_PARAMETERS, ERRORS
 
 
@@ -20,22 +26,29 @@ class Parameter(object):
     """"
     Every parameter dict from commands.py is parsed into a Parameter instance.
     """
+    __slots__ = ("id", "name", "format", "access")
 
     def __init__(self, parameter_dict):
         """
-        Takes a dict e.g. {"id": 104, "name": "Device Status", "format": "INT32"} and creates an object which can be
-        passed to a Query().
+        Takes a dict e.g. {"id": 104, "name": "Device Status", "format": "INT32", "access": "RO"} and creates an
+        object which can be passed to a Query(). Parameters without "access" are writable ("RW").
         :param parameter_dict: dict
         """
         self.id = parameter_dict["id"]
         self.name = parameter_dict["name"]
         self.format = parameter_dict["format"]
+        self.access = parameter_dict.get("access", "RW")
+
+    @property
+    def writable(self):
+        return self.access != "RO"
 
 
 class Error(object):
     """"
     Every error dict from commands.py is parsed into a Error instance.
     """
+    __slots__ = ("code", "symbol", "description")
 
     def __init__(self, error_dict):
         """
@@ -55,27 +68,64 @@ class Error(object):
         return [self.code, self.description, self.symbol]
 
 
+def _alias(name):
+    """
+    Case-insensitive key of a parameter name, surrounding whitespace is ignored.
+    :param name: str
+    :return: str
+    """
+    return name.strip().casefold()
+
+
 class ParameterList(object):
     """
     Contains a list of Parameter() for either TEC (metype = 'TEC') 
     or LDD (metype = 'TEC') controller.
-    Provides searching via id or name.
-    :param error_dict: dict
+    Provides searching via id, name or case-insensitive alias.
+    The lists are built once at import and shared, use ParameterList.get(metype) instead of creating new ones.
     """
+    __slots__ = ("metype", "_PARAMETERS", "_BY_ID", "_BY_NAME", "_BY_ALIAS")
 
     def __init__(self,metype='TEC'):
         """
-        Reads the parameter dicts from commands.py.
+        Reads the parameter dicts from commands.py and builds the (read-only) indexes.
+        If ids or names appear more than once, the first entry wins.
         """
-        self._PARAMETERS = []
         if metype == 'TEC':
-            for parameter in TEC_PARAMETERS:
-                self._PARAMETERS.append(Parameter(parameter))
+            parameters = TEC_PARAMETERS
         elif metype =='LDD':
-            for parameter in LDD_PARAMETERS:
-                self._PARAMETERS.append(Parameter(parameter))
+            parameters = LDD_PARAMETERS
         else:
             raise UnknownMeComType
+        self.metype = metype
+        self._PARAMETERS = tuple(Parameter(parameter) for parameter in parameters)
+
+        by_id, by_name, by_alias = {}, {}, {}
+        for parameter in self._PARAMETERS:
+            by_id.setdefault(parameter.id, parameter)
+            by_name.setdefault(parameter.name, parameter)
+            by_alias.setdefault(_alias(parameter.name), parameter)
+        self._BY_ID = MappingProxyType(by_id)
+        self._BY_NAME = MappingProxyType(by_name)
+        self._BY_ALIAS = MappingProxyType(by_alias)
+
+    @staticmethod
+    def get(metype='TEC'):
+        """
+        Returns the shared ParameterList() of a device type.
+        :param metype: str: either 'TEC' or 'LDD'
+        :return: ParameterList()
+        """
+        try:
+            return PARAMETER_LISTS[metype]
+        except KeyError:
+            raise UnknownMeComType
+
+    def __iter__(self):
+        return iter(self._PARAMETERS)
+
+    def __len__(self):
+        return len(self._PARAMETERS)
 
     def get_by_id(self, id):
         """
@@ -83,28 +133,36 @@ class ParameterList(object):
         :param id: int
         :return: Parameter()
         """
-        for parameter in self._PARAMETERS:
-            if parameter.id == id:
-                return parameter
-        raise UnknownParameter
+        try:
+            return self._BY_ID[id]
+        except KeyError:
+            raise UnknownParameter
 
     def get_by_name(self, name):
         """
-        Returns a Parameter() identified by it's name.
+        Returns a Parameter() identified by it's name, falls back to a case-insensitive match.
         :param name: str
         :return: Parameter()
         """
-        for parameter in self._PARAMETERS:
-            if parameter.name == name:
-                return parameter
-        raise UnknownParameter
+        parameter = self._BY_NAME.get(name)
+        if parameter is None:
+            parameter = self._BY_ALIAS.get(_alias(name))
+        if parameter is None:
+            raise UnknownParameter
+        return parameter
+
+
+# parameter lists shared by all MeCom instances
+PARAMETER_LISTS = MappingProxyType({metype: ParameterList(metype) for metype in ("TEC", "LDD")})
+
+# error codes specified by the protocol
+ERRORS_BY_CODE = MappingProxyType({error["code"]: Error(error) for error in ERRORS})
 
 
 class MeFrame(object):
     """
     Basis structure of a MeCom frame as defined in the specs.
     """
-    _TYPES = {"UINT8": "!H", "UINT16": "!L", "INT32": "!i", "FLOAT32": "!f"}
     _SOURCE = ""
     _EOL = "\r"  # carriage return
 
@@ -121,57 +179,62 @@ class MeFrame(object):
         :return: int
         """
         if self.CRC is None:
-            self.CRC = CRCCCITT().calculate(input_data=self.compose(part=True))
+            self.CRC = crc16(self.compose(part=True))
 
         # crc check
-        # print(self.CRC)
-        # print(in_crc)
         if in_crc is not None and in_crc != self.CRC:
             raise WrongChecksum
 
     def set_sequence(self, sequence):
         self.SEQUENCE = sequence
 
+    @staticmethod
+    def _encode(p):
+        """
+        Payload items can be str, bytes, int or float.
+        :param p: str or bytes or int or float
+        :return: bytes
+        """
+        if type(p) is bytes:
+            return p
+        if type(p) is str:
+            return p.encode()
+        return encode_value(p)
+
     def compose(self, part=False):
         """
-        Returns the frame as bytes, the return-value can be directly send via serial.
+        Returns the frame as bytearray, the return-value can be directly send via serial.
         :param part: bool
-        :return: bytes
+        :return: bytearray
         """
-        # first part
-        frame = self._SOURCE + "{:02X}".format(self.ADDRESS) + "{:04X}".format(self.SEQUENCE)
-        # payload can be str or float or int
-        for p in self.PAYLOAD:
-            if type(p) is str:
-                frame += p
-            elif type(p) is int:
-                frame += "{:08X}".format(p)
-            elif type(p) is float:
-                # frame += hex(unpack('<I', pack('<f', p))[0])[2:].upper()  # please do not ask
-                # if p = 0 CRC fails, e.g. !01000400000000 composes to b'!0100040' / missing zero padding
-                frame += '{:08X}'.format(unpack('<I', pack('<f', p))[0])   #still do not aks
+        if len(self.PAYLOAD) == 1:
+            payload = self._encode(self.PAYLOAD[0])
+        else:
+            payload = b"".join([self._encode(p) for p in self.PAYLOAD])
         # if we only want a partial frame, return here
         if part:
-            return frame.encode()
-        # add checksum
-        if self.CRC is None:
-            self.crc()
-        frame += "{:04X}".format(self.CRC)
-        # add end of line (carriage return)
-        frame += self._EOL
-        return frame.encode()
+            return "{}{:02X}{:04X}".format(self._SOURCE, self.ADDRESS, self.SEQUENCE).encode() + payload
+        # the checksum is computed while composing, the sequence may have changed since the last call
+        frame, self.CRC = compose(self._SOURCE.encode(), self.ADDRESS, self.SEQUENCE, payload)
+        return frame
 
-    def _decompose_header(self, frame_bytes):
+    def _decompose_header(self, frame):
         """
-        Takes bytes as input and decomposes into the instance variables.
-        :param frame_bytes: bytes
+        Takes a received frame without source byte as input and decomposes into the instance variables.
+        :param frame: memoryview
         :return:
         """
-        frame = frame_bytes.decode()
+        self.ADDRESS, self.SEQUENCE = decode_header(frame)
 
-        self._SOURCE = frame[0]
-        self.ADDRESS = int(frame[1:3], 16)
-        self.SEQUENCE = int(frame[3:7], 16)
+    def _check_crc(self, frame):
+        """
+        Reads the checksum of a received frame without source byte and compares it with the computed one.
+        :param frame: memoryview
+        :return:
+        """
+        self.CRC = decode_crc(frame)
+        if response_crc(frame) != self.CRC:
+            raise WrongChecksum
 
 
 class Query(MeFrame):
@@ -181,8 +244,10 @@ class Query(MeFrame):
     """
     _SOURCE = "#"
     _PAYLOAD_START = None
+    # length of a reply without source byte and carriage return, device errors excepted
+    _RESPONSE_LENGTH = None
 
-    def __init__(self, parameter=None, address=0, parameter_instance=1, table = False, table_instance=1):
+    def __init__(self, parameter=None, address=0, parameter_instance=1):
         """
         To be initialized with a target device address (default=broadcast), the channel, teh sequence number and a
         Parameter() instance of the corresponding parameter.
@@ -190,10 +255,10 @@ class Query(MeFrame):
         :param sequence: int
         :param address: int
         :param parameter_instance: int
-        :table_data : lookup table data 
-        :table_instance: table number
         """
         super(Query, self).__init__()
+        self.PARAMETER = parameter
+        self.INSTANCE = parameter_instance
 
         if hasattr(self, "_PAYLOAD_START"):
             self.PAYLOAD.append(self._PAYLOAD_START)
@@ -203,19 +268,19 @@ class Query(MeFrame):
         self._RESPONSE_FORMAT = None
 
         self.ADDRESS = address
-        if parameter is not None:
-            if parameter == 0:
-                pass
-            else:
-                # UNIT16 4 hex digits
-                self.PAYLOAD.append("{:04X}".format(parameter.id))
-        if parameter_instance is not None:
-            # UNIT8 2 hex digits
-            self.PAYLOAD.append("{:02X}".format(parameter_instance))
-
-        if table:
-            self.PAYLOAD.append("{:02X}".format(int(1)))
-            self.PAYLOAD.append("{:02X}".format(table_instance))
+        if parameter is not None and parameter != 0 and parameter_instance is not None:
+            # UNIT16 4 hex digits and UNIT8 2 hex digits, cached for every parameter and instance
+            self.PAYLOAD[-1] = query_payload(self._PAYLOAD_START, parameter.id, parameter_instance)
+        else:
+            if parameter is not None:
+                if parameter == 0:
+                    pass
+                else:
+                    # UNIT16 4 hex digits
+                    self.PAYLOAD.append("{:04X}".format(parameter.id))
+            if parameter_instance is not None:
+                # UNIT8 2 hex digits
+                self.PAYLOAD.append("{:02X}".format(parameter_instance))
 
 
     
@@ -227,28 +292,37 @@ class Query(MeFrame):
         :param response_frame: bytes
         :return:
         """
-        # check the type of the response
-        # is it an ACK packet?
-        if len(response_frame) == 10:
-            self.RESPONSE = ACK()
-            self.RESPONSE.decompose(response_frame)
-        # is it an info string packet/response_frame does not contain source (!)
-
-        elif len(response_frame) == 12:
-            self.RESPONSE = TDResponse() 
-            self.RESPONSE.decompose(response_frame)
-        elif len(response_frame) == 30:
-            self.RESPONSE = IFResponse()
-            self.RESPONSE.decompose(response_frame)
-        # is it an error packet?
-        elif b'+' in response_frame:
-            self.RESPONSE = DeviceError()
-            self.RESPONSE.decompose(response_frame)
-        # nope it's a response to a parameter query
-        else:
-            self.RESPONSE = VRResponse(self._RESPONSE_FORMAT)
-            # if the checksum is wrong, this statement raises
-            self.RESPONSE.decompose(response_frame)
+        # a reply with a valid checksum may still answer another query, e.g. one of a previous session
+        if self._RESPONSE_LENGTH is not None and len(response_frame) != self._RESPONSE_LENGTH \
+                and b'+' not in response_frame:
+            raise WrongResponseSequence("reply of {} bytes does not fit {}".format(len(response_frame),
+                                                                                   self._PAYLOAD_START))
+        try:
+            # check the type of the response
+            # is it an ACK packet?
+            if len(response_frame) == 10:
+                self.RESPONSE = ACK()
+                self.RESPONSE.decompose(response_frame)
+            # is it an info string packet/response_frame does not contain source (!)
+
+            elif len(response_frame) == 12:
+                self.RESPONSE = TDResponse() 
+                self.RESPONSE.decompose(response_frame)
+            elif len(response_frame) == 30:
+                self.RESPONSE = IFResponse()
+                self.RESPONSE.decompose(response_frame)
+            # is it an error packet?
+            elif b'+' in response_frame:
+                self.RESPONSE = DeviceError()
+                self.RESPONSE.decompose(response_frame)
+            # nope it's a response to a parameter query
+            else:
+                self.RESPONSE = VRResponse(self._RESPONSE_FORMAT)
+                # if the checksum is wrong, this statement raises
+                self.RESPONSE.decompose(response_frame)
+        except (ValueError, IndexError, struct.error) as ex:
+            # the checksum matched (or was not reached) but the frame can not be decoded
+            raise MalformedResponse("malformed reply {!r}: {}".format(bytes(response_frame), ex))
 
         # did we get the right response to our query?
         if self.SEQUENCE != self.RESPONSE.SEQUENCE:
@@ -260,6 +334,7 @@ class VR(Query):
     Implementing query to get a parameter from the device (?VR).
     """
     _PAYLOAD_START = "?VR"
+    _RESPONSE_LENGTH = 18
 
     def __init__(self, parameter, address=0, parameter_instance=1):
         """
@@ -281,6 +356,7 @@ class VS(Query):
     Implementing query to set a parameter from the device (VS).
     """
     _PAYLOAD_START = "VS"
+    _RESPONSE_LENGTH = 10
 
     def __init__(self, value, parameter, address=0, parameter_instance=1):
         """
@@ -309,33 +385,42 @@ class VS(Query):
         
         
 class TD(Query):
-    ### Currently not in use, execution of the download table command in a separate environment for testing purposes
     """
-    Implementing Lookup table download
+    Implementing lookup table download (?TD).
+    Command 1 downloads a page of table data, command 2 starts the verification of the downloaded tables and
+    command 0 queries the status.
     """
     _PAYLOAD_START = '?TD'
-    def __init__(self,table_data = None, address=0, table_instance=1, offset_bytes=0):
+    _RESPONSE_LENGTH = 12
+    PAGE_SIZE = 256
+
+    def __init__(self, command=0, table_instance=1, offset=0, data=b"", address=0):
         """
-        Create a query to set a parameter value.
-        :data : list (lookup table)
+        Create a query to download a page of a table or to control the download.
+        :param command: int
+        :param table_instance: int: 1...4, only used by command 1
+        :param offset: int: byte offset of the page in the table image, only used by command 1
+        :param data: bytes: up to PAGE_SIZE bytes of the table image, padded with zeros
         :param address: int
-        :param table_instances: list
         """
-        
-        super(TD,self).__init__(address, parameter_instance = None,  table = True, table_instance = 1)
-        
-        self.PAYLOAD.append("{:08X}".format(offset_bytes))
-        for byte in table_data:
-            self.PAYLOAD.append("{:02X}".format(int(byte)))
+        super(TD, self).__init__(parameter=None, address=address, parameter_instance=None)
+        self.COMMAND = command
+        self.TABLE_INSTANCE = table_instance
+        self.OFFSET = offset
+        self.DATA = bytes(data)
 
+        self.PAYLOAD.append("{:02X}".format(command))
+        if command == 1:
+            self.PAYLOAD.append("{:02X}{:08X}".format(table_instance, offset))
+            self.PAYLOAD.append(hexlify(bytes(data).ljust(self.PAGE_SIZE, b"\0")).upper())
 
-        
 
 class RS(Query):
     """
     Implementing system reset.
     """
     _PAYLOAD_START = 'RS'
+    _RESPONSE_LENGTH = 10
 
     def __init__(self, address=0, parameter_instance=1):
         """
@@ -356,6 +441,7 @@ class IF(Query):
     Implementing device info query.
     """
     _PAYLOAD_START = '?IF'
+    _RESPONSE_LENGTH = 30
 
     def __init__(self, address=0, parameter_instance=1):
         """
@@ -373,9 +459,8 @@ class IF(Query):
 
 
 class TDResponse(MeFrame):
-    ### Currently not in use, execution of the download table command in a separate environment for testing purposes
     """
-    Frame for the device response to TD querry
+    Frame for the device response to a TD() query, the payload is the download status.
     """
     _SOURCE = "!"
 
@@ -385,12 +470,11 @@ class TDResponse(MeFrame):
         :param frame_bytes: bytes
         :return:
         """
-        frame_bytes = self._SOURCE.encode() + frame_bytes
-        self._decompose_header(frame_bytes)
-        frame = frame_bytes.decode()
-        self.PAYLOAD = "0"+ frame[8]
-        self.CRC = int(frame[-4:], 16)
-        
+        frame = memoryview(frame_bytes)
+        self._decompose_header(frame)
+        self.PAYLOAD = [int(bytes(frame[6:8]), 16)]
+        self._check_crc(frame)  # sets crc or raises
+
 
 class VRResponse(MeFrame):
     """
@@ -405,7 +489,8 @@ class VRResponse(MeFrame):
         :param response_format: str
         """
         super(VRResponse, self).__init__()
-        self._RESPONSE_FORMAT = self._TYPES[response_format]
+        assert response_format in STRUCTS
+        self._RESPONSE_FORMAT = response_format
 
     def decompose(self, frame_bytes):
         """
@@ -414,12 +499,11 @@ class VRResponse(MeFrame):
         :return:
         """
         assert self._RESPONSE_FORMAT is not None
-        frame_bytes = self._SOURCE.encode() + frame_bytes
-        self._decompose_header(frame_bytes)
+        frame = memoryview(frame_bytes)
+        self._decompose_header(frame)
 
-        frame = frame_bytes.decode()
-        self.PAYLOAD = [unpack(self._RESPONSE_FORMAT, bytes.fromhex(frame[7:15]))[0]]  # convert hex to float or int
-        self.crc(int(frame[-4:], 16))  # sets crc or raises
+        self.PAYLOAD = [decode_value(frame, self._RESPONSE_FORMAT)]  # convert hex to float or int
+        self._check_crc(frame)  # sets crc or raises
 
 
 class ACK(MeFrame):
@@ -434,11 +518,9 @@ class ACK(MeFrame):
         :param frame_bytes: bytes
         :return:
         """
-        frame_bytes = self._SOURCE.encode() + frame_bytes
-        self._decompose_header(frame_bytes)
-        
-        frame = frame_bytes.decode()
-        self.CRC = int(frame[-4:], 16)
+        frame = memoryview(frame_bytes)
+        self._decompose_header(frame)
+        self.CRC = decode_crc(frame)
         
 
 class IFResponse(MeFrame):
@@ -461,12 +543,10 @@ class IFResponse(MeFrame):
         :param frame_bytes: bytes
         :return:
         """
-        frame_bytes = self._SOURCE.encode() + frame_bytes
-        self._decompose_header(frame_bytes)
-
-        frame = frame_bytes.decode()
-        self.PAYLOAD = frame[7:-4]
-        self.CRC = int(frame[-4:], 16)
+        frame = memoryview(frame_bytes)
+        self._decompose_header(frame)
+        self.PAYLOAD = bytes(frame[6:-4]).decode()
+        self.CRC = decode_crc(frame)
 
 
 class DeviceError(MeFrame):
@@ -475,25 +555,15 @@ class DeviceError(MeFrame):
     """
     _SOURCE = "!"
 
-    def __init__(self):
-        """
-        Read error codes from command.py and parse into a list of Error() instances.
-        """
-        super(DeviceError, self).__init__()
-        self._ERRORS = []
-        for error in ERRORS:
-            self._ERRORS.append(Error(error))
-
-    def _get_by_code(self, code):
+    @staticmethod
+    def _get_by_code(code):
         """
         Returns a Error() identified by it's error code.
         :param code: int
         :return: Error()
         """
-        for error in self._ERRORS:
-            if error.code == code:
-                return error
         # we do not need to raise here since error are well defined
+        return ERRORS_BY_CODE.get(code)
 
     def compose(self, part=False):
         """
@@ -523,12 +593,11 @@ class DeviceError(MeFrame):
         :param frame_bytes: bytes
         :return:
         """
-        frame_bytes = self._SOURCE.encode() + frame_bytes
-        self._decompose_header(frame_bytes)
-        frame = frame_bytes.decode()
-        self.PAYLOAD.append(frame[7])
-        self.PAYLOAD.append(int(frame[8:10], 16))
-        self.crc(int(frame[-4:], 16))
+        frame = memoryview(frame_bytes)
+        self._decompose_header(frame)
+        self.PAYLOAD.append(chr(frame[6]))
+        self.PAYLOAD.append(int(bytes(frame[7:9]), 16))
+        self._check_crc(frame)
 
     def error(self):
         """
@@ -540,6 +609,20 @@ class DeviceError(MeFrame):
         return self._get_by_code(error_code).as_list()
 
 
+class _Flight(object):
+    """
+    A read in flight, shared by all threads asking for the same value meanwhile.
+    """
+    __slots__ = ("done", "value", "error", "generation")
+
+    def __init__(self, generation):
+        self.done = Event()
+        self.value = None
+        self.error = None
+        # number of writes finished when the read started
+        self.generation = generation
+
+
 class MeCom:
     """
     Main class. Import this one:
@@ -549,23 +632,52 @@ class MeCom:
     """
     SEQUENCE_COUNTER = 1
 
-    def __init__(self, serialport="/dev/ttyUSB0", timeout=1, baudrate=57600,metype = 'LDD'):
+    def __init__(self, serialport="/dev/ttyUSB0", timeout=1, baudrate=57600,metype = 'LDD', pipeline_depth=4,
+                 serial_instance=None, cache=None,
+                 metrics=None, retry=None, coalesce=False):
         """
         Initialize communication with serial port.
         :param serialport: str
         :param timeout: int
         :param metype: str: either 'TEC' or 'LDD'
+        :param pipeline_depth: int: max number of queries in flight during a transaction()
+        :param serial_instance: an already opened Serial (or compatible object) to use instead of serialport
+        :param cache: ParameterCache: serve get_parameter() from a read cache, disabled by default
+        :param metrics: Metrics: record latencies, traffic and errors, disabled by default
+        :param retry: RetryPolicy: send queries again after transient errors, disabled by default
+        :param coalesce: bool: concurrent get_parameter() calls for the same value share one query
         """
         # initialize serial connection
-        self.ser = Serial(port=serialport, timeout=timeout, write_timeout=timeout, baudrate=baudrate)
+        if serial_instance is not None:
+            self.ser = serial_instance
+        else:
+            self.ser = Serial(port=serialport, timeout=timeout, write_timeout=timeout, baudrate=baudrate)
         self.ser_lock = Lock()
+        # bytes received from serial which do not yet form a complete frame
+        self._rx_buffer = bytearray()
+        self.pipeline_depth = pipeline_depth
+        self.cache = cache
+        self.metrics = metrics
+        self.retry = retry
+        self.coalesce = coalesce
+        # (address, parameter id, instance) -> _Flight
+        self._flights = {}
+        self._flights_lock = Lock()
+        # number of writes finished, and the number when the last write to a value, to an address (address,) or to
+        # all devices () finished
+        self._generation = 0
+        self._writes = {}
+        # wire reads saved by coalescing
+        self.coalesced = 0
+        # Subscriptions, created by the first subscribe()
+        self._subscriptions = None
 
         # start protocol thread
         # self.protocol = ReaderThread(serial_instance=self.ser, protocol_factory=MePacket)
         # self.receiver = self.protocol.__enter__()
 
         # initialize parameters
-        self.PARAMETERS = ParameterList(metype)
+        self.PARAMETERS = ParameterList.get(metype)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.ser.__exit__(exc_type, exc_val, exc_tb)
@@ -574,8 +686,12 @@ class MeCom:
         return self
 
     def stop(self):
-        self.ser.flush()
-        self.ser.close()
+        if self._subscriptions is not None:
+            self._subscriptions.stop()
+        # an exchange of another thread finishes before the port is closed
+        with self.ser_lock:
+            self.ser.flush()
+            self.ser.close()
 
     def _find_parameter(self, parameter_name, parameter_id):
         """
@@ -587,6 +703,25 @@ class MeCom:
         return self.PARAMETERS.get_by_name(parameter_name) if parameter_name is not None\
             else self.PARAMETERS.get_by_id(parameter_id)
 
+    def _lookup(self, parameter):
+        """
+        Return Parameter() for a name (str) or an id (int).
+        :param parameter: str or int
+        :return: Parameter
+        """
+        if isinstance(parameter, str):
+            return self.PARAMETERS.get_by_name(parameter)
+        return self.PARAMETERS.get_by_id(parameter)
+
+    @staticmethod
+    def _cache_key(kwargs):
+        """
+        Return address and parameter instance of a query from the keyword arguments of get/set_parameter.
+        :param kwargs: dict
+        :return: (int, int)
+        """
+        return kwargs.get("address", 0), kwargs.get("parameter_instance", 1)
+
     def _inc(self):
         self.SEQUENCE_COUNTER += 1
         # sequence in controller is int16 and overflows 
@@ -614,47 +749,238 @@ class MeCom:
         else:
             return recv
 
+    def _read_frame(self):
+        """
+        Read one frame up to the carriage return and return it without the carriage return.
+        Everything waiting in the input buffer is fetched with a single read, bytes following the carriage return
+        are kept for the next call. If nothing is waiting, a single byte is requested, hence the serial timeout
+        applies to the gap between two received chunks and a silent device raises ResponseTimeout.
+        :return: bytes
+        """
+        buffer = self._rx_buffer
+        end = buffer.find(b"\r")
+        while end < 0:
+            start = len(buffer)
+            buffer += self._read(size=max(1, self.ser.in_waiting))
+            end = buffer.find(b"\r", start)
+        frame = bytes(buffer[:end])
+        del buffer[:end + 1]
+        return frame
+
+    def _exchange(self, query):
+        """
+        Send a query and read until the reply with the same sequence number arrives, replies to earlier queries (e.g.
+        late replies of a query which timed out) and garbled frames are dropped. Call with ser_lock held.
+        :param query: Query
+        :return:
+        """
+        metrics = self.metrics
+
+        query.set_sequence(self.SEQUENCE_COUNTER)
+        # increment sequence counter
+        self._inc()
+        # send query
+        frame = query.compose()
+        self.ser.write(frame)
+
+        # flush write cache
+        self.ser.flush()
+        if metrics is not None:
+            metrics.bytes_sent += len(frame)
+
+        while True:
+            # read until stop byte
+            response_frame = self._read_frame()
+            if metrics is not None:
+                metrics.bytes_received += len(response_frame) + 1
+            # response is !AASSSS..., the sequence identifies the query
+            if self._sequence_of(response_frame) == query.SEQUENCE:
+                break
+
+        # strip source byte (! or #, but for a response always !)
+        query.set_response(response_frame[1:])
+
+    @staticmethod
+    def _sequence_of(response_frame):
+        """
+        Returns the sequence number of a received frame or None if the header is garbled.
+        :param response_frame: bytes
+        :return: int
+        """
+        try:
+            return int(response_frame[3:7], 16)
+        except ValueError:
+            return None
+
+    def _retry(self, query, error, attempt):
+        """
+        Decide whether a failed query is sent again according to the retry policy and count the retry.
+        :param query: Query
+        :param error: Exception
+        :param attempt: int: number of failed attempts so far
+        :return: bool
+        """
+        if self.retry is None or not self.retry.retriable(query, error, attempt):
+            return False
+        if self.metrics is not None:
+            self.metrics.retries += 1
+        return True
+
+    def _backoff(self, attempt):
+        """
+        Wait before the next attempt as given by the retry policy.
+        :param attempt: int
+        :return:
+        """
+        delay = self.retry.delay(attempt)
+        if delay > 0:
+            time.sleep(delay)
+
     def _execute(self, query):
+        metrics = self.metrics
+        if metrics is not None:
+            requested = time.perf_counter()
         self.ser_lock.acquire()
         
         try:
-            # clear buffers
+            if metrics is not None:
+                metrics.lock_wait.observe(time.perf_counter() - requested)
+
+            # clear buffers once, a retry drains stale replies by their sequence instead
             self.ser.reset_output_buffer()
             self.ser.reset_input_buffer()
-    
-            query.set_sequence(self.SEQUENCE_COUNTER)
-            # send query
-            self.ser.write(query.compose())
-            # print(query.compose())
-    
-            # flush write cache
-            self.ser.flush()
-    
-            # initialize response and carriage return
-            cr = "\r".encode()
-            response_frame = b''
-            response_byte = self._read(size=1)  # read one byte at a time, timeout is set on instance level
-    
-            # read until stop byte
-            while response_byte != cr:
-                response_frame += response_byte
-                response_byte = self._read(size=1)
+            del self._rx_buffer[:]
+
+            attempt = 0
+            while True:
+                start = time.perf_counter()
+                try:
+                    self._exchange(query)
+                    # did we encounter an error?
+                    self._raise(query)
+                    if metrics is not None:
+                        metrics.query(query, time.perf_counter() - start)
+                    break
+                except Exception as ex:
+                    if metrics is not None:
+                        metrics.query(query, time.perf_counter() - start, ex)
+                    attempt += 1
+                    if not self._retry(query, ex, attempt):
+                        raise
+                    self._backoff(attempt)
         finally:
-            # increment sequence counter
-            self._inc()
             self.ser_lock.release()
 
-        # strip source byte (! or #, but for a response always !)
-        response_frame = response_frame[1:]
+        return query
 
-        # print(response_frame)
+    def transaction(self, queries, depth=None, raise_errors=True):
+        """
+        Execute several queries while holding the serial lock only once.
+        The buffers are cleared once, up to depth frames are written together and every further frame is sent as soon
+        as a reply has been received. Replies are matched to their query by the sequence number, replies without a
+        pending query are dropped. Queries which time out or receive a corrupted reply are sent again if the retry
+        policy allows it. Device errors are raised after all replies have been received.
+        :param queries: list of Query
+        :param depth: int: max number of queries in flight, defaults to pipeline_depth
+        :param raise_errors: bool: if False, device errors stay in RESPONSE and a query with a corrupted reply has
+        RESPONSE None instead of raising, timeouts are raised anyway
+        :return: list of Query
+        """
+        queries = list(queries)
+        depth = self.pipeline_depth if depth is None else depth
+        assert depth >= 1
+
+        metrics = self.metrics
+        if metrics is not None:
+            requested = time.perf_counter()
+        self.ser_lock.acquire()
+        try:
+            if metrics is not None:
+                metrics.lock_wait.observe(time.perf_counter() - requested)
 
-        query.set_response(response_frame)
+            # clear buffers
+            self.ser.reset_output_buffer()
+            self.ser.reset_input_buffer()
+            del self._rx_buffer[:]
+
+            todo = deque(queries)
+            # sequence -> (query, time the query was written)
+            pending = {}
+            # query -> number of failed attempts
+            attempts = {}
+            while todo or pending:
+                # fill the pipeline and send all new frames with a single write
+                sending = []
+                while todo and len(pending) + len(sending) < depth:
+                    query = todo.popleft()
+                    query.set_sequence(self.SEQUENCE_COUNTER)
+                    self._inc()
+                    sending.append(query)
+                if sending:
+                    frames = b"".join([query.compose() for query in sending])
+                    self.ser.write(frames)
+                    self.ser.flush()
+                    now = time.perf_counter()
+                    for query in sending:
+                        pending[query.SEQUENCE] = (query, now)
+                    if metrics is not None:
+                        metrics.bytes_sent += len(frames)
+
+                try:
+                    response_frame = self._read_frame()
+                except ResponseTimeout as ex:
+                    # every query in flight is lost, they are sent again in their original order
+                    failed = list(pending.values())
+                    pending.clear()
+                    now = time.perf_counter()
+                    for query, sent in failed:
+                        if metrics is not None:
+                            metrics.query(query, now - sent, ex)
+                        attempts[query] = attempts.get(query, 0) + 1
+                        if not self._retry(query, ex, attempts[query]):
+                            raise
+                    todo.extendleft(reversed([query for query, sent in failed]))
+                    self._backoff(max(attempts[query] for query, sent in failed))
+                    continue
+
+                if metrics is not None:
+                    metrics.bytes_received += len(response_frame) + 1
+                item = pending.pop(self._sequence_of(response_frame), None)
+                if item is None:
+                    continue
+                query, sent = item
+                latency = time.perf_counter() - sent
+                try:
+                    # strip source byte
+                    query.set_response(response_frame[1:])
+                except (WrongChecksum, WrongResponseSequence, MalformedResponse) as ex:
+                    if metrics is not None:
+                        metrics.query(query, latency, ex)
+                    attempts[query] = attempts.get(query, 0) + 1
+                    if self._retry(query, ex, attempts[query]):
+                        todo.appendleft(query)
+                        self._backoff(attempts[query])
+                    elif raise_errors:
+                        raise
+                    else:
+                        query.RESPONSE = None
+                    continue
+                if metrics is not None:
+                    try:
+                        self._raise(query)
+                    except ResponseException as ex:
+                        metrics.query(query, latency, ex)
+                    else:
+                        metrics.query(query, latency)
+        finally:
+            self.ser_lock.release()
 
         # did we encounter an error?
-        self._raise(query)
+        if raise_errors:
+            for query in queries:
+                self._raise(query)
 
-        return query
+        return queries
 
     def _get(self, parameter_name=None, parameter_id=None, *args, **kwargs):
         """
@@ -699,54 +1025,213 @@ class MeCom:
         # return the query with response
         return vs
     
-    def execute_lookup_table(self, payload):
-        """
-        Payload: raw commaand with the data of the table
+    def table_download(self, command, table_instance=1, offset=0, data=b"", *args, **kwargs):
+        """
+        Execute a lookup table download command, see TD().
+        Returns the status reported by the device.
+        :param command: int
+        :param table_instance: int
+        :param offset: int
+        :param data: bytes
+        :param args:
+        :param kwargs:
+        :return: int
         """
-        self.ser_lock.acquire()
-        com_query = "#01"+"{:04X}".format(self.SEQUENCE)+payload
-        crc = CRCCCITT().calculate(input_data=com_query.endode())
-        cr = "\r"
-        com_query += crc+cr
-        try:
-            # clear buffers
-            self.ser.reset_output_buffer()
-            self.ser.reset_input_buffer()
-            # send query
-            self.ser.write(com_query)
-            # flush write cache
-            self.ser.flush()# initialize response and carriage return
-            cr = "\r".encode()
-            response_frame = b''
-            response_byte = self._read(size=1)  # read one byte at a time, timeout is set on instance level
-            # read until stop byte
-            while response_byte != cr:
-                response_frame += response_byte
-                response_byte = self._read(size=1)
-        finally:
-            # increment sequence counter
-            self._inc()
-            self.ser_lock.release()
+        td = self._execute(TD(command=command, table_instance=table_instance, offset=offset, data=data, *args, **kwargs))
+        return td.RESPONSE.PAYLOAD[0]
 
-        # strip source byte (! or #, but for a response always !)
-        return int(response_frame.decode()[8])
-        
-        
-
-    def get_parameter(self, parameter_name=None, parameter_id=None, *args, **kwargs):
+    def get_parameter(self, parameter_name=None, parameter_id=None, *args, use_cache=True, **kwargs):
         """
         Get the value of a parameter given by name or id.
         Returns a list of success and value.
         :param parameter_name:
         :param parameter_id:
         :param args:
+        :param use_cache: bool: False bypasses the cache (if any), the value read still updates it
         :param kwargs:
         :return: int or float
         """
-        # get the query object
-        vr = self._get(parameter_id=parameter_id, parameter_name=parameter_name, *args, **kwargs)
+        if self.cache is None and not self.coalesce:
+            # get the query object
+            vr = self._get(parameter_id=parameter_id, parameter_name=parameter_name, *args, **kwargs)
+            return vr.RESPONSE.PAYLOAD[0]
+
+        parameter = self._find_parameter(parameter_name, parameter_id)
+        value = None
+        if use_cache and self.cache is not None:
+            address, instance = self._cache_key(kwargs)
+            value = self.cache.get(address, parameter, instance)
+        if value is None:
+            value = self._get_once(parameter, *args, **kwargs)
+        return value
+
+    def _get_once(self, parameter, *args, **kwargs):
+        """
+        Read a parameter from the device and update the cache. With coalesce, a thread asking for a value which is
+        already being read waits for that read and gets its value or exception, never an older value.
+        :param parameter: Parameter
+        :param args:
+        :param kwargs:
+        :return: int or float
+        """
+        address, instance = self._cache_key(kwargs)
+        # a write finishing while we read keeps our value out of the cache
+        generation = None if self.cache is None else self.cache.generation
+        if not self.coalesce:
+            value = self._execute(VR(parameter=parameter, *args, **kwargs)).RESPONSE.PAYLOAD[0]
+            if self.cache is not None:
+                self.cache.put(address, parameter, instance, value, generation)
+            return value
+
+        key = (address, parameter.id, instance)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            # a read started before the last write may return the value from before
+            leader = flight is None or flight.generation < self._last_write(key)
+            if leader:
+                flight = self._flights[key] = _Flight(self._generation)
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._execute(VR(parameter=parameter, *args, **kwargs)).RESPONSE.PAYLOAD[0]
+            if self.cache is not None:
+                self.cache.put(address, parameter, instance, flight.value, generation)
+        except Exception as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self._flights_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        return flight.value
 
-        return vr.RESPONSE.PAYLOAD[0]
+    def _last_write(self, key):
+        """
+        Returns the generation of the last write which may have changed a value, call with _flights_lock held.
+        :param key: (address, parameter id, instance)
+        :return: int
+        """
+        writes = self._writes
+        return max(writes.get(key, 0), writes.get(key[:1], 0), writes.get((), 0))
+
+    def _written(self, address, parameter, instance, value, acknowledged):
+        """
+        Account for a finished (or failed) write: update the cache and keep later reads from joining a read started
+        before the write.
+        :param address: int
+        :param parameter: Parameter
+        :param instance: int
+        :param value: int or float: as sent
+        :param acknowledged: bool
+        :return:
+        """
+        if address == 0:
+            self._wrote(())
+        elif parameter.name == "Device Address":
+            self._wrote((address,))
+        else:
+            self._wrote((address, parameter.id, instance))
+        if self.cache is not None:
+            self.cache.written(address, parameter, instance, value, acknowledged=acknowledged)
+
+    def _wrote(self, key):
+        """
+        Start a new generation after a write to a value (address, parameter id, instance), to any value of an
+        address (address,) or of all devices ().
+        :param key: tuple
+        :return:
+        """
+        if self.coalesce:
+            with self._flights_lock:
+                self._generation += 1
+                self._writes[key] = self._generation
+
+    def get_parameters(self, parameters, depth=None, *args, use_cache=True, **kwargs):
+        """
+        Get the values of several parameters given by name (str) or id (int) within one transaction().
+        Returns the values in the order of parameters. With a cache, only the missing values are read.
+        :param parameters: list of str or int
+        :param depth: int
+        :param args:
+        :param use_cache: bool
+        :param kwargs:
+        :return: list of int or float
+        """
+        parameters = [self._lookup(parameter) for parameter in parameters]
+        if self.cache is None:
+            queries = [VR(parameter=parameter, *args, **kwargs) for parameter in parameters]
+            return [vr.RESPONSE.PAYLOAD[0] for vr in self.transaction(queries, depth=depth)]
+
+        address, instance = self._cache_key(kwargs)
+        values = [self.cache.get(address, parameter, instance) if use_cache else None for parameter in parameters]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            generation = self.cache.generation
+            queries = [VR(parameter=parameters[i], *args, **kwargs) for i in missing]
+            for i, vr in zip(missing, self.transaction(queries, depth=depth)):
+                values[i] = vr.RESPONSE.PAYLOAD[0]
+                self.cache.put(address, parameters[i], instance, values[i], generation)
+        return values
+
+    def set_parameters(self, values, address=0, parameter_instance=1, verify=False, tolerance=1e-3, depth=None):
+        """
+        Set several parameters given by name (str) or id (int) within one transaction().
+        Every value is checked against the format of its parameter before anything is sent. Returns for every
+        parameter whether the device acknowledged the value (and, with verify, reads back the same value; floats
+        are compared with a relative tolerance as the device may round them).
+        :param values: dict: name or id -> int or float
+        :param address: int
+        :param parameter_instance: int
+        :param verify: bool: read all values back in a second transaction
+        :param tolerance: float: relative tolerance of the float comparison
+        :param depth: int
+        :return: dict: name or id -> bool
+        """
+        # validate everything first, a half written configuration is worse than none
+        checked = []
+        for key, value in values.items():
+            parameter = self._lookup(key)
+            try:
+                value = check_value(value, parameter.format)
+            except ValueError as ex:
+                raise ValueError("{}: {}".format(parameter.name, ex))
+            checked.append((key, parameter, value))
+
+        queries = [VS(value=value, parameter=parameter, address=address, parameter_instance=parameter_instance)
+                   for key, parameter, value in checked]
+        try:
+            self.transaction(queries, depth=depth, raise_errors=False)
+        finally:
+            # also after a timeout, the device may have taken some of the values
+            for (key, parameter, value), vs in zip(checked, queries):
+                self._written(address, parameter, parameter_instance, vs.PAYLOAD[-1],
+                              acknowledged=type(vs.RESPONSE) is ACK)
+
+        results = {}
+        for (key, parameter, value), vs in zip(checked, queries):
+            results[key] = type(vs.RESPONSE) is ACK
+
+        if verify:
+            written = [(key, parameter, value) for key, parameter, value in checked if results[key]]
+            queries = [VR(parameter=parameter, address=address, parameter_instance=parameter_instance)
+                       for key, parameter, value in written]
+            self.transaction(queries, depth=depth, raise_errors=False)
+            for (key, parameter, value), vr in zip(written, queries):
+                if type(vr.RESPONSE) is not VRResponse:
+                    results[key] = False
+                elif parameter.format == "FLOAT32":
+                    results[key] = math.isclose(vr.RESPONSE.PAYLOAD[0], value, rel_tol=tolerance, abs_tol=1e-12)
+                else:
+                    results[key] = vr.RESPONSE.PAYLOAD[0] == value
+
+        return results
 
     def set_parameter(self, value, parameter_name=None, parameter_id=None, *args, **kwargs):
         """
@@ -760,7 +1245,18 @@ class MeCom:
         :return: bool
         """
         # get the query object
-        vs = self._set(value=value, parameter_id=parameter_id, parameter_name=parameter_name, *args, **kwargs)
+        try:
+            vs = self._set(value=value, parameter_id=parameter_id, parameter_name=parameter_name, *args, **kwargs)
+        except (ResponseException, WrongChecksum):
+            # the device may or may not have taken the value
+            address, instance = self._cache_key(kwargs)
+            self._written(address, self._find_parameter(parameter_name, parameter_id), instance, value,
+                          acknowledged=False)
+            raise
+
+        address, instance = self._cache_key(kwargs)
+        # the value as sent, converted to the format of the parameter
+        self._written(address, vs.PARAMETER, instance, vs.PAYLOAD[-1], acknowledged=type(vs.RESPONSE) is ACK)
 
         # check if value setting has succeeded
         #
@@ -778,6 +1274,10 @@ class MeCom:
         Resets the device after an error has occured
         """
         rs = self._execute(RS(*args, **kwargs))
+        address = kwargs.get("address", 0)
+        self._wrote(() if address == 0 else (address,))
+        if self.cache is not None:
+            self.cache.invalidate(address=None if address == 0 else address)
         return type(rs.RESPONSE) == ACK
     
     def info(self,*args, **kwargs):
@@ -787,6 +1287,19 @@ class MeCom:
         info = self._execute(IF(*args, **kwargs))
         return info.RESPONSE.PAYLOAD
 
+    def stats(self):
+        """
+        Returns a snapshot of the metrics, the cache statistics and the number of coalesced reads, empty if all are
+        disabled.
+        :return: dict
+        """
+        stats = {} if self.metrics is None else self.metrics.snapshot()
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.coalesce:
+            stats["coalesced"] = self.coalesced
+        return stats
+
 
     
     # returns device address
@@ -806,6 +1319,16 @@ class MeCom:
         # query device status
         status_id = self.get_parameter(parameter_name="Device Status", *args, **kwargs)
 
+        # return address and status
+        return self._status_name(status_id)
+
+    @staticmethod
+    def _status_name(status_id):
+        """
+        Translate the value of "Device Status" into a readable str.
+        :param status_id: int
+        :return: str
+        """
         if status_id == 0:
             status_name = "Init"
         elif status_id == 1:
@@ -821,35 +1344,97 @@ class MeCom:
         else:
             status_name = "Unknown"
 
-        # return address and status
         return status_name
 
     # enable or disable auto saving to flash
     enable_autosave = partialmethod(set_parameter, value=0, parameter_name="Save Data to Flash")
     disable_autosave = partialmethod(set_parameter, value=1, parameter_name="Save Data to Flash")
 
-    def write_to_flash(self, *args, **kwargs):
+    def wait_for(self, parameter, predicate, timeout=10.0, interval=0.005, max_interval=0.5, **kwargs):
+        """
+        Poll a parameter given by name (str) or id (int) until predicate(value) is true, or until it equals predicate
+        if that is not callable. The first poll is immediate, the interval between polls starts at interval and is
+        doubled up to max_interval, hence short waits are detected within a few ms and long ones cost few queries.
+        Returns the last value and the elapsed time in seconds, raises ResponseTimeout after timeout seconds.
+        :param parameter: str or int
+        :param predicate: callable(value) -> bool, or the expected value
+        :param timeout: float
+        :param interval: float
+        :param max_interval: float
+        :param kwargs:
+        :return: (int or float, float)
+        """
+        parameter = self._lookup(parameter)
+        if not callable(predicate):
+            expected = predicate
+            predicate = lambda value: value == expected
+        start = time.monotonic()
+        delay = interval
+
+        while True:
+            value = self.get_parameter(parameter_id=parameter.id, use_cache=False, **kwargs)
+            elapsed = time.monotonic() - start
+            if predicate(value):
+                return value, elapsed
+            # check for timeout
+            if elapsed >= timeout:
+                raise ResponseTimeout("{} = {} after {:.1f} s".format(parameter.name, value, elapsed))
+            time.sleep(min(delay, timeout - elapsed))
+            delay = min(2 * delay, max_interval)
+
+    def subscribe(self, parameter, callback, interval=1.0, deadband=0.0, address=0, parameter_instance=1):
+        """
+        Call callback(value) whenever a parameter given by name (str) or id (int) moved by more than deadband since
+        the last call, with None when it can not be read any more and again with the value once it can. The first
+        call comes with the current value right after subscribing.
+        All subscriptions of a session are polled by one background thread: every value is read once per interval
+        (the shortest one of its listeners) and values due together are read within one transaction. Callbacks run
+        in that thread and should return quickly.
+        :param parameter: str or int
+        :param callback: callable(value)
+        :param interval: float: seconds between polls
+        :param deadband: float: changes up to this size are not notified, 0 notifies every change
+        :param address: int
+        :param parameter_instance: int
+        :return: Subscription, call cancel() to unsubscribe
+        """
+        if self._subscriptions is None:
+            from .subscriptions import Subscriptions
+            self._subscriptions = Subscriptions(self)
+        return self._subscriptions.add(self._lookup(parameter), callback, interval, deadband, address,
+                                       parameter_instance)
+
+    def wait_until_stable(self, timeout=60.0, **kwargs):
+        """
+        Wait until the temperature control loop is stable (TEC only).
+        Returns the time waited in seconds.
+        :param timeout: float
+        :param kwargs:
+        :return: float
+        """
+        # value 2 means "stable"
+        value, elapsed = self.wait_for("Temperature is Stable", 2, timeout=timeout, max_interval=1.0, **kwargs)
+        return elapsed
+
+    def write_to_flash(self, timeout=10.0, **kwargs):
         """
         Write parameters to flash.
-        :param args:
+        :param timeout: float
         :param kwargs:
         :return: bool
         """
-        self.enable_autosave()
-        timer_start = time.time()
+        self.enable_autosave(**kwargs)
 
-        # value 0 means "All Parameters are saved to Flash"
-        while self.get_parameter(parameter_name="Flash Status") != 0:
-            # check for timeout
-            if time.time() - timer_start > 10:
-                raise ResponseTimeout("writing to flash timed out!")
-            time.sleep(0.5)
+        try:
+            # value 0 means "All Parameters are saved to Flash"
+            self.wait_for("Flash Status", 0, timeout=timeout, **kwargs)
+        except ResponseTimeout:
+            raise ResponseTimeout("writing to flash timed out!")
 
-        self.disable_autosave()
+        self.disable_autosave(**kwargs)
 
         return True
 
-
 if __name__ == "__main__":
     with MeCom("/dev/ttyUSB0") as mc:
         # # which device are we talking to?
@@ -0,0 +1,185 @@
+"""
+Latency, throughput and error instrumentation of a MeCom session, see MeCom(metrics=Metrics()).
+"""
+
+from bisect import bisect_left
+from collections import Counter
+
+# upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, float("inf"))
+
+
+class Histogram(object):
+    """
+    Counts observations in buckets with fixed upper bounds, like a Prometheus histogram.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        """
+        :param bounds: tuple of float: ascending upper bounds, the last one should be inf
+        """
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Add an observation.
+        :param value: float
+        :return:
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket containing the q-quantile, None if nothing has been observed.
+        :param q: float: 0...1
+        :return: float
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def snapshot(self):
+        """
+        Returns count, mean, median and 99 % quantile (bucket bounds) as dict.
+        :return: dict
+        """
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics(object):
+    """
+    Collects per query type and per parameter latency histograms, bytes sent and received, error and retry counters
+    and the time spent waiting for the serial lock.
+    All updates are made by the session while it holds its serial lock, hence a Metrics must not be shared by several
+    sessions. The callback is called with the lock held as well and should return quickly.
+
+    mc = MeCom("/dev/ttyUSB0", metrics=Metrics())
+    ...
+    print(mc.stats())
+    print(mc.metrics.prometheus())
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, callback=None):
+        """
+        :param buckets: tuple of float: upper bounds of the latency histograms in seconds
+        :param callback: callable(query, latency, error), called for every finished query, error is None or the
+        exception raised
+        """
+        self.buckets = buckets
+        self.callback = callback
+        # (query type, parameter name or "") -> Histogram
+        self.latency = {}
+        self.lock_wait = Histogram(buckets)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # exception name -> count
+        self.errors = Counter()
+        self.retries = 0
+
+    def query(self, query, latency, error=None):
+        """
+        Record a finished query (successful or not).
+        :param query: Query
+        :param latency: float: seconds from sending to receiving the response
+        :param error: Exception
+        :return:
+        """
+        parameter = query.PARAMETER
+        key = (type(query).__name__, "" if parameter is None else parameter.name)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(self.buckets)
+        histogram.observe(latency)
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+        if self.callback is not None:
+            self.callback(query, latency, error)
+
+    def error(self, error):
+        """
+        Count an error which can not be attributed to a query.
+        :param error: Exception
+        :return:
+        """
+        self.errors[type(error).__name__] += 1
+
+    def snapshot(self):
+        """
+        Returns all metrics as dict.
+        :return: dict
+        """
+        return {
+            "latency": {"{} {}".format(*key).strip(): histogram.snapshot()
+                        for key, histogram in sorted(self.latency.items())},
+            "lock_wait": self.lock_wait.snapshot(),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "errors": dict(self.errors),
+            "retries": self.retries,
+        }
+
+    def prometheus(self, prefix="mecom", labels=None):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        :param prefix: str: prefix of the metric names
+        :param labels: dict: labels added to every sample, e.g. {"port": "/dev/ttyUSB0"}
+        :return: str
+        """
+        common = ['{}="{}"'.format(name, _escape(value)) for name, value in sorted((labels or {}).items())]
+        lines = []
+
+        def sample(name, label, value):
+            label = ",".join(common + label)
+            lines.append("{}_{}{} {}".format(prefix, name, "{" + label + "}" if label else "", value))
+
+        def header(name, help_text, metric_type):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, metric_type))
+
+        def histogram(name, help_text, items):
+            header(name, help_text, "histogram")
+            for label, h in items:
+                cumulative = 0
+                for bound, count in zip(h.bounds, h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    sample(name + "_bucket", label + ['le="{}"'.format(le)], cumulative)
+                sample(name + "_sum", label, repr(h.sum))
+                sample(name + "_count", label, h.count)
+
+        def counter(name, help_text, items):
+            header(name, help_text, "counter")
+            for label, value in items:
+                sample(name, label, value)
+
+        histogram("query_latency_seconds", "Round trip time of a query.",
+                  [(['query="{}"'.format(query), 'parameter="{}"'.format(_escape(parameter))], h)
+                   for (query, parameter), h in sorted(self.latency.items())])
+        histogram("lock_wait_seconds", "Time spent waiting for the serial port lock.", [([], self.lock_wait)])
+        counter("bytes_sent_total", "Bytes written to the serial port.", [([], self.bytes_sent)])
+        counter("bytes_received_total", "Bytes read from the serial port.", [([], self.bytes_received)])
+        counter("errors_total", "Failed queries by exception.",
+                [(['error="{}"'.format(name)], count) for name, count in sorted(self.errors.items())])
+        counter("retries_total", "Queries sent again after a transient error.", [([], self.retries)])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
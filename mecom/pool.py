@@ -0,0 +1,259 @@
+"""
+Process-wide pool of MeCom sessions, one shared and reference counted session per serial port.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Timer
+
+# more special pip packages
+from serial import SerialException
+from serial.tools import list_ports
+
+# from this package
+from .exceptions import ResponseException, WrongChecksum
+from .mecom import MeCom
+
+
+class _Port(object):
+    """
+    State of one serial port in the pool.
+    """
+    __slots__ = ("kwargs", "session", "refs", "timer", "lock")
+
+    def __init__(self, kwargs):
+        self.kwargs = kwargs
+        self.session = None
+        self.refs = 0
+        self.timer = None
+        self.lock = Lock()
+
+
+class PooledSession(object):
+    """
+    Handle of a shared session as returned by MeComPool.acquire(). Every attribute is forwarded to the MeCom of the
+    port, e.g. handle.get_parameter(...). After invalidate() the port is reopened by the next call.
+    """
+
+    def __init__(self, pool, port):
+        """
+        :param pool: MeComPool
+        :param port: str
+        """
+        self._pool = pool
+        self.port = port
+        self._released = False
+
+    @property
+    def session(self):
+        """
+        The MeCom of the port, (re)opened if necessary.
+        :return: MeCom
+        """
+        if self._released:
+            raise ValueError("session of {} has been released".format(self.port))
+        return self._pool._session(self.port)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def invalidate(self):
+        """
+        Close the session after a failure, the next call opens the port again.
+        :return:
+        """
+        self._pool.invalidate(self.port)
+
+    def release(self):
+        """
+        Give the session back to the pool, the port is closed when it was idle for idle_timeout.
+        :return:
+        """
+        if not self._released:
+            self._released = True
+            self._pool.release(self.port)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class MeComPool(object):
+    """
+    Hands out shared sessions per serial port, hence several channels, devices on one bus or drivers in the same
+    process do not open the same tty twice. Ports are opened on first use, closed after idle_timeout seconds without
+    any user and reopened lazily after invalidate().
+
+    pool = MeComPool.default()
+    ports = pool.discover(vid=0x0403)
+    with pool.acquire(port, metype="TEC") as mc:
+        mc.get_parameter(parameter_name="Object Temperature", address=1)
+    """
+    _default = None
+    _default_lock = Lock()
+
+    def __init__(self, idle_timeout=30.0, factory=MeCom):
+        """
+        :param idle_timeout: float: seconds an unused port stays open
+        :param factory: callable(serialport=..., **kwargs) returning a session, MeCom by default
+        """
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        # port -> _Port
+        self._ports = {}
+        self._lock = Lock()
+        self.opened = 0
+
+    @staticmethod
+    def default():
+        """
+        Returns the process-wide pool.
+        :return: MeComPool
+        """
+        with MeComPool._default_lock:
+            if MeComPool._default is None:
+                MeComPool._default = MeComPool()
+            return MeComPool._default
+
+    def acquire(self, port, **kwargs):
+        """
+        Returns a handle of the session of a port. The keyword arguments are passed to MeCom when the port is opened,
+        while the port is in use the arguments of the first call apply, only a different metype is refused.
+        :param port: str
+        :param kwargs: e.g. metype="TEC", timeout=1
+        :return: PooledSession
+        """
+        with self._lock:
+            state = self._ports.get(port)
+            if state is None or (state.refs == 0 and state.session is None):
+                state = self._ports[port] = _Port(kwargs)
+            elif kwargs.get("metype", "LDD") != state.kwargs.get("metype", "LDD"):
+                raise ValueError("{} is already used with metype {}".format(port, state.kwargs.get("metype", "LDD")))
+        with state.lock:
+            if state.timer is not None:
+                state.timer.cancel()
+                state.timer = None
+            state.refs += 1
+        try:
+            # open now, not on first use
+            self._session(port)
+        except Exception:
+            self.release(port)
+            raise
+        return PooledSession(self, port)
+
+    def _session(self, port):
+        """
+        Returns the session of an acquired port, opens it if necessary.
+        :param port: str
+        :return: MeCom
+        """
+        state = self._ports[port]
+        session = state.session
+        if session is None:
+            with state.lock:
+                if state.session is None:
+                    state.session = self.factory(serialport=port, **state.kwargs)
+                    self.opened += 1
+                    logging.info("opened {}".format(port))
+                session = state.session
+        return session
+
+    def release(self, port):
+        """
+        Decrease the reference count of a port, start the idle timer when it is unused.
+        :param port: str
+        :return:
+        """
+        state = self._ports[port]
+        with state.lock:
+            state.refs -= 1
+            if state.refs == 0 and state.session is not None:
+                state.timer = Timer(self.idle_timeout, self._close_idle, (port,))
+                state.timer.daemon = True
+                state.timer.start()
+
+    def _close_idle(self, port):
+        state = self._ports[port]
+        with state.lock:
+            if state.refs == 0:
+                state.timer = None
+                self._close(port, state)
+
+    @staticmethod
+    def _close(port, state):
+        """
+        Close the session of a port, call with state.lock held. The session waits for the serial lock, an exchange
+        of another thread on the shared session is finished first.
+        """
+        if state.session is None:
+            return
+        try:
+            state.session.stop()
+        except (SerialException, OSError) as ex:
+            logging.warning("closing {} failed: {}".format(port, ex))
+        state.session = None
+        logging.info("closed {}".format(port))
+
+    def invalidate(self, port):
+        """
+        Close a session after a failure, the handles stay valid and the port is reopened with the next call.
+        :param port: str
+        :return:
+        """
+        state = self._ports[port]
+        with state.lock:
+            self._close(port, state)
+
+    def close(self):
+        """
+        Close every port, also those still in use.
+        :return:
+        """
+        with self._lock:
+            for port, state in self._ports.items():
+                with state.lock:
+                    if state.timer is not None:
+                        state.timer.cancel()
+                        state.timer = None
+                    self._close(port, state)
+
+    def stats(self):
+        """
+        Returns the reference count of every port and whether it is open.
+        :return: dict: port -> (int, bool)
+        """
+        return {port: (state.refs, state.session is not None) for port, state in self._ports.items()}
+
+    def discover(self, vid=None, pid=None, match=None, address=0, workers=8, **kwargs):
+        """
+        Probes all USB-serial ports with the given vendor and product id (None matches all) with ?IF, in parallel.
+        Returns the identification string of every port which answered, optionally only those containing match
+        (e.g. the device serial number). The ports stay open for idle_timeout, a following acquire() is instant.
+        :param vid: int: USB vendor id
+        :param pid: int: USB product id
+        :param match: str
+        :param address: int: device address to probe, 0 is the broadcast address
+        :param workers: int: number of ports probed at the same time
+        :param kwargs: passed to acquire()
+        :return: dict: port -> str
+        """
+        ports = [info.device for info in list_ports.comports()
+                 if (vid is None or info.vid == vid) and (pid is None or info.pid == pid)]
+
+        def probe(port):
+            try:
+                with self.acquire(port, **kwargs) as handle:
+                    return port, handle.info(address=address)
+            except (ResponseException, WrongChecksum, SerialException, OSError) as ex:
+                logging.info("no device found on {}: {}".format(port, ex))
+                return port, None
+
+        found = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ports)))) as executor:
+            for port, info in executor.map(probe, ports):
+                if info is not None and (match is None or match in info):
+                    found[port] = info
+        return found
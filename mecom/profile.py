@@ -0,0 +1,230 @@
+"""
+Snapshots of the device configuration: capture, save, diff against a device and restore.
+"""
+
+import json
+import logging
+import math
+
+# msgpack is optional, JSON is always available
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# from this package
+from .exceptions import ResponseException
+from .mecom import ParameterList, VR, VRResponse
+
+# never captured by default: writing them changes how the device is reached or triggers a flash write
+DEFAULT_EXCLUDE = ("Save Data to Flash", "Device Address", "Baud Rate")
+
+
+class DeviceProfile(object):
+    """
+    The values of all writable parameters of a device, for one or more instances (channels).
+
+    profile = DeviceProfile.capture(mc, address=1, instances=(1, 2))
+    profile.save("tec.json")
+    ...
+    DeviceProfile.load("tec.json").apply(mc_of_replaced_board, address=1)
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, metype, values, info=None):
+        """
+        :param metype: str: 'TEC' or 'LDD'
+        :param values: dict: (parameter id, instance) -> int or float
+        :param info: str: identification of the captured device
+        """
+        self.metype = metype
+        self.values = values
+        self.info = info
+
+    @staticmethod
+    def _parameters(session, exclude=DEFAULT_EXCLUDE):
+        """
+        Returns the writable parameters of a session which are not excluded, every id once.
+        :param session: MeCom
+        :param exclude: tuple of str
+        :return: list of Parameter
+        """
+        parameters = {}
+        for parameter in session.PARAMETERS:
+            if parameter.writable and parameter.name not in exclude:
+                parameters.setdefault(parameter.id, parameter)
+        return list(parameters.values())
+
+    @staticmethod
+    def _read(session, keys, address, depth=None):
+        """
+        Read (parameter, instance) pairs within one transaction.
+        Returns the values of all parameters the device knows, those answered with a device error are left out.
+        Corrupted replies are retried as the retry policy of the session allows, raises ResponseException with the
+        parameters which still could not be read.
+        :param session: MeCom
+        :param keys: list of (Parameter, int)
+        :param address: int
+        :param depth: int
+        :return: dict: (parameter id, instance) -> int or float
+        """
+        queries = [VR(parameter=parameter, address=address, parameter_instance=instance) for parameter, instance in keys]
+        session.transaction(queries, depth=depth, raise_errors=False)
+        unread = ["{} (instance {})".format(parameter.name, instance)
+                  for (parameter, instance), vr in zip(keys, queries) if vr.RESPONSE is None]
+        if unread:
+            raise ResponseException("could not read {} of device {}: {}".format(
+                "1 parameter" if len(unread) == 1 else "{} parameters".format(len(unread)), address,
+                ", ".join(unread)))
+        return {(parameter.id, instance): vr.RESPONSE.PAYLOAD[0] for (parameter, instance), vr in zip(keys, queries)
+                if type(vr.RESPONSE) is VRResponse}
+
+    @staticmethod
+    def capture(session, address=0, instances=(1,), exclude=DEFAULT_EXCLUDE, depth=None):
+        """
+        Read all writable parameters of a device within one transaction.
+        Parameters which are not available on the device or instance are skipped.
+        :param session: MeCom
+        :param address: int
+        :param instances: tuple of int
+        :param exclude: tuple of str: names of parameters which are not captured
+        :param depth: int
+        :return: DeviceProfile
+        """
+        keys = [(parameter, instance) for parameter in DeviceProfile._parameters(session, exclude)
+                for instance in instances]
+        values = DeviceProfile._read(session, keys, address, depth)
+        return DeviceProfile(session.PARAMETERS.metype, values, info=session.info(address=address))
+
+    def diff(self, session, address=0, tolerance=1e-3, depth=None):
+        """
+        Compare the profile with the device, all parameters are read within one transaction.
+        Floats are compared with a relative tolerance as the device may round them.
+        Returns the differing parameters with the value of the device (None if not available) and of the profile.
+        :param session: MeCom
+        :param address: int
+        :param tolerance: float
+        :param depth: int
+        :return: dict: (parameter id, instance) -> (device value, profile value)
+        """
+        keys = [(session.PARAMETERS.get_by_id(parameter_id), instance) for parameter_id, instance in self.values]
+        current = self._read(session, keys, address, depth)
+        changed = {}
+        for (parameter, instance) in keys:
+            key = (parameter.id, instance)
+            wanted = self.values[key]
+            value = current.get(key)
+            if value is None:
+                changed[key] = (None, wanted)
+            elif parameter.format == "FLOAT32":
+                if not math.isclose(value, wanted, rel_tol=tolerance, abs_tol=1e-12):
+                    changed[key] = (value, wanted)
+            elif value != wanted:
+                changed[key] = (value, wanted)
+        return changed
+
+    def apply(self, session, address=0, verify=False, flash=True, tolerance=1e-3, depth=None):
+        """
+        Write the parameters which differ from the device in batches (one per instance) and save them to flash once.
+        Returns the result of every parameter written, an empty dict if the device already matches.
+        :param session: MeCom
+        :param address: int
+        :param verify: bool: read the written values back
+        :param flash: bool: save the parameters to flash
+        :param tolerance: float
+        :param depth: int
+        :return: dict: (parameter id, instance) -> bool
+        """
+        assert session.PARAMETERS.metype == self.metype, "profile of a {} device".format(self.metype)
+
+        by_instance = {}
+        for (parameter_id, instance), (value, wanted) in self.diff(session, address, tolerance, depth).items():
+            by_instance.setdefault(instance, {})[parameter_id] = wanted
+
+        results = {}
+        for instance, values in sorted(by_instance.items()):
+            written = session.set_parameters(values, address=address, parameter_instance=instance, verify=verify,
+                                             tolerance=tolerance, depth=depth)
+            results.update(((parameter_id, instance), ok) for parameter_id, ok in written.items())
+        failed = [key for key, ok in results.items() if not ok]
+        if failed:
+            logging.warning("could not restore {}".format(failed))
+
+        if flash and results:
+            session.write_to_flash(address=address)
+        return results
+
+    def to_dict(self):
+        """
+        Returns the profile as dict of plain types, the parameter names are included for readability.
+        :return: dict
+        """
+        parameters = ParameterList.get(self.metype)
+        return {
+            "version": self.FORMAT_VERSION,
+            "metype": self.metype,
+            "info": self.info,
+            "values": [{"id": parameter_id, "name": parameters.get_by_id(parameter_id).name, "instance": instance,
+                        "value": value} for (parameter_id, instance), value in sorted(self.values.items())],
+        }
+
+    @staticmethod
+    def from_dict(data):
+        """
+        Inverse of to_dict().
+        :param data: dict
+        :return: DeviceProfile
+        """
+        values = {(entry["id"], entry["instance"]): entry["value"] for entry in data["values"]}
+        return DeviceProfile(data["metype"], values, info=data.get("info"))
+
+    def dumps(self, fmt="json"):
+        """
+        Serialize the profile.
+        :param fmt: str: "json" or "msgpack"
+        :return: str (json) or bytes (msgpack)
+        """
+        if fmt == "msgpack":
+            if msgpack is None:
+                raise ImportError("msgpack is not installed")
+            return msgpack.packb(self.to_dict())
+        return json.dumps(self.to_dict(), indent=1)
+
+    @staticmethod
+    def loads(data):
+        """
+        Deserialize a profile, bytes are read as msgpack, str as JSON.
+        :param data: str or bytes
+        :return: DeviceProfile
+        """
+        if isinstance(data, bytes):
+            if msgpack is None:
+                raise ImportError("msgpack is not installed")
+            return DeviceProfile.from_dict(msgpack.unpackb(data))
+        return DeviceProfile.from_dict(json.loads(data))
+
+    def save(self, filepath):
+        """
+        Save the profile, files ending with .msgpack are written as msgpack, all others as JSON.
+        :param filepath: str
+        :return:
+        """
+        if str(filepath).endswith(".msgpack"):
+            with open(filepath, "wb") as f:
+                f.write(self.dumps("msgpack"))
+        else:
+            with open(filepath, "w") as f:
+                f.write(self.dumps("json"))
+
+    @staticmethod
+    def load(filepath):
+        """
+        Load a profile written by save().
+        :param filepath: str
+        :return: DeviceProfile
+        """
+        if str(filepath).endswith(".msgpack"):
+            with open(filepath, "rb") as f:
+                return DeviceProfile.loads(f.read())
+        with open(filepath, "r") as f:
+            return DeviceProfile.loads(f.read())
@@ -0,0 +1,325 @@
+"""
+Multi-resolution min/max/mean index of recorded telemetry for fast downsampled reads.
+"""
+
+import glob
+
+import numpy as np
+
+# from this package
+from .recorder import TelemetryFile, MISSING
+
+
+def _samples(values):
+    """
+    Returns recorded values as float64 with the values which could not be read as NaN.
+    :param values: np.ndarray
+    :return: np.ndarray
+    """
+    samples = values.astype(np.float64)
+    if values.dtype.kind == "i":
+        samples[values == MISSING[values.dtype]] = np.nan
+    return samples
+
+
+def _raw(times, values):
+    """
+    Returns samples as (times, min, max, sum, count) of bins of one sample each.
+    """
+    samples = _samples(values)
+    valid = ~np.isnan(samples)
+    return times, samples, samples, np.where(valid, samples, 0.0), valid.astype(np.float64)
+
+
+class _Growable(object):
+    """
+    Array with amortized appends, the capacity is doubled when full.
+    """
+
+    def __init__(self, dtype):
+        self.data = np.zeros(64, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        n = self.size + len(values)
+        if n > len(self.data):
+            data = np.zeros(max(n, 2 * len(self.data)), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:n] = values
+        self.size = n
+
+    def view(self, start=0, end=None):
+        return self.data[start:self.size if end is None else min(end, self.size)]
+
+
+class _Level(object):
+    """
+    Complete bins of one resolution: start time, min, max, sum and number of the valid samples among
+    factor ** (level + 1) samples each. Min and max of a bin without valid samples are NaN.
+    """
+    __slots__ = ("times", "min", "max", "sum", "count", "folded")
+
+    def __init__(self):
+        self.times = _Growable(np.float64)
+        self.min = _Growable(np.float64)
+        self.max = _Growable(np.float64)
+        self.sum = _Growable(np.float64)
+        self.count = _Growable(np.float64)
+        # number of bins aggregated into the next level
+        self.folded = 0
+
+    def __len__(self):
+        return self.times.size
+
+    def append(self, times, minimum, maximum, total, count):
+        self.times.extend(times)
+        self.min.extend(minimum)
+        self.max.extend(maximum)
+        self.sum.extend(total)
+        self.count.extend(count)
+
+    def bins(self, start=0, end=None):
+        """
+        Returns (times, min, max, sum, count) of the bins start to end.
+        """
+        times = self.times.view(start, end)
+        return (times, self.min.view(start, end), self.max.view(start, end), self.sum.view(start, end),
+                self.count.view(start, end))
+
+
+class Pyramid(object):
+    """
+    Index of one column of a TelemetryFile. Level 0 bins factor samples, every further level factor bins of the level
+    below. Only complete bins are stored, update() folds the samples appended since the last call into the levels,
+    at most block samples at a time.
+    """
+
+    def __init__(self, telemetry_file, column, factor=16, block=1 << 16):
+        """
+        :param telemetry_file: TelemetryFile
+        :param column: int: see TelemetryFile.index()
+        :param factor: int
+        :param block: int: samples read from the file at once
+        """
+        self.file = telemetry_file
+        self.column = column
+        self.factor = factor
+        self.block = max(factor, block)
+        self.levels = []
+        # samples aggregated into level 0
+        self.folded = 0
+        self.update()
+
+    def update(self):
+        """
+        Add the samples appended to the file since the last call.
+        :return:
+        """
+        f = self.factor
+        while True:
+            n = min(self.file.rows - self.folded, self.block) // f * f
+            if n == 0:
+                return
+            times, values = self.file.since(self.column, self.folded, self.folded + n)
+            self.folded += n
+            if not self.levels:
+                self.levels.append(_Level())
+            times, minimum, maximum, total, count = _raw(times[::f], values)
+            # fmin and fmax ignore NaN unless all samples of a bin are NaN
+            self.levels[0].append(times, np.fmin.reduce(minimum.reshape(-1, f), axis=1),
+                                  np.fmax.reduce(maximum.reshape(-1, f), axis=1), total.reshape(-1, f).sum(axis=1),
+                                  count.reshape(-1, f).sum(axis=1))
+            k = 0
+            while len(self.levels[k]) - self.levels[k].folded >= f:
+                level = self.levels[k]
+                if k + 1 == len(self.levels):
+                    self.levels.append(_Level())
+                start = level.folded
+                end = start + (len(level) - start) // f * f
+                level.folded = end
+                self.levels[k + 1].append(level.times.view(start, end)[::f],
+                                          np.fmin.reduce(level.min.view(start, end).reshape(-1, f), axis=1),
+                                          np.fmax.reduce(level.max.view(start, end).reshape(-1, f), axis=1),
+                                          level.sum.view(start, end).reshape(-1, f).sum(axis=1),
+                                          level.count.view(start, end).reshape(-1, f).sum(axis=1))
+                k += 1
+
+    def rows(self, times):
+        """
+        Returns for every time the number of the first sample at or after it. The start times of the level 0 bins
+        narrow the search down, only the samples of one bin (and those not yet folded) are read per time.
+        :param times: np.ndarray: sorted
+        :return: np.ndarray of int
+        """
+        times = np.asarray(times, dtype=np.float64)
+        f = self.factor
+        if self.levels:
+            j = np.searchsorted(self.levels[0].times.view(), times, side="left")
+            # bin j - 1 starts before the time, bin j at or after it
+            base = np.maximum(j - 1, 0) * f + (j > 0)
+        else:
+            base = np.zeros(len(times), dtype=np.int64)
+        candidates = base[:, None] + np.arange(f + self.file.rows - self.folded)
+        inside = candidates < self.file.rows
+        sampled = np.full(candidates.shape, np.inf)
+        sampled[inside] = self.file.take(None, candidates[inside])
+        return base + (sampled < times[:, None]).sum(axis=1)
+
+    def aggregate(self, starts, ends):
+        """
+        Returns (min, max, sum, count) of the samples start to end of every range, the ranges must be sorted and must
+        not overlap. A range is covered by the complete bins of the coarsest level which fit into it, the rest at
+        both ends by fewer than factor bins of every finer level and the samples.
+        :param starts: np.ndarray of int
+        :param ends: np.ndarray of int
+        :return: tuple of np.ndarray
+        """
+        f = self.factor
+        n = len(starts)
+        minimum, maximum = np.full(n, np.nan), np.full(n, np.nan)
+        total, count = np.zeros(n), np.zeros(n)
+        index = np.arange(n)
+        start, end = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        # samples per bin of level k, level -1 are the samples
+        size = 1
+        for k in range(-1, len(self.levels)):
+            split = np.zeros(len(index), dtype=bool)
+            if k + 1 < len(self.levels):
+                coarse = size * f
+                inner_start = -(-start // coarse) * coarse
+                inner_end = np.minimum(end // coarse * coarse, len(self.levels[k + 1]) * coarse)
+                split = inner_start < inner_end
+            # ranges which are not split are covered at this level, the others leave a head and a tail
+            pieces = [(index[~split], start[~split], end[~split])]
+            if split.any():
+                pieces += [(index[split], start[split], inner_start[split]),
+                           (index[split], inner_end[split], end[split])]
+            self._add(k, size, pieces, minimum, maximum, total, count)
+            index, start, end = index[split], inner_start[split], inner_end[split]
+            if not len(index):
+                break
+            size = coarse
+        return minimum, maximum, total, count
+
+    def _add(self, k, size, pieces, minimum, maximum, total, count):
+        """
+        Aggregate pieces (range index, first sample, end sample) of level k into the results of their ranges.
+        """
+        index, start, end = [np.concatenate(part) for part in zip(*pieces)]
+        keep = start < end
+        index, start, end = index[keep], start[keep] // size, end[keep] // size
+        if not len(index):
+            return
+        order = np.argsort(start, kind="stable")
+        index, start, end = index[order], start[order], end[order]
+        if k < 0:
+            # the pieces are short, read their samples only
+            lengths = end - start
+            offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+            rows = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + np.repeat(start, lengths)
+            arrays = _raw(None, self.file.take(self.column, rows))[1:]
+        else:
+            arrays = self.levels[k].bins()[1:]
+            # reduceat sums up to the next index, every second result is a piece
+            offsets = np.ravel(np.column_stack((start, end)))
+            if offsets[-1] == len(arrays[0]):
+                offsets = offsets[:-1]
+        lows, highs, sums, counts = [ufunc.reduceat(array, offsets)[::1 if k < 0 else 2]
+                                     for ufunc, array in zip((np.fmin, np.fmax, np.add, np.add), arrays)]
+        np.fmin.at(minimum, index, lows)
+        np.fmax.at(maximum, index, highs)
+        np.add.at(total, index, sums)
+        np.add.at(count, index, counts)
+
+
+class TelemetryReader(object):
+    """
+    Downsampled reads of the files written by a TelemetryRecorder. The files are memory-mapped, the pyramid of a
+    column is built on its first query and refresh() adds new files and chunks incrementally.
+
+    reader = TelemetryReader("logs/lab-*.mtl")
+    times, minimum, maximum, mean = reader.query("Object Temperature", address=1, instance=2, points=1000)
+    plt.fill_between(times, minimum, maximum)
+    """
+
+    def __init__(self, pattern, factor=16):
+        """
+        :param pattern: str: glob pattern of the files
+        :param factor: int: samples per bin and bins per bin of the next level
+        """
+        self.pattern = pattern
+        self.factor = factor
+        # path -> TelemetryFile
+        self.files = {}
+        # (path, column) -> Pyramid
+        self._pyramids = {}
+        self.refresh()
+
+    def refresh(self):
+        """
+        Open new files and add the chunks appended to the open files to their pyramids.
+        :return:
+        """
+        for path in self.files:
+            self.files[path].refresh()
+        for path in sorted(glob.glob(self.pattern)):
+            if path not in self.files:
+                self.files[path] = TelemetryFile(path)
+        for pyramid in self._pyramids.values():
+            pyramid.update()
+
+    def _pyramid(self, path, column):
+        key = (path, column)
+        if key not in self._pyramids:
+            self._pyramids[key] = Pyramid(self.files[path], column, self.factor)
+        return self._pyramids[key]
+
+    def query(self, parameter, address=0, instance=1, t0=None, t1=None, points=1000):
+        """
+        Returns a parameter between t0 and t1 downsampled to at most points buckets of equal duration, empty
+        buckets are left out. Every bucket has the time of its start and the min, max and mean of exactly the samples
+        within it, values which could not be read are ignored (NaN if a bucket has no other samples).
+        :param parameter: str or int
+        :param address: int
+        :param instance: int
+        :param t0: float: time.time(), start of the first file by default
+        :param t1: float: end of the last file by default
+        :param points: int
+        :return: (times, min, max, mean) as np.ndarray
+        """
+        parts = []
+        for path in sorted(self.files):
+            f = self.files[path]
+            try:
+                column = f.index(parameter, address, instance)
+            except KeyError:
+                continue
+            parts.append((self._pyramid(path, column), f))
+        if not parts:
+            raise KeyError("{} of device {} instance {} is not recorded in {}".format(parameter, address, instance,
+                                                                                    self.pattern))
+        if t0 is None or t1 is None:
+            recorded = [f for pyramid, f in parts if f.rows]
+            if not recorded:
+                empty = np.zeros(0)
+                return empty, empty, empty, empty
+            t0 = min(f._starts[0] for f in recorded) if t0 is None else t0
+            t1 = np.nextafter(max(f.take(None, [f.rows - 1])[0] for f in recorded), np.inf) if t1 is None else t1
+        edges = t0 + np.arange(points + 1) * ((t1 - t0) / points)
+        edges[-1] = t1
+
+        samples = np.zeros(points)
+        minimum, maximum = np.full(points, np.nan), np.full(points, np.nan)
+        total, count = np.zeros(points), np.zeros(points)
+        for pyramid, f in parts:
+            rows = pyramid.rows(edges)
+            lows, highs, sums, counts = pyramid.aggregate(rows[:-1], rows[1:])
+            samples += np.diff(rows)
+            minimum, maximum = np.fmin(minimum, lows), np.fmax(maximum, highs)
+            total += sums
+            count += counts
+        filled = samples > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+        return edges[:-1][filled], minimum[filled], maximum[filled], mean[filled]
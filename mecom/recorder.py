@@ -0,0 +1,471 @@
+"""
+Recording of telemetry into compact, memory-mappable columnar files.
+
+File layout (little endian):
+    b"MECOMTLM", version (u32), length of the schema (u32), JSON schema, padded to 16 bytes
+    chunks: b"CHNK", rows (u32), payload bytes (u64), payload
+A chunk payload holds the timestamps (float64, time.time()) followed by one column per parameter (float32 or int32),
+every column padded to 8 bytes. Chunks are only appended, a truncated chunk at the end of a file is ignored.
+A value which could not be read is stored as NaN (float32) or as -2 ** 31 (int32), see MISSING.
+"""
+
+import glob
+import json
+import logging
+import os
+import struct
+import time
+from threading import Thread, Event
+
+import numpy as np
+
+# more special pip packages
+from serial import SerialException
+
+# from this package
+from .exceptions import ResponseException, WrongChecksum
+from .mecom import VR, VRResponse
+from .telemetry import DTYPES
+
+MAGIC = b"MECOMTLM"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+CHUNK = struct.Struct("<4sIQ")
+CHUNK_MAGIC = b"CHNK"
+EXTENSION = ".mtl"
+# stored instead of a value which could not be read
+MISSING = {np.dtype(np.float32): np.nan, np.dtype(np.int32): np.iinfo(np.int32).min}
+
+
+def _pad(n, alignment=8):
+    return -n % alignment
+
+
+def _layout(rows, dtypes):
+    """
+    Returns the offsets of the timestamps and of every column within a chunk payload and the payload size.
+    :param rows: int
+    :param dtypes: list of np.dtype
+    :return: (list of int, int)
+    """
+    offsets = [0]
+    size = 8 * rows
+    for dtype in dtypes:
+        offsets.append(size)
+        size += dtype.itemsize * rows
+        size += _pad(size)
+    return offsets, size
+
+
+class TelemetryRecorder(object):
+    """
+    Samples parameters of one or more devices on a session within one transaction per interval and appends them
+    as rows to the current file. Rows are collected in memory and written as one chunk when chunk_rows are complete,
+    on flush() and on stop(). A new file is started when the current one exceeds max_bytes or max_seconds.
+
+    recorder = TelemetryRecorder(mc, "logs/lab", interval=0.1)
+    recorder.add("Object Temperature", address=1, instances=(1, 2))
+    recorder.add("Actual Output Current", address=1, instances=(1, 2))
+    with recorder:
+        ...
+    times, values = TelemetryFile.load("logs/lab-*.mtl", "Object Temperature", address=1, instance=2)
+    """
+
+    def __init__(self, session, prefix, interval=1.0, chunk_rows=1024, max_bytes=256 << 20, max_seconds=86400.0):
+        """
+        :param session: MeCom
+        :param prefix: str: path and name of the files, the start time and .mtl are appended
+        :param interval: float: seconds between rows
+        :param chunk_rows: int: rows per chunk
+        :param max_bytes: int: size at which a new file is started
+        :param max_seconds: float: age at which a new file is started
+        """
+        self.session = session
+        self.prefix = prefix
+        self.interval = interval
+        self.chunk_rows = chunk_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        # list of (Parameter, address, instance)
+        self.columns = []
+        self._rows = 0
+        self._times = None
+        self._values = None
+        self._file = None
+        self._started = None
+        self.path = None
+        self.files = []
+        self.errors = 0
+        self._thread = None
+        self._stop = Event()
+
+    def add(self, parameter, address=0, instances=(1,)):
+        """
+        Record a parameter given by name (str) or id (int) for each instance (channel).
+        :param parameter: str or int
+        :param address: int
+        :param instances: tuple of int
+        :return:
+        """
+        assert self._file is None and self._times is None, "add parameters before recording"
+        parameter = self.session._lookup(parameter)
+        for instance in instances:
+            self.columns.append((parameter, address, instance))
+
+    def schema(self):
+        """
+        Returns the description of the columns stored in every file.
+        :return: dict
+        """
+        return {
+            "version": VERSION,
+            "interval": self.interval,
+            "chunk_rows": self.chunk_rows,
+            "columns": [{"name": parameter.name.strip(), "id": parameter.id, "address": address,
+                         "instance": instance, "dtype": np.dtype(DTYPES.get(parameter.format, np.float32)).str}
+                        for parameter, address, instance in self.columns],
+        }
+
+    def _open(self, now):
+        """
+        Start a new file.
+        """
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        path = "{}-{}{}".format(self.prefix, stamp, EXTENSION)
+        n = 1
+        while os.path.exists(path):
+            # sorts after the first file of the same second, zero padded to keep _010 after _009
+            path = "{}-{}_{:03d}{}".format(self.prefix, stamp, n, EXTENSION)
+            n += 1
+        schema = json.dumps(dict(self.schema(), started=now)).encode()
+        header = PREAMBLE.pack(MAGIC, VERSION, len(schema)) + schema
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        self._file.write(header + b"\0" * _pad(len(header), 16))
+        self._file.flush()
+        self._started = now
+        self.path = path
+        self.files.append(path)
+        logging.info("recording telemetry to {}".format(path))
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, values, timestamp=None):
+        """
+        Append a row, one value per column in the order of add(), None for a value which could not be read.
+        :param values: list of int or float or None
+        :param timestamp: float: time.time() by default
+        :return:
+        """
+        if self._times is None:
+            self._times = np.zeros(self.chunk_rows, dtype=np.float64)
+            self._values = [np.zeros(self.chunk_rows, dtype=DTYPES.get(parameter.format, np.float32))
+                            for parameter, address, instance in self.columns]
+        self._times[self._rows] = time.time() if timestamp is None else timestamp
+        for column, value in zip(self._values, values):
+            column[self._rows] = MISSING[column.dtype] if value is None else value
+        self._rows += 1
+        if self._rows == self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the collected rows as one chunk.
+        :return:
+        """
+        rows = self._rows
+        if rows == 0:
+            return
+        now = time.time()
+        if self._file is not None and (self._file.tell() >= self.max_bytes or now - self._started >= self.max_seconds):
+            self._close()
+        if self._file is None:
+            self._open(now)
+        offsets, size = _layout(rows, [column.dtype for column in self._values])
+        parts = [CHUNK.pack(CHUNK_MAGIC, rows, size), self._times[:rows].tobytes()]
+        for column in self._values:
+            data = column[:rows].tobytes()
+            parts += [data, b"\0" * _pad(len(data))]
+        # a single write, readers see a chunk completely or truncated
+        self._file.write(b"".join(parts))
+        self._file.flush()
+        self._rows = 0
+
+    def sample(self):
+        """
+        Read all columns within one transaction and record them as a row. Values which could not be read are
+        recorded as MISSING, a transaction which failed as a whole (timeout, serial port error) is skipped.
+        :return:
+        """
+        queries = [VR(parameter=parameter, address=address, parameter_instance=instance)
+                   for parameter, address, instance in self.columns]
+        try:
+            self.session.transaction(queries, raise_errors=False)
+        except (ResponseException, WrongChecksum) as ex:
+            self.errors += 1
+            logging.warning("recording telemetry failed: {}".format(ex))
+            return
+        except (SerialException, OSError) as ex:
+            # keep recording, the port may come back
+            self.errors += 1
+            logging.error("recording telemetry failed, serial port error: {}".format(ex))
+            return
+        values = [query.RESPONSE.PAYLOAD[0] if type(query.RESPONSE) is VRResponse else None for query in queries]
+        if None in values:
+            self.errors += 1
+        self.record(values)
+
+    def _run(self):
+        due = time.monotonic()
+        while not self._stop.is_set():
+            self.sample()
+            # skip missed samples instead of catching up
+            due = max(due + self.interval, time.monotonic())
+            self._stop.wait(max(0.0, due - time.monotonic()))
+
+    def start(self):
+        """
+        Start recording in a background thread.
+        :return:
+        """
+        assert self._thread is None
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="TelemetryRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop recording, write the remaining rows and close the file.
+        :return:
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class TelemetryFile(object):
+    """
+    Memory-mapped reader of a file written by TelemetryRecorder. The file may still be written, refresh() picks up
+    new chunks. Consecutive chunks of equal size are read with a single strided copy.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError("{} is not a telemetry file".format(path))
+            if version > VERSION:
+                raise ValueError("{} has format version {}".format(path, version))
+            self.schema = json.loads(f.read(length).decode())
+        self.columns = self.schema["columns"]
+        self.dtypes = [np.dtype(column["dtype"]) for column in self.columns]
+        header = PREAMBLE.size + length
+        self._end = header + _pad(header, 16)
+        # list of (offset of the payload, rows)
+        self.chunks = []
+        # first timestamp and number of the first row of every chunk
+        self._starts = []
+        self._first_rows = []
+        self.rows = 0
+        self._map = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Map the file again and add the chunks appended since the last call.
+        Returns the number of new chunks.
+        :return: int
+        """
+        size = os.path.getsize(self.path)
+        self._map = np.memmap(self.path, dtype=np.uint8, mode="r") if size else None
+        new = 0
+        while self._end + CHUNK.size <= size:
+            magic, rows, payload = CHUNK.unpack(self._map[self._end:self._end + CHUNK.size].tobytes())
+            if magic != CHUNK_MAGIC:
+                logging.warning("{} is corrupted at byte {}".format(self.path, self._end))
+                break
+            if self._end + CHUNK.size + payload > size:
+                # still being written or truncated
+                break
+            self.chunks.append((self._end + CHUNK.size, rows))
+            self._starts.append(self._map[self._end + CHUNK.size:self._end + CHUNK.size + 8].view(np.float64)[0])
+            self._first_rows.append(self.rows)
+            self.rows += rows
+            self._end += CHUNK.size + payload
+            new += 1
+        return new
+
+    def __len__(self):
+        return self.rows
+
+    def index(self, parameter, address=0, instance=1):
+        """
+        Returns the number of the column of a parameter given by name (str) or id (int).
+        :param parameter: str or int
+        :param address: int
+        :param instance: int
+        :return: int
+        """
+        key = "id" if isinstance(parameter, int) else "name"
+        value = parameter if isinstance(parameter, int) else parameter.strip()
+        for i, column in enumerate(self.columns):
+            if column[key] == value and column["address"] == address and column["instance"] == instance:
+                return i
+        raise KeyError("{} of device {} instance {} is not recorded in {}".format(parameter, address, instance,
+                                                                                self.path))
+
+    def _column(self, column, first=0, last=None):
+        """
+        Returns the timestamps (column None) or the values of a column of the chunks first to last as one array.
+        Runs of chunks with the same number of rows are copied with one strided view.
+        """
+        chunks = self.chunks[first:last]
+        dtype = np.dtype(np.float64) if column is None else self.dtypes[column]
+        parts = []
+        i = 0
+        while i < len(chunks):
+            offset, rows = chunks[i]
+            offsets, size = _layout(rows, self.dtypes)
+            j = i + 1
+            while j < len(chunks) and chunks[j][1] == rows and chunks[j][0] == chunks[j - 1][0] + size + CHUNK.size:
+                j += 1
+            start = offset + offsets[0 if column is None else column + 1]
+            parts.append(np.ndarray((j - i, rows), dtype=dtype, buffer=self._map, offset=start,
+                                    strides=(size + CHUNK.size, dtype.itemsize)).ravel())
+            i = j
+        if not parts:
+            return np.zeros(0, dtype=dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def times(self):
+        """
+        Returns all timestamps.
+        :return: np.ndarray
+        """
+        return self._column(None)
+
+    def _chunk_range(self, t0, t1):
+        """
+        Returns the chunks which may contain samples with t0 <= timestamp < t1.
+        """
+        if not self.chunks or (t0 is None and t1 is None):
+            return 0, len(self.chunks)
+        starts = np.array(self._starts)
+        first = 0 if t0 is None else max(0, int(np.searchsorted(starts, t0, side="right")) - 1)
+        last = len(self.chunks) if t1 is None else int(np.searchsorted(starts, t1, side="left"))
+        return first, max(first, last)
+
+    def since(self, column, start, end=None):
+        """
+        Returns the timestamps and values of a column of the rows start to end (default: the last row), only the
+        chunks containing them are read.
+        :param column: int: see index()
+        :param start: int
+        :param end: int
+        :return: (np.ndarray, np.ndarray)
+        """
+        first = max(0, int(np.searchsorted(self._first_rows, start, side="right")) - 1)
+        last = None if end is None else int(np.searchsorted(self._first_rows, end, side="left"))
+        skip = start - self._first_rows[first] if self.chunks else 0
+        stop = None if end is None else skip + max(0, end - start)
+        return self._column(None, first, last)[skip:stop], self._column(column, first, last)[skip:stop]
+
+    def take(self, column, rows):
+        """
+        Returns the timestamps (column None) or the values of a column at the given rows, only the chunks
+        containing them are touched.
+        :param column: int: see index()
+        :param rows: np.ndarray of int
+        :return: np.ndarray
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        dtype = np.dtype(np.float64) if column is None else self.dtypes[column]
+        result = np.zeros(len(rows), dtype=dtype)
+        chunks = np.searchsorted(self._first_rows, rows, side="right") - 1
+        # rows of one chunk are neighbours if rows are sorted
+        bounds = np.flatnonzero(np.r_[True, chunks[1:] != chunks[:-1], True])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            chunk = chunks[start]
+            offset, n = self.chunks[chunk]
+            offsets, size = _layout(n, self.dtypes)
+            offset += offsets[0 if column is None else column + 1]
+            values = np.ndarray(n, dtype=dtype, buffer=self._map, offset=offset)
+            result[start:end] = values[rows[start:end] - self._first_rows[chunk]]
+        return result
+
+    def read(self, parameter, address=0, instance=1, t0=None, t1=None):
+        """
+        Returns the timestamps and values of a parameter with t0 <= timestamp < t1.
+        Only the chunks within the time range are read.
+        :param parameter: str or int
+        :param address: int
+        :param instance: int
+        :param t0: float: time.time()
+        :param t1: float
+        :return: (np.ndarray, np.ndarray)
+        """
+        return self.window(self.index(parameter, address, instance), t0, t1)
+
+    def window(self, column, t0=None, t1=None):
+        """
+        Returns the timestamps and values of a column with t0 <= timestamp < t1, see read().
+        :param column: int: see index()
+        :param t0: float
+        :param t1: float
+        :return: (np.ndarray, np.ndarray)
+        """
+        first, last = self._chunk_range(t0, t1)
+        times = self._column(None, first, last)
+        values = self._column(column, first, last)
+        start = 0 if t0 is None else np.searchsorted(times, t0, side="left")
+        end = len(times) if t1 is None else np.searchsorted(times, t1, side="left")
+        return times[start:end], values[start:end]
+
+    def close(self):
+        self._map = None
+
+    @staticmethod
+    def load(pattern, parameter, address=0, instance=1, t0=None, t1=None):
+        """
+        Returns the timestamps and values of a parameter from all files matching a glob pattern, e.g. the files of
+        a recorder "logs/lab-*.mtl". Files not containing the parameter are skipped.
+        :param pattern: str
+        :param parameter: str or int
+        :param address: int
+        :param instance: int
+        :param t0: float
+        :param t1: float
+        :return: (np.ndarray, np.ndarray)
+        """
+        times, values = [], []
+        for path in sorted(glob.glob(pattern)):
+            f = TelemetryFile(path)
+            try:
+                t, v = f.read(parameter, address, instance, t0, t1)
+            except KeyError:
+                continue
+            times.append(t)
+            values.append(v)
+        if not times:
+            raise KeyError("{} of device {} instance {} is not recorded in {}".format(parameter, address, instance,
+                                                                                    pattern))
+        return np.concatenate(times), np.concatenate(values)
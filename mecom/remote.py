@@ -0,0 +1,340 @@
+"""
+Client of mecom-server (see server.py) and the binary protocol both use.
+
+Messages are length prefixed (u32, little endian), the first byte of a message is its type:
+    HELLO    client: port (str)                        server: metype (str)
+    QUERIES  client: count (u16), query records         server: count (u16), result records
+    STATS    client: -                                  server: JSON
+    ERROR                                               server: message (str)
+Strings are sent as length (u16) and UTF-8.
+A query record is kind | CACHED (u8), address (u8), instance (u8), parameter id (u16), followed by the value of VS
+(float64 or int64) or by command, table instance, offset and data of TD. A result record is its status (u8),
+followed by the value, the info string, the download status, the error code or the exception.
+"""
+
+import json
+import os
+import socket
+import struct
+from threading import Lock
+
+# from this package
+from .exceptions import ResponseException, ResponseTimeout, WrongChecksum, WrongResponseSequence, UnknownParameter, \
+    MalformedResponse
+from .mecom import MeCom, ParameterList, VR, VS, RS, IF, TD, ACK, VRResponse, IFResponse, TDResponse, DeviceError
+
+DEFAULT_SOCKET = os.environ.get("MECOM_SOCKET", "/tmp/mecom.sock")
+
+# message types
+HELLO, QUERIES, STATS, ERROR = 1, 2, 3, 255
+
+# query kinds, CACHED allows the server to answer a VR from its cache
+KINDS = {VR: 1, VS: 2, RS: 3, IF: 4, TD: 5}
+CACHED = 0x80
+
+# result status
+OK_ACK, OK_FLOAT, OK_INT, OK_INFO, OK_TABLE, DEVICE_ERROR, NO_RESPONSE, FAILED = range(8)
+# exceptions passed to the client, anything else is reported as ResponseException
+EXCEPTIONS = (ResponseTimeout, WrongChecksum, WrongResponseSequence, UnknownParameter, MalformedResponse,
+              ResponseException)
+
+LENGTH = struct.Struct("<I")
+COUNT = struct.Struct("<H")
+QUERY = struct.Struct("<BBBH")
+TABLE = struct.Struct("<BBIH")
+FLOAT = struct.Struct("<d")
+INT = struct.Struct("<q")
+
+
+def send_message(sock, kind, body=b""):
+    """
+    Send a message with a single sendall().
+    :param sock: socket.socket
+    :param kind: int: message type
+    :param body: bytes
+    :return:
+    """
+    sock.sendall(LENGTH.pack(len(body) + 1) + bytes((kind,)) + body)
+
+
+def _receive(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    while view:
+        n = sock.recv_into(view)
+        if n == 0:
+            return None
+        view = view[n:]
+    return data
+
+
+def receive_message(sock):
+    """
+    Receive a message, returns its type and body or None if the connection was closed.
+    :param sock: socket.socket
+    :return: (int, bytes) or None
+    """
+    header = _receive(sock, LENGTH.size)
+    if header is None:
+        return None
+    body = _receive(sock, LENGTH.unpack(header)[0])
+    if body is None:
+        return None
+    return body[0], bytes(body[1:])
+
+
+def pack_str(text):
+    data = text.encode()
+    return COUNT.pack(len(data)) + data
+
+
+def unpack_str(data, offset):
+    n, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    return bytes(data[offset:offset + n]).decode(), offset + n
+
+
+def encode_query(query, cached=False):
+    """
+    Returns the record of a query.
+    :param query: VR, VS, RS, IF or TD
+    :param cached: bool
+    :return: bytes
+    """
+    kind = KINDS[type(query)]
+    parameter_id = 0 if query.PARAMETER is None else query.PARAMETER.id
+    record = QUERY.pack(kind | (CACHED if cached else 0), query.ADDRESS, query.INSTANCE or 0, parameter_id)
+    if kind == KINDS[VS]:
+        value = query.PAYLOAD[-1]
+        record += FLOAT.pack(value) if query.PARAMETER.format == "FLOAT32" else INT.pack(value)
+    elif kind == KINDS[TD]:
+        record += TABLE.pack(query.COMMAND, query.TABLE_INSTANCE, query.OFFSET, len(query.DATA)) + query.DATA
+    return record
+
+
+def decode_query(data, offset, parameters):
+    """
+    Inverse of encode_query().
+    :param data: bytes
+    :param offset: int
+    :param parameters: ParameterList
+    :return: (Query, bool, int): the query, whether it may be answered from a cache and the offset of the next record
+    """
+    kind, address, instance, parameter_id = QUERY.unpack_from(data, offset)
+    offset += QUERY.size
+    cached = bool(kind & CACHED)
+    kind &= ~CACHED
+    if kind == KINDS[VR]:
+        query = VR(parameters.get_by_id(parameter_id), address=address, parameter_instance=instance)
+    elif kind == KINDS[VS]:
+        parameter = parameters.get_by_id(parameter_id)
+        value, = (FLOAT if parameter.format == "FLOAT32" else INT).unpack_from(data, offset)
+        offset += FLOAT.size
+        query = VS(value, parameter, address=address, parameter_instance=instance)
+    elif kind == KINDS[RS]:
+        query = RS(address=address, parameter_instance=instance)
+    elif kind == KINDS[IF]:
+        query = IF(address=address, parameter_instance=instance)
+    elif kind == KINDS[TD]:
+        command, table_instance, table_offset, n = TABLE.unpack_from(data, offset)
+        offset += TABLE.size
+        query = TD(command, table_instance, table_offset, data[offset:offset + n], address=address)
+        offset += n
+    else:
+        raise ValueError("unknown query kind {}".format(kind))
+    return query, cached, offset
+
+
+def encode_result(query, error=None):
+    """
+    Returns the record of the response of a query or of the exception raised instead.
+    :param query: Query
+    :param error: Exception
+    :return: bytes
+    """
+    if error is not None:
+        code = next((i for i, cls in enumerate(EXCEPTIONS) if isinstance(error, cls)), len(EXCEPTIONS) - 1)
+        return bytes((FAILED, code)) + pack_str(str(error))
+    response = query.RESPONSE
+    if response is None:
+        return bytes((NO_RESPONSE,))
+    if type(response) is ACK:
+        return bytes((OK_ACK,))
+    if type(response) is VRResponse:
+        value = response.PAYLOAD[0]
+        return bytes((OK_FLOAT,)) + FLOAT.pack(value) if isinstance(value, float) else bytes((OK_INT,)) + INT.pack(value)
+    if type(response) is IFResponse:
+        return bytes((OK_INFO,)) + pack_str(response.PAYLOAD)
+    if type(response) is TDResponse:
+        return bytes((OK_TABLE, response.PAYLOAD[0]))
+    return bytes((DEVICE_ERROR, response.ADDRESS, response.PAYLOAD[1]))
+
+
+def decode_result(query, data, offset):
+    """
+    Inverse of encode_result(), sets the response of a query.
+    Returns the exception raised by the server (or None) and the offset of the next record.
+    :param query: Query
+    :param data: bytes
+    :param offset: int
+    :return: (Exception, int)
+    """
+    status = data[offset]
+    offset += 1
+    response = None
+    if status == FAILED:
+        cls = EXCEPTIONS[data[offset]]
+        message, offset = unpack_str(data, offset + 1)
+        query.RESPONSE = None
+        return cls(message), offset
+    if status == OK_ACK:
+        response = ACK()
+    elif status in (OK_FLOAT, OK_INT):
+        response = VRResponse(query._RESPONSE_FORMAT)
+        response.PAYLOAD = [(FLOAT if status == OK_FLOAT else INT).unpack_from(data, offset)[0]]
+        offset += FLOAT.size
+    elif status == OK_INFO:
+        response = IFResponse()
+        response.PAYLOAD, offset = unpack_str(data, offset)
+    elif status == OK_TABLE:
+        response = TDResponse()
+        response.PAYLOAD = [data[offset]]
+        offset += 1
+    elif status == DEVICE_ERROR:
+        response = DeviceError()
+        response.PAYLOAD = ["+", data[offset + 1]]
+    if response is not None:
+        # a device error carries the address of the device which raised it
+        response.ADDRESS = data[offset] if status == DEVICE_ERROR else query.ADDRESS
+        response.SEQUENCE = query.SEQUENCE
+        if status == DEVICE_ERROR:
+            offset += 2
+    query.RESPONSE = response
+    return None, offset
+
+
+class RemoteMeCom(MeCom):
+    """
+    Drop-in replacement of MeCom talking to a serial port owned by mecom-server, hence several processes can use the
+    same port. Queries are sent to the server, which merges them with those of other clients, answers reads from its
+    cache and pipelines the rest; the API is that of MeCom.
+
+    with RemoteMeCom("/dev/ttyUSB0") as mc:
+        mc.get_parameter(parameter_name="Object Temperature", address=1)
+    """
+
+    def __init__(self, serialport="/dev/ttyUSB0", socket_path=DEFAULT_SOCKET, metype=None, timeout=10.0):
+        """
+        :param serialport: str: port as configured in the server
+        :param socket_path: str: Unix socket of the server
+        :param metype: str: 'TEC' or 'LDD', checked against the server if given
+        :param timeout: float: seconds to wait for an answer of the server
+        """
+        self.port = serialport
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._lock = Lock()
+        # caching, retries and metrics are done by the server
+        self.cache = None
+        self.metrics = None
+        self.retry = None
+        self.coalesce = False
+        self._subscriptions = None
+        self.pipeline_depth = None
+        try:
+            server_metype, offset = unpack_str(self._request(HELLO, pack_str(serialport)), 0)
+            if metype is not None and metype != server_metype:
+                raise ValueError("{} is a {} port".format(serialport, server_metype))
+        except Exception:
+            self.stop()
+            raise
+        self.PARAMETERS = ParameterList.get(server_metype)
+
+    def _request(self, kind, body=b""):
+        """
+        Send a message and return the body of the reply, raises ResponseException if the server reports an error.
+        """
+        with self._lock:
+            send_message(self._sock, kind, body)
+            reply = receive_message(self._sock)
+        if reply is None:
+            raise ConnectionError("mecom-server closed the connection")
+        if reply[0] == ERROR:
+            raise ResponseException(unpack_str(reply[1], 0)[0])
+        return reply[1]
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def stop(self):
+        if self._subscriptions is not None:
+            self._subscriptions.stop()
+        self._sock.close()
+
+    def _send(self, queries, cached=False):
+        """
+        Send queries to the server, set their responses and raise the first exception raised by the server.
+        """
+        body = COUNT.pack(len(queries)) + b"".join([encode_query(query, cached) for query in queries])
+        reply = self._request(QUERIES, body)
+        offset = COUNT.size
+        errors = []
+        for query in queries:
+            error, offset = decode_result(query, reply, offset)
+            if error is not None:
+                errors.append(error)
+        return errors
+
+    def _execute(self, query, cached=False):
+        errors = self._send([query], cached)
+        if errors:
+            raise errors[0]
+        if query.RESPONSE is None:
+            raise WrongChecksum
+        self._raise(query)
+        return query
+
+    def transaction(self, queries, depth=None, raise_errors=True, cached=False):
+        """
+        Execute several queries within one request to the server, see MeCom.transaction().
+        The server pipelines them with its own depth.
+        :param queries: list of Query
+        :param depth: int: ignored
+        :param raise_errors: bool
+        :param cached: bool: reads may be answered from the cache of the server
+        :return: list of Query
+        """
+        queries = list(queries)
+        errors = self._send(queries, cached)
+        timeouts = [error for error in errors if isinstance(error, ResponseTimeout)]
+        if timeouts or (errors and raise_errors):
+            raise (timeouts or errors)[0]
+        if raise_errors:
+            for query in queries:
+                if query.RESPONSE is None:
+                    raise WrongChecksum
+                self._raise(query)
+        return queries
+
+    def get_parameter(self, parameter_name=None, parameter_id=None, *args, use_cache=True, **kwargs):
+        """
+        See MeCom.get_parameter(), use_cache allows the server to answer from its cache.
+        """
+        parameter = self._find_parameter(parameter_name, parameter_id)
+        return self._execute(VR(parameter=parameter, *args, **kwargs), cached=use_cache).RESPONSE.PAYLOAD[0]
+
+    def get_parameters(self, parameters, depth=None, *args, use_cache=True, **kwargs):
+        """
+        See MeCom.get_parameters(), use_cache allows the server to answer from its cache.
+        """
+        queries = [VR(parameter=self._lookup(parameter), *args, **kwargs) for parameter in parameters]
+        return [vr.RESPONSE.PAYLOAD[0] for vr in self.transaction(queries, cached=use_cache)]
+
+    def stats(self):
+        """
+        Returns the statistics of the server and of the session of the port.
+        :return: dict
+        """
+        return json.loads(self._request(STATS).decode())
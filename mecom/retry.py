@@ -0,0 +1,53 @@
+"""
+Retry policy for transient transmission errors, see MeCom(retry=RetryPolicy()).
+"""
+
+# from this package
+from .exceptions import ResponseTimeout, WrongChecksum, WrongResponseSequence, MalformedResponse
+from .mecom import VR
+
+
+class RetryPolicy(object):
+    """
+    Decides which failed queries are sent again and how long to wait before.
+    By default only VR queries are retried: reading a value twice is harmless, while a VS, RS or TD may already have
+    been executed by the device when its reply got lost. Device errors are never retried.
+
+    mc = MeCom("/dev/ttyUSB0", retry=RetryPolicy(retries=3, backoff=0.005))
+    """
+
+    def __init__(self, retries=2, backoff=0.0, backoff_factor=2.0, max_backoff=0.1,
+                 retry_on=(ResponseTimeout, WrongChecksum, WrongResponseSequence, MalformedResponse),
+                 queries=(VR,)):
+        """
+        :param retries: int: max number of attempts after the first one
+        :param backoff: float: seconds to wait before the first retry
+        :param backoff_factor: float: the wait time is multiplied with this factor for every further retry
+        :param max_backoff: float: upper limit of the wait time
+        :param retry_on: tuple of exception classes which are considered transient
+        :param queries: tuple of Query classes which may be sent again
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self.queries = queries
+
+    def retriable(self, query, error, attempt):
+        """
+        Returns True if the query is sent again after its attempt-th failure.
+        :param query: Query
+        :param error: Exception
+        :param attempt: int: number of failed attempts so far
+        :return: bool
+        """
+        return attempt <= self.retries and isinstance(error, self.retry_on) and isinstance(query, self.queries)
+
+    def delay(self, attempt):
+        """
+        Returns the time to wait in seconds before the next attempt.
+        :param attempt: int: number of failed attempts so far
+        :return: float
+        """
+        return min(self.max_backoff, self.backoff * self.backoff_factor ** (attempt - 1))
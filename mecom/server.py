@@ -0,0 +1,362 @@
+"""
+mecom-server: owns serial ports and serves them to several processes over a Unix socket, see remote.py.
+
+    mecom-server --port /dev/ttyUSB0:TEC --port /dev/ttyUSB1:LDD
+"""
+
+import argparse
+import errno
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+from concurrent.futures import Future
+from threading import Thread, Lock
+
+# more special pip packages
+from serial import SerialException
+
+# from this package
+from .cache import ParameterCache
+from .exceptions import ResponseException
+from .mecom import MeCom, VR, VS, RS, ACK, VRResponse
+from .metrics import Metrics
+from .pool import MeComPool
+from .remote import DEFAULT_SOCKET, HELLO, QUERIES, STATS, ERROR, COUNT, send_message, receive_message, pack_str, \
+    unpack_str, decode_query, encode_result
+from .retry import RetryPolicy
+
+
+class _Dispatcher(object):
+    """
+    Executes the queries of all clients of one port. Requests waiting while a transaction runs are merged into the
+    next one: identical reads share one query, cached reads are answered without the wire.
+    """
+
+    def __init__(self, handle, port, max_batch=64):
+        """
+        :param handle: PooledSession
+        :param port: str
+        :param max_batch: int: max number of queries merged into one transaction
+        """
+        self.handle = handle
+        self.port = port
+        self.max_batch = max_batch
+        # queue of (list of (Query, bool), Future)
+        self._queue = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.queries = 0
+        self.sent = 0
+        self.shared = 0
+        self.cached = 0
+        self._thread = Thread(target=self._run, name="mecom-server {}".format(port), daemon=True)
+        self._thread.start()
+
+    def submit(self, queries):
+        """
+        Queue the queries of a request, the future resolves to the query answering each of them (itself, or the
+        identical read it was merged with) and the error raised instead of an answer (or None)
+        :param queries: list of (Query, bool)
+        :return: Future
+        """
+        future = Future()
+        self._queue.put((queries, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            while size < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                size += len(item[0])
+            try:
+                self._execute(batch)
+            except Exception as ex:
+                # never leave a client waiting
+                logging.exception("{} failed".format(self.port))
+                for queries, future in batch:
+                    if not future.done():
+                        future.set_exception(ex)
+
+    def _execute(self, batch):
+        """
+        Merge the requests of a batch into one transaction and resolve their futures.
+        """
+        session = self.handle.session
+        cache = session.cache
+        wire = []
+        # (address, parameter id, instance) -> VR on the wire, only while no other query to the device comes between
+        reads = {}
+        # per request: list of the queries answering it
+        answers = []
+        for queries, future in batch:
+            answer = []
+            for query, cached in queries:
+                if type(query) is VR:
+                    key = (query.ADDRESS, query.PARAMETER.id, query.INSTANCE)
+                    value = cache.get(query.ADDRESS, query.PARAMETER, query.INSTANCE) if cached else None
+                    if value is not None:
+                        query.RESPONSE = VRResponse(query.PARAMETER.format)
+                        query.RESPONSE.ADDRESS = query.ADDRESS
+                        query.RESPONSE.PAYLOAD = [value]
+                        self.cached += 1
+                    elif key in reads:
+                        query = reads[key]
+                        self.shared += 1
+                    else:
+                        reads[key] = query
+                        wire.append(query)
+                else:
+                    # writes, resets and downloads may change what the device reads
+                    for key in [key for key in reads if query.ADDRESS in (0, key[0])]:
+                        del reads[key]
+                    wire.append(query)
+                answer.append(query)
+            answers.append(answer)
+            self.requests += 1
+            self.queries += len(queries)
+
+        error = None
+        if wire:
+            self.batches += 1
+            self.sent += len(wire)
+            try:
+                session.transaction(wire, raise_errors=False)
+            except (SerialException, OSError) as ex:
+                logging.warning("{} failed: {}, reopening".format(self.port, ex))
+                self.handle.invalidate()
+                error = ResponseException("{}: {}".format(self.port, ex))
+            except ResponseException as ex:
+                error = ex
+            self._update_cache(cache, wire)
+
+        for (queries, future), answer in zip(batch, answers):
+            future.set_result([(query, error if error is not None and query.RESPONSE is None else None)
+                               for query in answer])
+
+    @staticmethod
+    def _update_cache(cache, queries):
+        """
+        Store the values read and written, see MeCom.set_parameter().
+        """
+        for query in queries:
+            if type(query) is VR and type(query.RESPONSE) is VRResponse:
+                cache.put(query.ADDRESS, query.PARAMETER, query.INSTANCE, query.RESPONSE.PAYLOAD[0])
+            elif type(query) is VS:
+                cache.written(query.ADDRESS, query.PARAMETER, query.INSTANCE, query.PAYLOAD[-1],
+                              acknowledged=type(query.RESPONSE) is ACK)
+            elif type(query) is RS:
+                cache.invalidate(address=None if query.ADDRESS == 0 else query.ADDRESS)
+
+    def stats(self):
+        """
+        Returns the counters of the dispatcher and the statistics of the session.
+        :return: dict
+        """
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "queries": self.queries,
+            "sent": self.sent,
+            "shared": self.shared,
+            "cached": self.cached,
+            "session": self.handle.session.stats(),
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self.handle.release()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """
+    Serves one client connection, requests of a connection are answered in order.
+    """
+
+    def handle(self):
+        server = self.server.mecom
+        dispatcher = None
+        while True:
+            message = receive_message(self.request)
+            if message is None:
+                return
+            kind, body = message
+            try:
+                if kind == HELLO:
+                    port, offset = unpack_str(body, 0)
+                    dispatcher = server.dispatcher(port)
+                    send_message(self.request, HELLO, pack_str(dispatcher.handle.PARAMETERS.metype))
+                elif dispatcher is None:
+                    raise ValueError("HELLO expected")
+                elif kind == QUERIES:
+                    count, = COUNT.unpack_from(body, 0)
+                    offset = COUNT.size
+                    queries = []
+                    for i in range(count):
+                        query, cached, offset = decode_query(body, offset, dispatcher.handle.PARAMETERS)
+                        queries.append((query, cached))
+                    answers = dispatcher.submit(queries).result()
+                    send_message(self.request, QUERIES, COUNT.pack(count) + b"".join(
+                        [encode_result(query, error) for query, error in answers]))
+                elif kind == STATS:
+                    send_message(self.request, STATS, json.dumps(dispatcher.stats()).encode())
+                else:
+                    raise ValueError("unknown message type {}".format(kind))
+            except Exception as ex:
+                logging.warning("request failed: {}".format(ex))
+                send_message(self.request, ERROR, pack_str("{}: {}".format(type(ex).__name__, ex)))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class MeComServer(object):
+    """
+    Serves the configured serial ports to RemoteMeCom clients. A port is opened when the first client asks for it,
+    every port has one session with a cache and a retry policy, shared by all clients.
+
+    server = MeComServer({"/dev/ttyUSB0": {"metype": "TEC"}})
+    server.serve_forever()
+    """
+
+    def __init__(self, ports, socket_path=DEFAULT_SOCKET, cache_ttl=0.1, factory=MeCom, mode=0o660):
+        """
+        :param ports: dict: port -> keyword arguments of MeCom, e.g. {"metype": "TEC", "baudrate": 57600}
+        :param socket_path: str
+        :param cache_ttl: float: default time to live of cached values, see ParameterCache
+        :param factory: callable(serialport=..., **kwargs) returning a session, MeCom by default
+        :param mode: int: permissions of the socket
+        :raises OSError: if another server answers on socket_path
+        """
+        self.ports = ports
+        self.socket_path = socket_path
+        self.cache_ttl = cache_ttl
+        self.pool = MeComPool(factory=factory)
+        # port -> _Dispatcher
+        self._dispatchers = {}
+        self._lock = Lock()
+        if os.path.exists(socket_path):
+            self._remove_stale(socket_path)
+        self._server = _UnixServer(socket_path, _Handler)
+        self._server.mecom = self
+        os.chmod(socket_path, mode)
+
+    @staticmethod
+    def _remove_stale(socket_path):
+        """
+        Remove a socket left over by a server which was killed, a socket of a running server is kept.
+        :param socket_path: str
+        :return:
+        """
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # nobody listens
+            os.unlink(socket_path)
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, "{} is served by another mecom-server".format(socket_path))
+
+    def dispatcher(self, port):
+        """
+        Returns the dispatcher of a configured port, opens the port on first use.
+        :param port: str
+        :return: _Dispatcher
+        """
+        with self._lock:
+            if port not in self._dispatchers:
+                if port not in self.ports:
+                    raise ValueError("{} is not served".format(port))
+                kwargs = dict(cache=ParameterCache(default_ttl=self.cache_ttl), retry=RetryPolicy(),
+                              metrics=Metrics())
+                kwargs.update(self.ports[port])
+                self._dispatchers[port] = _Dispatcher(self.pool.acquire(port, **kwargs), port)
+            return self._dispatchers[port]
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """
+        Serve in a background thread.
+        :return:
+        """
+        Thread(target=self.serve_forever, name="mecom-server", daemon=True).start()
+
+    def close(self):
+        """
+        Stop serving and close all ports.
+        :return:
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        for dispatcher in self._dispatchers.values():
+            dispatcher.close()
+        self.pool.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def main(argv=None):
+    """
+    Entry point of mecom-server.
+    """
+    parser = argparse.ArgumentParser(prog="mecom-server", description="Share serial ports of Meerstetter devices "
+                                                                      "between processes.")
+    parser.add_argument("--port", action="append", required=True, metavar="PORT[:METYPE]",
+                        help="serial port to serve, METYPE is TEC (default) or LDD, may be repeated")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket, default %(default)s")
+    parser.add_argument("--baudrate", type=int, default=57600)
+    parser.add_argument("--timeout", type=float, default=1.0, help="serial timeout in seconds")
+    parser.add_argument("--cache-ttl", type=float, default=0.1, help="seconds a value read is reused")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s:%(module)s:%(levelname)s:%(message)s")
+    ports = {}
+    for spec in args.port:
+        port, _, metype = spec.partition(":")
+        ports[port] = {"metype": metype or "TEC", "baudrate": args.baudrate, "timeout": args.timeout}
+
+    server = MeComServer(ports, socket_path=args.socket, cache_ttl=args.cache_ttl)
+    # remove the socket when stopped by a service manager
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logging.info("serving {} on {}".format(", ".join(ports), args.socket))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
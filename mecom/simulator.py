@@ -0,0 +1,490 @@
+"""
+Device side of the MeCom protocol, to run benchmarks and tests without hardware.
+
+SimulatedDevice answers ?VR, VS, ?IF, RS and ?TD queries from a parameter store seeded from commands.py.
+FakeSerial is an in-process replacement for serial.Serial which can be passed to MeCom(serial_instance=...),
+PtySimulator serves the same devices on a pseudo terminal which can be opened like a real port.
+Both emulate the response latency and the baud rate and can inject faults.
+
+Run this file to get a throughput benchmark.
+"""
+
+import os
+import pty
+import random
+import threading
+import time
+import tty
+from binascii import hexlify, unhexlify
+from struct import pack, unpack
+
+# from this package
+from .commands import TEC_PARAMETERS, LDD_PARAMETERS
+from .crc import crc16, crc32
+
+# error codes, see commands.ERRORS
+EER_CMD_NOT_AVAILABLE = 1
+EER_FORMAT = 4
+EER_PAR_NOT_AVAILABLE = 5
+EER_PAR_INST_NOT_AVAILABLE = 8
+
+# start values which differ from 0
+DEFAULT_VALUES = {
+    "Device Status": 2,
+    "Save Data to Flash": 1,
+    "Object Temperature": 25.0,
+    "Sink Temperature": 25.0,
+    "Target Object Temperature": 25.0,
+    "Target Object Temp (Set)": 25.0,
+    "Temperature is Stable": 2,
+}
+
+
+class SimulatedDevice(object):
+    """
+    A MeCom device with a parameter store.
+    Queries with a wrong checksum are not answered.
+    """
+
+    def __init__(self, address=1, metype='TEC', instances=2, info="SIMULATED MECOM", flash_time=0.05,
+                 values=None):
+        """
+        :param address: int
+        :param metype: str: either 'TEC' or 'LDD', selects the parameters of commands.py
+        :param instances: int: number of channels, every parameter exists for instance 1...instances
+        :param info: str: identification string returned by ?IF, padded to 20 characters
+        :param flash_time: float: seconds "Flash Status" stays busy after "Save Data to Flash" was set to 0
+        :param values: dict: name -> value, overrides the start values
+        """
+        self.address = address
+        self.instances = instances
+        self.info = "{:<20.20}".format(info)
+        self.flash_time = flash_time
+        self._flash_busy_until = 0.0
+
+        parameters = TEC_PARAMETERS if metype == 'TEC' else LDD_PARAMETERS
+        # the first entry of an id defines the format, like ParameterList does
+        self.formats = {}
+        names = {}
+        for parameter in parameters:
+            self.formats.setdefault(parameter["id"], parameter["format"])
+            names.setdefault(parameter["name"], parameter["id"])
+        self._ids = names
+
+        self._address_id = names.get("Device Address")
+
+        start_values = dict(DEFAULT_VALUES)
+        start_values.update(values or {})
+        start_values["Device Address"] = address
+        self.values = {}
+        for parameter_id, fmt in self.formats.items():
+            for instance in range(1, instances + 1):
+                self.values[(parameter_id, instance)] = 0.0 if fmt == "FLOAT32" else 0
+        for name, value in start_values.items():
+            if name in names:
+                self.set(name, value)
+
+        # lookup tables
+        self.tables = {}
+        self.table_status = 1  # no valid table before a verification
+        self.pages_received = 0
+
+    def _id(self, parameter):
+        return self._ids[parameter] if isinstance(parameter, str) else parameter
+
+    def get(self, parameter, instance=1):
+        """
+        Returns the stored value of a parameter given by name or id.
+        :param parameter: str or int
+        :param instance: int
+        :return: int or float
+        """
+        return self.values[(self._id(parameter), instance)]
+
+    def set(self, parameter, value, instance=None):
+        """
+        Stores the value of a parameter given by name or id, for all instances if instance is None.
+        :param parameter: str or int
+        :param value: int or float
+        :param instance: int
+        :return:
+        """
+        parameter_id = self._id(parameter)
+        cast = float if self.formats[parameter_id] == "FLOAT32" else int
+        for inst in ([instance] if instance is not None else range(1, self.instances + 1)):
+            self.values[(parameter_id, inst)] = cast(value)
+
+    def _frame(self, sequence, payload):
+        """
+        Compose a response frame.
+        :param sequence: int
+        :param payload: bytes
+        :return: bytes
+        """
+        frame = b"!%02X%04X" % (self.address, sequence) + payload
+        return frame + b"%04X\r" % crc16(frame)
+
+    def _error(self, sequence, code):
+        return self._frame(sequence, b"+%02X" % code)
+
+    def _encode(self, parameter_id, value):
+        if self.formats[parameter_id] == "FLOAT32":
+            return hexlify(pack("!f", value)).upper()
+        return b"%08X" % (value & 0xFFFFFFFF)
+
+    def _decode(self, parameter_id, payload):
+        fmt = "!f" if self.formats[parameter_id] == "FLOAT32" else "!i"
+        return unpack(fmt, unhexlify(payload))[0]
+
+    def _flash_status(self):
+        return 1 if time.monotonic() < self._flash_busy_until else 0
+
+    def handle(self, frame):
+        """
+        Process one query frame (with the carriage return stripped) and return the response frame or None.
+        :param frame: bytes
+        :return: bytes
+        """
+        if len(frame) < 11 or frame[:1] != b"#":
+            return None
+        try:
+            address = int(frame[1:3], 16)
+            sequence = int(frame[3:7], 16)
+            in_crc = int(frame[-4:], 16)
+        except ValueError:
+            return None
+        if address not in (0, self.address):
+            return None
+        if crc16(frame[:-4]) != in_crc:
+            return None
+        payload = frame[7:-4]
+
+        try:
+            if payload.startswith(b"?VR"):
+                parameter_id, instance = int(payload[3:7], 16), int(payload[7:9], 16)
+                if parameter_id not in self.formats:
+                    return self._error(sequence, EER_PAR_NOT_AVAILABLE)
+                if (parameter_id, instance) not in self.values:
+                    return self._error(sequence, EER_PAR_INST_NOT_AVAILABLE)
+                value = self.values[(parameter_id, instance)]
+                if parameter_id == 109:  # Flash Status
+                    value = self._flash_status()
+                return self._frame(sequence, self._encode(parameter_id, value))
+
+            if payload.startswith(b"VS"):
+                parameter_id, instance = int(payload[2:6], 16), int(payload[6:8], 16)
+                if parameter_id not in self.formats:
+                    return self._error(sequence, EER_PAR_NOT_AVAILABLE)
+                if (parameter_id, instance) not in self.values:
+                    return self._error(sequence, EER_PAR_INST_NOT_AVAILABLE)
+                value = self._decode(parameter_id, payload[8:16])
+                self.values[(parameter_id, instance)] = value
+                if parameter_id == 108 and value == 0:  # Save Data to Flash
+                    self._flash_busy_until = time.monotonic() + self.flash_time
+                # the ACK repeats the checksum of the query
+                ack = b"!%02X%04X" % (self.address, sequence) + frame[-4:] + b"\r"
+                if parameter_id == self._address_id:
+                    self.address = value
+                return ack
+
+            if payload.startswith(b"?IF"):
+                return self._frame(sequence, self.info.encode())
+
+            if payload.startswith(b"RS"):
+                return b"!%02X%04X" % (self.address, sequence) + frame[-4:] + b"\r"
+
+            if payload.startswith(b"?TD"):
+                return self._frame(sequence, b"%02X" % self._table_download(payload))
+        except ValueError:
+            return self._error(sequence, EER_FORMAT)
+
+        return self._error(sequence, EER_CMD_NOT_AVAILABLE)
+
+    def _table_download(self, payload):
+        """
+        ?TD command 1 stores a 256 byte page, command 2 verifies all tables, command 0 returns the status.
+        Returns 3 if a command was received, 0 if the verification passed and 1 if it failed.
+        :param payload: bytes
+        :return: int
+        """
+        command = int(payload[3:5], 16)
+        if command == 1:
+            instance = int(payload[5:7], 16)
+            offset = int(payload[7:15], 16)
+            data = unhexlify(payload[15:15 + 512])
+            table = self.tables.setdefault(instance, bytearray())
+            if len(table) < offset + len(data):
+                table.extend(bytes(offset + len(data) - len(table)))
+            table[offset:offset + len(data)] = data
+            self.pages_received += 1
+            return 3
+        if command == 2:
+            # nothing downloaded is not a valid table
+            valid = self.tables and all(self._table_valid(table) for table in self.tables.values())
+            self.table_status = 0 if valid else 1
+            return 3
+        return self.table_status
+
+    @staticmethod
+    def _table_valid(table):
+        """
+        A table image is [crc, length, type, data...] as little endian uint32, the crc covers everything but itself.
+        :param table: bytearray
+        :return: bool
+        """
+        if len(table) < 12:
+            return False
+        length = int.from_bytes(table[4:8], "little")
+        return length <= len(table) and crc32(bytes(table[4:length])) == int.from_bytes(table[0:4], "little")
+
+
+class FaultInjector(object):
+    """
+    Randomly breaks responses, every probability is per response frame.
+    """
+
+    def __init__(self, drop=0.0, corrupt=0.0, wrong_sequence=0.0, noise=0.0, seed=None):
+        """
+        :param drop: float: the response is not sent
+        :param corrupt: float: one payload character is changed, the checksum does not match
+        :param wrong_sequence: float: the sequence number is changed to one long out of use, the checksum matches
+        :param noise: float: a stale frame of a sequence long out of use is sent before the response, the checksum
+        matches
+        :param seed: int
+        """
+        self.drop = drop
+        self.corrupt = corrupt
+        self.wrong_sequence = wrong_sequence
+        self.noise = noise
+        self._random = random.Random(seed)
+        self.injected = 0
+
+    def apply(self, response):
+        """
+        Returns the (possibly broken) response, None if it is dropped.
+        :param response: bytes
+        :return: bytes
+        """
+        rand = self._random.random
+        if rand() < self.drop:
+            self.injected += 1
+            return None
+        if rand() < self.wrong_sequence:
+            self.injected += 1
+            # half the sequence space away, never a query still waiting for its reply
+            frame = b"!" + response[1:3] + b"%04X" % ((int(response[3:7], 16) + 2 ** 15) % 2 ** 16) + response[7:-5]
+            response = frame + b"%04X\r" % crc16(frame)
+        if rand() < self.corrupt:
+            self.injected += 1
+            position = self._random.randrange(7, len(response) - 5)
+            response = response[:position] + (b"0" if response[position:position + 1] != b"0" else b"1") + \
+                response[position + 1:]
+        if rand() < self.noise:
+            self.injected += 1
+            frame = b"!" + response[1:3] + b"%04X" % ((int(response[3:7], 16) - 2 ** 15) % 2 ** 16) + b"00000000"
+            response = frame + b"%04X\r" % crc16(frame) + response
+        return response
+
+
+class _Wire(object):
+    """
+    Serial line with devices attached, computes the responses and when they arrive.
+    """
+
+    def __init__(self, devices, latency=0.0, baudrate=None, faults=None):
+        """
+        :param devices: SimulatedDevice or list of SimulatedDevice (multi-drop bus)
+        :param latency: float: seconds between the end of a query and the start of the response
+        :param baudrate: int: if given, the transmission time of every byte is added (10 bit per byte)
+        :param faults: FaultInjector
+        """
+        self.devices = devices if isinstance(devices, (list, tuple)) else [devices]
+        self.latency = latency
+        self.baudrate = baudrate
+        self.faults = faults
+        self._partial = bytearray()
+        self._line_free = 0.0
+
+    def _byte_time(self, n):
+        return 0.0 if not self.baudrate else n * 10.0 / self.baudrate
+
+    def _respond(self, data):
+        """
+        Feed bytes sent to the devices, returns a list of (arrival time, response bytes).
+        :param data: bytes
+        :return: list of (float, bytes)
+        """
+        self._partial += data
+        now = time.monotonic()
+        responses = []
+        end = self._partial.find(b"\r")
+        while end >= 0:
+            frame = bytes(self._partial[:end])
+            del self._partial[:end + 1]
+            end = self._partial.find(b"\r")
+
+            response = None
+            for device in self.devices:
+                response = device.handle(frame)
+                # on a broadcast the first device answers
+                if response is not None:
+                    break
+            if response is not None and self.faults is not None:
+                response = self.faults.apply(response)
+            if response is None:
+                continue
+            start = max(now + self._byte_time(len(frame) + 1) + self.latency, self._line_free)
+            self._line_free = start + self._byte_time(len(response))
+            responses.append((self._line_free, response))
+        return responses
+
+
+class FakeSerial(_Wire):
+    """
+    In-process replacement of serial.Serial, use with MeCom(serial_instance=FakeSerial(SimulatedDevice())).
+    """
+
+    def __init__(self, devices, latency=0.0, baudrate=None, faults=None, timeout=1):
+        super(FakeSerial, self).__init__(devices, latency=latency, baudrate=baudrate, faults=faults)
+        self.timeout = timeout
+        self.is_open = True
+        self._received = bytearray()
+        # responses not yet arrived, (arrival time, bytes)
+        self._in_transit = []
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def _arrive(self):
+        now = time.monotonic()
+        while self._in_transit and self._in_transit[0][0] <= now:
+            self._received += self._in_transit.pop(0)[1]
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self._in_transit.extend(self._respond(bytes(data)))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        self._arrive()
+        return len(self._received)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self._arrive()
+        while len(self._received) < size and self._in_transit:
+            arrival = self._in_transit[0][0]
+            if deadline is not None and arrival > deadline:
+                break
+            time.sleep(max(0.0, arrival - time.monotonic()))
+            self._arrive()
+        if len(self._received) < size and deadline is not None:
+            # nothing more will arrive, wait for the timeout like a real port
+            time.sleep(max(0.0, deadline - time.monotonic()))
+        data = bytes(self._received[:size])
+        del self._received[:size]
+        self.bytes_read += len(data)
+        return data
+
+    def read_until(self, expected=b"\n", size=None):
+        data = bytearray()
+        while not data.endswith(expected) and (size is None or len(data) < size):
+            byte = self.read(1)
+            if not byte:
+                break
+            data += byte
+        return bytes(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        # frames still on the line arrive later, like on a real port
+        self._arrive()
+        del self._received[:]
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PtySimulator(_Wire):
+    """
+    Serves devices on a pseudo terminal, open port with MeCom or AsyncMeCom like a real serial port.
+
+    with PtySimulator(SimulatedDevice(address=1)) as sim:
+        mc = MeCom(sim.port, metype="TEC")
+    """
+
+    def __init__(self, devices, latency=0.0, baudrate=None, faults=None):
+        super(PtySimulator, self).__init__(devices, latency=latency, baudrate=baudrate, faults=faults)
+        self._master, self._slave = pty.openpty()
+        # no echo, no translation of the carriage return
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            for arrival, response in self._respond(data):
+                delay = arrival - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    os.write(self._master, response)
+                except OSError:
+                    return
+
+    def stop(self):
+        self._running = False
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    from .mecom import MeCom
+
+    parameters = ["Object Temperature", "Sink Temperature", "Target Object Temperature", "Actual Output Current",
+                  "Actual Output Voltage"]
+
+    def benchmark(session, seconds=1.0):
+        frames, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            session.get_parameter(parameter_name=parameters[0], address=1)
+            frames += 1
+        single = frames / (time.perf_counter() - start)
+        frames, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            session.get_parameters(parameters, address=1)
+            frames += len(parameters)
+        return single, frames / (time.perf_counter() - start)
+
+    mc = MeCom(serial_instance=FakeSerial(SimulatedDevice()), metype="TEC")
+    print("in-process: {:.0f} frames/s single, {:.0f} frames/s pipelined".format(*benchmark(mc)))
+
+    with PtySimulator(SimulatedDevice()) as sim:
+        with MeCom(sim.port, metype="TEC") as mc:
+            print("pty:        {:.0f} frames/s single, {:.0f} frames/s pipelined".format(*benchmark(mc)))
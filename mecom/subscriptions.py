@@ -0,0 +1,209 @@
+"""
+Change notifications for parameters, polled centrally for all listeners of a session, see MeCom.subscribe().
+"""
+
+import logging
+import time
+from threading import Thread, Event, Lock, current_thread
+
+# from this package
+from .exceptions import ResponseException, WrongChecksum
+from .mecom import VR, VRResponse
+
+
+class Subscription(object):
+    """
+    Handle returned by MeCom.subscribe().
+    """
+    __slots__ = ("key", "callback", "interval", "deadband", "_manager")
+
+    def __init__(self, manager, key, callback, interval, deadband):
+        self._manager = manager
+        self.key = key
+        self.callback = callback
+        self.interval = interval
+        self.deadband = deadband
+
+    def cancel(self):
+        """
+        Stop notifying the callback, the parameter is no longer polled when it was the last listener.
+        :return:
+        """
+        self._manager.remove(self)
+
+
+class _Group(object):
+    """
+    Listeners of one value with the same deadband, they are notified together.
+    """
+    __slots__ = ("last", "listeners", "new")
+
+    def __init__(self):
+        # last value notified, None before the first one or after a failed read
+        self.last = None
+        self.listeners = []
+        # listeners which have not been notified yet
+        self.new = []
+
+
+class _Polled(object):
+    """
+    One (address, parameter id, instance) polled at the shortest interval of its listeners.
+    """
+    __slots__ = ("parameter", "groups", "interval", "due")
+
+    def __init__(self, parameter):
+        self.parameter = parameter
+        # deadband -> _Group
+        self.groups = {}
+        self.interval = None
+        self.due = 0.0
+
+    def update_interval(self):
+        self.interval = min(listener.interval for group in self.groups.values()
+                            for listener in group.listeners + group.new)
+
+
+class Subscriptions(object):
+    """
+    Polls all subscribed values of a session in one background thread. Every value is read once per interval no
+    matter how many listeners it has, values due at the same time are read within one transaction, and the work per
+    poll grows with the number of values and distinct deadbands, not with the number of listeners.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: MeCom
+        """
+        self.session = session
+        # (address, parameter id, instance) -> _Polled
+        self._polled = {}
+        self._lock = Lock()
+        self._wake = Event()
+        self._stop = False
+        self._thread = None
+        self.errors = 0
+
+    def add(self, parameter, callback, interval, deadband, address, instance):
+        """
+        See MeCom.subscribe().
+        """
+        key = (address, parameter.id, instance)
+        subscription = Subscription(self, key, callback, interval, deadband)
+        with self._lock:
+            polled = self._polled.get(key)
+            if polled is None:
+                polled = self._polled[key] = _Polled(parameter)
+            polled.groups.setdefault(deadband, _Group()).new.append(subscription)
+            # read soon, the new listener gets the current value
+            polled.due = time.monotonic()
+            polled.update_interval()
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = Thread(target=self._run, name="MeCom subscriptions", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return subscription
+
+    def remove(self, subscription):
+        """
+        Remove a listener, see Subscription.cancel().
+        """
+        with self._lock:
+            polled = self._polled.get(subscription.key)
+            group = None if polled is None else polled.groups.get(subscription.deadband)
+            if group is None:
+                return
+            for listeners in (group.listeners, group.new):
+                if subscription in listeners:
+                    listeners.remove(subscription)
+            if not group.listeners and not group.new:
+                del polled.groups[subscription.deadband]
+            if polled.groups:
+                polled.update_interval()
+            else:
+                del self._polled[subscription.key]
+
+    def poll(self, due):
+        """
+        Read the values due within one transaction and notify their listeners.
+        :param due: list of (key, _Polled)
+        :return:
+        """
+        queries = [VR(parameter=polled.parameter, address=key[0], parameter_instance=key[2]) for key, polled in due]
+        cache = self.session.cache
+        generation = None if cache is None else cache.generation
+        try:
+            self.session.transaction(queries, raise_errors=False)
+        except (ResponseException, WrongChecksum) as ex:
+            self.errors += 1
+            logging.warning("polling subscriptions failed: {}".format(ex))
+            values = [None] * len(due)
+        except Exception:
+            # serial port errors and the like, keep polling
+            self.errors += 1
+            logging.exception("polling subscriptions failed")
+            values = [None] * len(due)
+        else:
+            values = [vr.RESPONSE.PAYLOAD[0] if type(vr.RESPONSE) is VRResponse else None for vr in queries]
+
+        for ((key, polled), value) in zip(due, values):
+            if cache is not None and value is not None:
+                cache.put(key[0], polled.parameter, key[2], value, generation)
+            with self._lock:
+                groups = list(polled.groups.items())
+            for deadband, group in groups:
+                self._notify(group, deadband, value)
+
+    def _notify(self, group, deadband, value):
+        """
+        Call the listeners of a group if the value moved by more than the deadband since they were last notified,
+        or if it became (un)readable. New listeners always get the value.
+        """
+        if value is None:
+            changed = group.last is not None
+        else:
+            changed = group.last is None or abs(value - group.last) > deadband
+        listeners = list(group.listeners) if changed else []
+        if group.new:
+            with self._lock:
+                new, group.new = group.new, []
+                group.listeners.extend(new)
+            listeners += new
+        if changed:
+            group.last = value
+        for listener in listeners:
+            try:
+                listener.callback(value)
+            except Exception:
+                logging.exception("subscription callback failed")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # stopped, or replaced by a new thread after a stop() from a callback
+                if self._stop or self._thread is not current_thread():
+                    return
+                now = time.monotonic()
+                due = [(key, polled) for key, polled in self._polled.items() if polled.due <= now]
+                for key, polled in due:
+                    # skip missed polls instead of catching up
+                    polled.due = max(polled.due + polled.interval, now)
+                wait = min((polled.due for polled in self._polled.values()), default=None)
+            if due:
+                self.poll(due)
+            self._wake.wait(None if wait is None else max(0.0, wait - time.monotonic()))
+            self._wake.clear()
+
+    def stop(self):
+        """
+        Stop polling, the subscriptions are kept and polled again after the next subscribe(). Called by a callback,
+        the polling thread ends after the callbacks of the current poll.
+        :return:
+        """
+        with self._lock:
+            self._stop = True
+            thread, self._thread = self._thread, None
+        self._wake.set()
+        if thread is not None and thread is not current_thread():
+            thread.join()
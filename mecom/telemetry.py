@@ -0,0 +1,226 @@
+"""
+Background polling of parameters into preallocated NumPy ring buffers.
+"""
+
+import logging
+import time
+from threading import Thread, Event
+
+import numpy as np
+
+# more special pip packages
+from serial import SerialException
+
+# from this package
+from .exceptions import ResponseException, WrongChecksum
+from .mecom import VR
+
+# dtype of the stored values
+DTYPES = {"FLOAT32": np.float32, "INT32": np.int32}
+
+
+class RingBuffer(object):
+    """
+    History of one channel x parameter with monotonic timestamps.
+    Every sample is written twice, at i and at i + slots, hence the last n samples always form a contiguous slice
+    and are returned as views without copying. There is a single writer, the number of samples is increased after
+    a sample has been written, so readers never see a half written sample.
+    There are spare slots beyond the capacity, the writer overwrites a returned view only after spare further
+    samples: copy views which are kept longer.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, spare=None):
+        """
+        :param capacity: int: number of samples kept
+        :param dtype: numpy dtype of the values
+        :param spare: int: samples appended before a view is overwritten, capacity by default
+        """
+        self.capacity = capacity
+        self.spare = capacity if spare is None else max(1, spare)
+        self.slots = capacity + self.spare
+        self.times = np.zeros(2 * self.slots, dtype=np.float64)
+        self.values = np.zeros(2 * self.slots, dtype=dtype)
+        # total number of samples written
+        self.count = 0
+
+    def append(self, timestamp, value):
+        """
+        Add a sample, the oldest sample is dropped if the buffer is full.
+        :param timestamp: float: time.monotonic()
+        :param value: int or float
+        :return:
+        """
+        i = self.count % self.slots
+        self.times[i] = self.times[i + self.slots] = timestamp
+        self.values[i] = self.values[i + self.slots] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def latest(self, n=None):
+        """
+        Returns read-only views of the timestamps and values of the last n samples (default all), oldest first.
+        :param n: int
+        :return: (np.ndarray, np.ndarray)
+        """
+        count = self.count
+        stored = min(count, self.capacity)
+        n = stored if n is None else min(n, stored)
+        start = (count - n) % self.slots
+        times = self.times[start:start + n]
+        values = self.values[start:start + n]
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+
+    def window(self, t0=None, t1=None):
+        """
+        Returns read-only views of the samples with t0 <= timestamp < t1, the search runs on a view the writer does
+        not touch.
+        :param t0: float
+        :param t1: float
+        :return: (np.ndarray, np.ndarray)
+        """
+        times, values = self.latest()
+        start = 0 if t0 is None else np.searchsorted(times, t0, side="left")
+        end = len(times) if t1 is None else np.searchsorted(times, t1, side="left")
+        return times[start:end], values[start:end]
+
+
+class TelemetryPoller(object):
+    """
+    Samples parameters of one device at fixed intervals in a background thread.
+    Parameters with the same interval are read within one transaction.
+
+    poller = TelemetryPoller(mc, address=1)
+    poller.add("Object Temperature", interval=0.1, instances=(1, 2))
+    poller.start()
+    times, values = poller.latest("Object Temperature", instance=2, n=100)
+    """
+
+    def __init__(self, session, address=0, capacity=10000):
+        """
+        :param session: MeCom
+        :param address: int
+        :param capacity: int: samples kept per channel x parameter
+        """
+        self.session = session
+        self.address = address
+        self.capacity = capacity
+        # (parameter name, instance) -> RingBuffer
+        self.buffers = {}
+        # interval -> list of (Parameter, instance, RingBuffer)
+        self._groups = {}
+        self._thread = None
+        self._stop = Event()
+        self.errors = 0
+
+    def add(self, parameter, interval, instances=(1,)):
+        """
+        Sample a parameter given by name (str) or id (int) every interval seconds for each instance (channel).
+        :param parameter: str or int
+        :param interval: float
+        :param instances: tuple of int
+        :return:
+        """
+        assert self._thread is None, "add parameters before start()"
+        parameter = self.session._lookup(parameter)
+        for instance in instances:
+            buffer = RingBuffer(self.capacity, DTYPES.get(parameter.format, np.float64))
+            self.buffers[(parameter.name, instance)] = buffer
+            self._groups.setdefault(interval, []).append((parameter, instance, buffer))
+
+    def buffer(self, parameter, instance=1):
+        """
+        Returns the RingBuffer of a parameter given by name (str) or id (int).
+        :param parameter: str or int
+        :param instance: int
+        :return: RingBuffer
+        """
+        return self.buffers[(self.session._lookup(parameter).name, instance)]
+
+    def latest(self, parameter, instance=1, n=None):
+        """
+        Returns views of the last n timestamps and values, see RingBuffer.latest().
+        """
+        return self.buffer(parameter, instance).latest(n)
+
+    def window(self, parameter, instance=1, t0=None, t1=None):
+        """
+        Returns views of the samples between t0 and t1, see RingBuffer.window().
+        """
+        return self.buffer(parameter, instance).window(t0, t1)
+
+    def snapshot(self, n=None):
+        """
+        Returns views of the last n samples of every channel x parameter.
+        :param n: int
+        :return: dict: (parameter name, instance) -> (times, values)
+        """
+        return {key: buffer.latest(n) for key, buffer in self.buffers.items()}
+
+    def sample(self, interval):
+        """
+        Read all parameters of an interval group once and store them.
+        :param interval: float
+        :return:
+        """
+        group = self._groups[interval]
+        queries = [VR(parameter=parameter, address=self.address, parameter_instance=instance)
+                   for parameter, instance, buffer in group]
+        try:
+            self.session.transaction(queries)
+        except (ResponseException, WrongChecksum) as ex:
+            self.errors += 1
+            logging.warning("telemetry of device {} failed: {}".format(self.address, ex))
+            return
+        except (SerialException, OSError) as ex:
+            # keep sampling, the port may come back
+            self.errors += 1
+            logging.error("telemetry of device {} failed, serial port error: {}".format(self.address, ex))
+            return
+        now = time.monotonic()
+        for (parameter, instance, buffer), query in zip(group, queries):
+            buffer.append(now, query.RESPONSE.PAYLOAD[0])
+
+    def _run(self):
+        next_due = {interval: time.monotonic() for interval in self._groups}
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for interval, due in next_due.items():
+                if due <= now:
+                    self.sample(interval)
+                    # skip missed samples instead of catching up
+                    next_due[interval] = max(due + interval, time.monotonic())
+            if next_due:
+                self._stop.wait(max(0.0, min(next_due.values()) - time.monotonic()))
+            else:
+                self._stop.wait()
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        :return:
+        """
+        assert self._thread is None
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="TelemetryPoller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling, the buffers are kept.
+        :return:
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
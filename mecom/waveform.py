@@ -0,0 +1,182 @@
+"""
+Composable waveforms for the LDD lookup tables, compiled to float32 tables with one value per table interval.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# from this package
+from .lookup_table import LT_download_manager, LUT_MAX_FLOAT_COUNT
+
+
+class Waveform(object):
+    """
+    A sequence of segments, durations in us. Every builder method returns the waveform, hence they can be chained,
+    and waveforms are concatenated with +.
+
+    pulse = Waveform().plateau(100, 0.0).sin2(500, 0.0, 10.0).plateau(1000).sin2(500, 10.0, 0.0).plateau(100)
+    image = pulse.compile(interval=10, limits=(0.0, 12.0))
+    engine.download({1: image})
+
+    The limits are those of the device and its setup (e.g. the laser diode), there is no default.
+    Compiled images are cached by the content of the waveform, the interval and the limits, so compiling the same
+    shape again costs only a hash.
+    """
+    CACHE_SIZE = 32
+    # content hash -> table image, least recently used first
+    _cache = OrderedDict()
+
+    def __init__(self, segments=()):
+        """
+        :param segments: list of (kind, duration, parameters)
+        """
+        self.segments = list(segments)
+
+    def __add__(self, other):
+        return Waveform(self.segments + other.segments)
+
+    def _add(self, kind, duration, *parameters):
+        if duration < 0:
+            raise ValueError("duration must not be negative")
+        self.segments.append((kind, float(duration), parameters))
+        return self
+
+    @property
+    def end(self):
+        """
+        The level at the end of the waveform, 0 if it is empty.
+        :return: float
+        """
+        for kind, duration, parameters in reversed(self.segments):
+            if kind == "samples":
+                return float(parameters[0][-1])
+            return parameters[-1]
+        return 0.0
+
+    @property
+    def duration(self):
+        """
+        Total duration in us.
+        :return: float
+        """
+        return sum(duration for kind, duration, parameters in self.segments)
+
+    def ramp(self, duration, start, end):
+        """
+        Linear ramp from start to end.
+        """
+        return self._add("ramp", duration, float(start), float(end))
+
+    def sin2(self, duration, start, end):
+        """
+        sin² shaped ramp from start to end, smooth at both ends.
+        """
+        return self._add("sin2", duration, float(start), float(end))
+
+    def sigmoid(self, duration, start, end, steepness=10.0):
+        """
+        Logistic ramp from start to end, the larger steepness, the sharper the step in the middle.
+        """
+        return self._add("sigmoid", duration, float(steepness), float(start), float(end))
+
+    def plateau(self, duration, level=None):
+        """
+        Constant level, by default the end of the previous segment.
+        """
+        return self._add("plateau", duration, float(self.end if level is None else level))
+
+    def samples(self, values, sampling_time):
+        """
+        Arbitrary values sampled every sampling_time us, they are linearly resampled to the table interval.
+        """
+        values = np.array(values, dtype=np.float64)
+        if values.ndim != 1 or len(values) == 0:
+            raise ValueError("samples must be a non-empty 1d array")
+        return self._add("samples", len(values) * sampling_time, values, float(sampling_time))
+
+    def render(self, interval):
+        """
+        Returns the waveform as one value per interval.
+        Every segment contributes round(duration / interval) values starting at its beginning, its end point is the
+        start of the next segment.
+        :param interval: float: table interval in us (parameter 4200 "Table Interval")
+        :return: np.ndarray of float32
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        parts = []
+        for kind, duration, parameters in self.segments:
+            n = int(round(duration / interval))
+            # position within the segment, 0 <= x < 1
+            x = np.arange(n) / n if n else np.zeros(0)
+            if kind == "ramp":
+                start, end = parameters
+                part = start + (end - start) * x
+            elif kind == "sin2":
+                start, end = parameters
+                part = start + (end - start) * np.sin(x * np.pi / 2) ** 2
+            elif kind == "sigmoid":
+                steepness, start, end = parameters
+                edges = 1 / (1 + np.exp(-steepness * np.array([-0.5, 0.5])))
+                s = (1 / (1 + np.exp(-steepness * (x - 0.5))) - edges[0]) / (edges[1] - edges[0])
+                part = start + (end - start) * s
+            elif kind == "plateau":
+                part = np.full(n, parameters[0])
+            else:
+                values, sampling_time = parameters
+                part = np.interp(np.arange(n) * interval, np.arange(len(values)) * sampling_time, values)
+            parts.append(part)
+        return np.concatenate(parts).astype(np.float32) if parts else np.zeros(0, dtype=np.float32)
+
+    def check(self, table, limits):
+        """
+        Raises ValueError if a rendered table can not be downloaded: too short, too long or out of limits.
+        :param table: np.ndarray
+        :param limits: (float, float): min and max value
+        :return:
+        """
+        if not 2 <= len(table) <= LUT_MAX_FLOAT_COUNT:
+            raise ValueError("the table has {} values, 2-{} are allowed, change the interval".format(
+                len(table), LUT_MAX_FLOAT_COUNT))
+        if not np.isfinite(table).all():
+            raise ValueError("the table contains values which are not finite")
+        low, high = float(table.min()), float(table.max())
+        if low < limits[0] or high > limits[1]:
+            raise ValueError("the table ranges from {} to {}, the limits are {} to {}".format(low, high, *limits))
+
+    def key(self, interval, limits):
+        """
+        Returns a hash of the segments, the interval and the limits.
+        :param interval: float
+        :param limits: (float, float)
+        :return: str
+        """
+        h = hashlib.sha256(repr((float(interval), tuple(limits))).encode())
+        for kind, duration, parameters in self.segments:
+            h.update(repr((kind, duration)).encode())
+            for parameter in parameters:
+                h.update(parameter.tobytes() if isinstance(parameter, np.ndarray) else repr(parameter).encode())
+        return h.hexdigest()
+
+    def compile(self, interval, limits, table_type=0):
+        """
+        Render, check and build the table image, see LT_download_manager.LUT_BuildTableImage().
+        :param interval: float: table interval in us
+        :param limits: (float, float): min and max value
+        :param table_type: int
+        :return: bytes
+        """
+        key = self.key(interval, limits) + str(table_type)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            return image
+        table = self.render(interval)
+        self.check(table, limits)
+        image = LT_download_manager.LUT_BuildTableImage(table, table_type)
+        self._cache[key] = image
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return image
@@ -1,35 +1,57 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
-def sin_square_with_plateau(ramp_time, high_time, high_power, sampling_time, generate_csvfile= False):
+
+def plot_sequence(sequence, sampling_time):
+    """
+    Plots a sequence over time in ms, matplotlib is only imported here.
+    sampling_time in us
+    """
+    import matplotlib.pyplot as plt
+    x = np.arange(0, len(sequence))*sampling_time
+    plt.plot(x/1000, sequence)
+    plt.xlabel('Time (ms)')
+    plt.ylabel('Power(W)')
+    plt.show()
+
+
+def write_csvfile(sequence, csvfile, table_instance=1):
+    """
+    Writes a sequence as lookup table CSV file, see LT_download_manager.LUT_OpenCSVFile
+    """
+    with open(csvfile, "w") as f:
+        f.write('Table Instance ; {}\n'.format(table_instance))
+        f.write(''.join(['; {}\n'.format(value) for value in sequence]))
+
+
+def sin_square_with_plateau(ramp_time, high_time, high_power, sampling_time, generate_csvfile= False, plot=False):
+    """
+    Returns the sequence as float32 array, ready for LUT_DownloadEngine.download_tables
+    generate_csvfile = True --> LT saved in sin_square_with_plateau.csv
+    plot = True --> sequence is plotted
+    """
     high_points = high_time//sampling_time
     ramp_points = ramp_time//sampling_time
     ramp_angles = np.linspace(0,np.pi/2, int(ramp_points))
     ramp_up = high_power * np.sin(ramp_angles)**2
     ramp_down = high_power * np.sin(ramp_angles+np.pi/2)**2
     high = np.ones(int(high_points))*high_power
-    sequence = np.concatenate((ramp_up,high,ramp_down))
-    plt.plot(np.arange(0,len(sequence))/100,sequence)
-    plt.xlabel('Time (ms)')
-    plt.ylabel('Power(W)')
-    plt.show()
+    sequence = np.concatenate((ramp_up,high,ramp_down)).astype(np.float32)
+    if plot:
+        plot_sequence(sequence, sampling_time)
 
     if generate_csvfile:
-        sequence = sequence.reshape(-1, 1)
-        first_column = ['']*len(sequence)
-        f = open("sin_square_with_plateau.csv", "w")
-        f.write('Table Instance ; 1\n')
-        for i in range(len(sequence)):
-            f.write(first_column[i]+'; '+str(sequence[i][0])+'\n')
-        f.close()
-
-def general_sigmoid_offset(offset_time, ramp_time, high_time, high_power, sampling_time, csvfile = None):
+        write_csvfile(sequence, "sin_square_with_plateau.csv")
+    return sequence
+
+def general_sigmoid_offset(offset_time, ramp_time, high_time, high_power, sampling_time, csvfile = None, plot=False):
     """"
     All times in us
+    Returns the sequence as float32 array, ready for LUT_DownloadEngine.download_tables
     csvfile = None --> LT not stored
     csvfile = Path --> LT saved in path
+    plot = True --> sequence is plotted
     """
-    
+
     high_points = high_time//sampling_time
     ramp_points = ramp_time//sampling_time
     offset_points = offset_time//sampling_time
@@ -37,18 +59,10 @@ def general_sigmoid_offset(offset_time, ramp_time, high_time, high_power, sampli
     ramp_up = high_power * np.sin(ramp_angles)**2
     ramp_down = high_power * np.sin(ramp_angles+np.pi/2)**2
     high = np.ones(int(high_points))*high_power
-    offset = np.zeros(int(high_points))*high_power
-    sequence = np.concatenate((offset,ramp_up,high,ramp_down, offset))
-    x = np.arange(0,len(sequence))*sampling_time
-    plt.plot(x/1000,sequence)
-    plt.xlabel('Time (ms)')
-    plt.ylabel('Power(W)')
-    plt.show()
+    offset = np.zeros(int(offset_points))
+    sequence = np.concatenate((offset,ramp_up,high,ramp_down, offset)).astype(np.float32)
+    if plot:
+        plot_sequence(sequence, sampling_time)
     if csvfile != None:
-        sequence = sequence.reshape(-1, 1)
-        first_column = ['']*len(sequence)
-        f = open(csvfile, "w")
-        f.write('Table Instance ; 1\n')
-        for i in range(len(sequence)):
-            f.write(first_column[i]+'; '+str(sequence[i][0])+'\n')
-        f.close()
\ No newline at end of file
+        write_csvfile(sequence, csvfile)
+    return sequence
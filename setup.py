@@ -4,11 +4,11 @@ setup(
     name='mecom',
     version='0.1',
     packages=['mecom'],
-    install_requires = ['pySerial>=3.4',
-                        'pythoncrc', 'numpy', 'matplotlib'],
+    install_requires = ['pySerial>=3.4', 'numpy', 'matplotlib'],
     url='https://github.com/spomjaksilp/pyMeCom',
     license='',
     author='Suthep Pomjaksilp',
     author_email='pomjaksi@physik.uni-kl.de',
-    description='Python interface for Meerstetter TEC controller devices'
+    description='Python interface for Meerstetter TEC controller devices',
+    entry_points={'console_scripts': ['mecom-server = mecom.server:main']},
 )
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Fixtures shared by the tests.
+"""
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def hold_first_read():
+    """
+    Returns hold(mc), which makes the first VR query of the session mc wait once it has been answered. hold returns
+    the events (read, release): read is set when the value has been read, the query returns once release is set.
+    """
+    releases = []
+
+    def hold(mc):
+        execute = mc._execute
+        read = threading.Event()
+        release = threading.Event()
+        releases.append(release)
+
+        def slow_execute(query):
+            query = execute(query)
+            if type(query).__name__ == "VR" and not read.is_set():
+                read.set()
+                release.wait()
+            return query
+
+        mc._execute = slow_execute
+        return read, release
+
+    yield hold
+    # a failed test does not leave the query waiting
+    for release in releases:
+        release.set()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+from serial import Serial, SerialException
+
+from mecom.async_mecom import AsyncMeCom
+from mecom.simulator import SimulatedDevice, PtySimulator
+
+
+class SlowSerial(Serial):
+    """
+    Serial port which needs 0.2 s to write a frame.
+    """
+
+    def write(self, data):
+        time.sleep(0.2)
+        return super(SlowSerial, self).write(data)
+
+
+def test_serial_instance():
+    with PtySimulator(SimulatedDevice(address=1)) as sim:
+        async def run():
+            async with AsyncMeCom(serial_instance=Serial(sim.port, timeout=0), metype="TEC") as mc:
+                return await mc.get_parameter(parameter_name="Device Address", address=1)
+
+        assert asyncio.run(run()) == 1
+
+
+def test_write_does_not_block_loop():
+    with PtySimulator(SimulatedDevice(address=1)) as sim:
+        async def run():
+            ticks = []
+
+            async def tick():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+
+            async with AsyncMeCom(serial_instance=SlowSerial(sim.port, timeout=0), metype="TEC") as mc:
+                ticker = asyncio.ensure_future(tick())
+                await asyncio.sleep(0)
+                await mc.get_parameter(parameter_name="Device Address", address=1)
+                ticker.cancel()
+            return ticks
+
+        ticks = asyncio.run(run())
+        # the loop kept running while the frame was written
+        assert len(ticks) > 5
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+
+class FailingSerial(Serial):
+    """
+    Serial port which fails on read once fail is set.
+    """
+    fail = False
+
+    def read(self, size=1):
+        if self.fail:
+            raise SerialException("device disconnected")
+        return super(FailingSerial, self).read(size)
+
+
+class ReversingPty(PtySimulator):
+    """
+    Holds the responses until four have been computed and sends them in reverse order.
+    """
+
+    def __init__(self, devices):
+        self._held = []
+        super(ReversingPty, self).__init__(devices)
+
+    def _respond(self, data):
+        self._held += super(ReversingPty, self)._respond(data)
+        if len(self._held) < 4:
+            return []
+        responses, self._held = self._held[::-1], []
+        return responses
+
+
+def test_concurrent_queries_get_their_replies():
+    device = SimulatedDevice(address=1)
+    device.set("Object Temperature", 20.0, instance=1)
+    device.set("Object Temperature", 21.0, instance=2)
+    expected = [20.0, 21.0, device.get(104), 1] * 4
+    with ReversingPty(device) as sim:
+        async def run():
+            async with AsyncMeCom(sim.port, metype="TEC", pipeline_depth=4) as mc:
+                queries = [mc.get_parameter(parameter_id=parameter_id, address=1, parameter_instance=instance)
+                           for i in range(4) for parameter_id, instance in ((1000, 1), (1000, 2), (104, 1),
+                                                                            (2051, 1))]
+                return await asyncio.gather(*queries)
+
+        # four queries are in flight and answered last first
+        assert asyncio.run(run()) == expected
+
+
+def test_serial_error_fails_pending_queries():
+    with PtySimulator(SimulatedDevice(address=1), latency=0.05) as sim:
+        async def run():
+            ser = FailingSerial(sim.port, timeout=0)
+            async with AsyncMeCom(serial_instance=ser, metype="TEC", timeout=5) as mc:
+                ser.fail = True
+                start = time.monotonic()
+                with pytest.raises(SerialException):
+                    await mc.get_parameter(parameter_id=1000, address=1)
+                # the query did not wait for its timeout
+                assert time.monotonic() - start < 1
+                with pytest.raises(SerialException):
+                    await mc.get_parameter(parameter_id=1000, address=1)
+
+        asyncio.run(run())
+
+
+def test_reopen():
+    with PtySimulator(SimulatedDevice(address=1)) as sim:
+        async def run():
+            mc = AsyncMeCom(sim.port, metype="TEC")
+            values = []
+            for i in range(2):
+                async with mc:
+                    values.append(await mc.get_parameter(parameter_name="Device Address", address=1))
+            return values
+
+        assert asyncio.run(run()) == [1, 1]
@@ -0,0 +1,90 @@
+"""
+MeComBus on a simulated multi-drop line.
+"""
+
+import threading
+
+from mecom import MeCom
+from mecom.bus import MeComBus
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+class MalformedDevice(SimulatedDevice):
+    """
+    Answers every query with a frame which has a valid checksum but a garbled payload.
+    """
+
+    def handle(self, frame):
+        response = super(MalformedDevice, self).handle(frame)
+        if response is None:
+            return None
+        return self._frame(int(frame[3:7], 16), b"ZZZZZZZZ")
+
+
+def make_bus(devices, timeout=1):
+    return MeComBus(MeCom(serial_instance=FakeSerial(devices, timeout=timeout), metype="TEC"))
+
+
+def test_discover():
+    bus = make_bus([SimulatedDevice(address=1), SimulatedDevice(address=3), SimulatedDevice(address=7)])
+    assert bus.discover(range(1, 10), timeout=0.01) == [1, 3, 7]
+    assert sorted(bus.devices) == [1, 3, 7]
+    # the timeout of the port is restored
+    assert bus.session.ser.timeout == 1
+
+
+def test_discover_skips_device_errors():
+    refusing = SimulatedDevice(address=2)
+    refusing.values.pop((refusing._ids["Device Address"], 1))
+    bus = make_bus([SimulatedDevice(address=1), refusing, SimulatedDevice(address=3)])
+    assert bus.discover(range(1, 5), timeout=0.01) == [1, 3]
+
+
+def test_discover_skips_malformed_replies():
+    bus = make_bus([SimulatedDevice(address=1), MalformedDevice(address=2), SimulatedDevice(address=3)])
+    assert bus.discover(range(1, 5), timeout=0.01) == [1, 3]
+
+
+def test_discover_holds_the_port():
+    bus = make_bus([SimulatedDevice(address=1)])
+    timeouts = []
+
+    def read():
+        with bus.session.ser_lock:
+            timeouts.append(bus.session.ser.timeout)
+
+    scan = threading.Thread(target=bus.discover, args=(range(1, 20), 0.01))
+    scan.start()
+    while scan.is_alive():
+        read()
+    scan.join()
+    # other threads only get the port with its own timeout
+    assert set(timeouts) == {1}
+
+
+def test_poll_serves_all_devices():
+    devices = [SimulatedDevice(address=address) for address in (1, 2, 3)]
+    samples = []
+    bus = make_bus(devices)
+    bus.on_sample = lambda *sample: samples.append(sample)
+    for device in devices:
+        device.set("Object Temperature", 20.0 + device.address, instance=1)
+        bus.add(device.address, "Object Temperature", interval=0.0)
+        bus.add(device.address, "Device Status", interval=0.0)
+    for i in range(3):
+        bus.poll()
+    assert sorted({(address, value) for address, name, instance, value, timestamp in samples
+                   if name == "Object Temperature"}) == [(1, 21.0), (2, 22.0), (3, 23.0)]
+    stats = bus.stats()
+    assert all(stats[address]["queries"] == 6 for address in (1, 2, 3))
+
+
+def test_poll_survives_a_silent_device():
+    present = SimulatedDevice(address=1)
+    bus = make_bus([present], timeout=0.01)
+    bus.add(1, "Object Temperature", interval=0.0)
+    bus.add(5, "Object Temperature", interval=0.0)
+    samples = bus.poll()
+    assert [sample[0] for sample in samples] == [1]
+    stats = bus.stats()
+    assert stats[5]["timeouts"] == 1 and stats[1]["queries"] == 1
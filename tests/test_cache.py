@@ -0,0 +1,92 @@
+"""
+ParameterCache on its own and within a session.
+"""
+
+import threading
+
+from mecom import MeCom, ParameterCache
+from mecom.mecom import ParameterList
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+PARAMETERS = ParameterList.get("TEC")
+TEMPERATURE = PARAMETERS.get_by_id(1000)
+TARGET = PARAMETERS.get_by_id(3000)
+ADDRESS = PARAMETERS.get_by_name("Device Address")
+
+
+def test_get_and_put():
+    cache = ParameterCache(default_ttl=10)
+    assert cache.get(1, TEMPERATURE, 1) is None
+    cache.put(1, TEMPERATURE, 1, 25.0)
+    assert cache.get(1, TEMPERATURE, 1) == 25.0
+    assert cache.get(1, TEMPERATURE, 2) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_zero_is_not_cached():
+    cache = ParameterCache(default_ttl=10, ttl={1000: 0})
+    cache.put(1, TEMPERATURE, 1, 25.0)
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = ParameterCache(default_ttl=10, maxsize=2)
+    for instance in (1, 2, 3):
+        cache.put(1, TEMPERATURE, instance, 20.0 + instance)
+    assert cache.get(1, TEMPERATURE, 1) is None
+    assert cache.get(1, TEMPERATURE, 3) == 23.0
+    assert cache.evictions == 1
+
+
+def test_written():
+    cache = ParameterCache(default_ttl=10, write_through=True)
+    cache.written(1, TARGET, 1, 30.0)
+    assert cache.get(1, TARGET, 1) == 30.0
+    # a rejected write drops the entry
+    cache.written(1, TARGET, 1, 40.0, acknowledged=False)
+    assert cache.get(1, TARGET, 1) is None
+    cache.put(1, TARGET, 1, 30.0)
+    cache.put(1, TEMPERATURE, 1, 25.0)
+    cache.put(2, TEMPERATURE, 1, 25.0)
+    cache.written(1, ADDRESS, 1, 5)
+    assert cache.get(1, TARGET, 1) is None and cache.get(1, TEMPERATURE, 1) is None
+    assert cache.get(2, TEMPERATURE, 1) == 25.0
+
+
+def test_stale_put_after_invalidate():
+    cache = ParameterCache(default_ttl=10)
+    generation = cache.generation
+    cache.invalidate(1, TARGET, 1)
+    cache.put(1, TARGET, 1, 25.0, generation)
+    assert cache.get(1, TARGET, 1) is None
+    # other values are not affected
+    cache.put(1, TEMPERATURE, 1, 25.0, generation)
+    assert cache.get(1, TEMPERATURE, 1) == 25.0
+    # an invalidation of the whole address is
+    generation = cache.generation
+    cache.invalidate(address=1)
+    cache.put(1, TEMPERATURE, 1, 25.0, generation)
+    assert cache.get(1, TEMPERATURE, 1) is None
+
+
+def test_stale_put_after_write_through():
+    cache = ParameterCache(default_ttl=10, write_through=True)
+    generation = cache.generation
+    cache.written(1, TARGET, 1, 30.0)
+    cache.put(1, TARGET, 1, 25.0, generation)
+    assert cache.get(1, TARGET, 1) == 30.0
+
+
+def test_read_overlapping_a_write_is_not_cached(hold_first_read):
+    device = SimulatedDevice(address=1)
+    mc = MeCom(serial_instance=FakeSerial(device), metype="TEC", cache=ParameterCache(default_ttl=10))
+    read, release = hold_first_read(mc)
+    values = []
+    reader = threading.Thread(target=lambda: values.append(mc.get_parameter(parameter_id=3000, address=1)))
+    reader.start()
+    read.wait()
+    assert mc.set_parameter(value=30.0, parameter_id=3000, address=1)
+    release.set()
+    reader.join()
+    assert values == [25.0]
+    assert mc.get_parameter(parameter_id=3000, address=1) == 30.0
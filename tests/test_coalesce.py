@@ -0,0 +1,55 @@
+"""
+Coalesced reads of a session shared by several threads.
+"""
+
+import threading
+import time
+
+from mecom import MeCom, ParameterCache
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def session(device, **kwargs):
+    return MeCom(serial_instance=FakeSerial(device, latency=0.002), metype="TEC", coalesce=True, **kwargs)
+
+
+def test_concurrent_reads_share_queries():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    values = []
+
+    def work():
+        for i in range(20):
+            values.append(mc.get_parameter(parameter_id=1000, address=1))
+
+    threads = [threading.Thread(target=work) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert values == [25.0] * 160
+    assert mc.coalesced > 0
+
+
+def test_no_join_of_a_read_started_before_a_write(hold_first_read):
+    device = SimulatedDevice(address=1)
+    mc = session(device, cache=ParameterCache(default_ttl=10))
+    read, release = hold_first_read(mc)
+    first = []
+    reader = threading.Thread(target=lambda: first.append(mc.get_parameter(parameter_id=3000, address=1)))
+    reader.start()
+    read.wait()
+    # the first read has its (old) value but has not finished yet
+    assert mc.set_parameter(value=30.0, parameter_id=3000, address=1)
+    second = []
+    later = threading.Thread(target=lambda: second.append(mc.get_parameter(parameter_id=3000, address=1,
+                                                                               use_cache=False)))
+    later.start()
+    time.sleep(0.05)
+    release.set()
+    reader.join()
+    later.join()
+    assert first == [25.0]
+    assert second == [30.0]
+    # the old value is not cached
+    assert mc.get_parameter(parameter_id=3000, address=1) == 30.0
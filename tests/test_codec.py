@@ -0,0 +1,57 @@
+"""
+Composing and decoding frames.
+"""
+
+import pytest
+
+from mecom.codec import encode_value, decode_value, query_payload
+from mecom.crc import crc16
+from mecom.exceptions import WrongChecksum
+from mecom.mecom import ParameterList, VR, VS, VRResponse
+
+PARAMETERS = ParameterList.get("TEC")
+
+
+def test_compose_vr():
+    query = VR(PARAMETERS.get_by_name("Object Temperature"), address=1, parameter_instance=2)
+    query.set_sequence(0x1234)
+    frame = query.compose()
+    assert frame[:-5] == b"#011234?VR03E802"
+    assert int(frame[-5:-1], 16) == crc16(frame[:-5])
+    assert frame.endswith(b"\r")
+
+
+def test_compose_vs():
+    query = VS(25.0, PARAMETERS.get_by_name("Target Object Temperature"), address=2)
+    query.set_sequence(1)
+    frame = query.compose()
+    assert frame[:-5] == b"#020001VS03F20141C80000"
+    assert int(frame[-5:-1], 16) == crc16(frame[:-5])
+
+
+def test_decompose_response():
+    frame = b"!010007" + b"41C80000"
+    frame += b"%04X" % crc16(frame)
+    response = VRResponse("FLOAT32")
+    response.decompose(frame[1:])
+    assert (response.ADDRESS, response.SEQUENCE, response.PAYLOAD) == (1, 7, [25.0])
+
+
+def test_wrong_checksum():
+    frame = b"!010007" + b"41C80000"
+    frame += b"%04X" % (crc16(frame) ^ 1)
+    with pytest.raises(WrongChecksum):
+        VRResponse("FLOAT32").decompose(frame[1:])
+
+
+@pytest.mark.parametrize("value, value_format, digits", [(25.0, "FLOAT32", b"41C80000"), (-1.5, "FLOAT32", b"BFC00000"),
+                                                          (1, "INT32", b"00000001"), (-2, "INT32", b"FFFFFFFE")])
+def test_value_round_trip(value, value_format, digits):
+    assert encode_value(value) == digits
+    assert decode_value(memoryview(b"010007" + digits), value_format) == value
+
+
+def test_query_payload():
+    assert query_payload("?VR", 1000, 1) == b"?VR03E801"
+    # formatted once
+    assert query_payload("?VR", 1000, 1) is query_payload("?VR", 1000, 1)
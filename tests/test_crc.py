@@ -0,0 +1,74 @@
+"""
+Checksums against bit by bit reference implementations on random data.
+"""
+
+import random
+
+import pytest
+
+from mecom.crc import crc16, crc32, CRC16, CRC32, _crc16_table, _crc32_table, _crc32_zlib
+
+
+def reference_crc16(data):
+    """
+    CRC-16/CCITT XModem bit by bit, as PyCRC's CRCCCITT computed it.
+    """
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+
+def reference_crc32(data):
+    """
+    The former LUT_CalcCrcOfByteArray with CRC32Calc.
+    """
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(32):
+            if crc & 0x80000000:
+                crc = (crc << 1) % (0xFFFFFFFF + 1)
+                crc = crc ^ 0x04C11DB7
+            else:
+                crc = (crc << 1) % 0xFFFFFFFF
+    return crc
+
+
+def random_data(seed, count=50, max_size=300):
+    rng = random.Random(seed)
+    return [bytes(rng.getrandbits(8) for _ in range(rng.randrange(max_size))) for _ in range(count)]
+
+
+def test_crc16_xmodem():
+    assert crc16(b"123456789") == 0x31C3
+    assert crc16(b"") == 0
+
+
+@pytest.mark.parametrize("function", [crc16, _crc16_table])
+def test_crc16_matches_reference(function):
+    for data in random_data(1):
+        assert function(data) == reference_crc16(data)
+
+
+@pytest.mark.parametrize("function", [crc32, _crc32_table, _crc32_zlib])
+def test_crc32_matches_reference(function):
+    for data in random_data(2):
+        assert function(data) == reference_crc32(data)
+
+
+@pytest.mark.parametrize("cls, reference", [(CRC16, reference_crc16), (CRC32, reference_crc32)])
+def test_incremental_update(cls, reference):
+    rng = random.Random(3)
+    for data in random_data(4, count=20):
+        checksum = cls()
+        offset = 0
+        while offset < len(data):
+            size = rng.randrange(1, 40)
+            # any bytes-like chunk
+            checksum.update(memoryview(data)[offset:offset + size])
+            offset += size
+        assert checksum.crc == reference(data)
+        assert cls(data).crc == reference(data)
@@ -0,0 +1,39 @@
+"""
+The frame reader against simulated devices.
+"""
+
+import pytest
+
+from mecom import MeCom
+from mecom.exceptions import ResponseTimeout
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def session(devices=None, timeout=1):
+    devices = devices or [SimulatedDevice(address=1)]
+    return MeCom(serial_instance=FakeSerial(devices, timeout=timeout), metype="TEC")
+
+
+def test_read_frame_splits_chunks():
+    mc = session()
+    mc.ser._received += b"!first\r!second\r!thi"
+    assert mc._read_frame() == b"!first"
+    assert mc._read_frame() == b"!second"
+    mc.ser._received += b"rd\r"
+    assert mc._read_frame() == b"!third"
+
+
+def test_read_frame_timeout():
+    mc = session(timeout=0.01)
+    mc.ser._received += b"!partial"
+    with pytest.raises(ResponseTimeout):
+        mc._read_frame()
+
+
+def test_get_and_set():
+    device = SimulatedDevice(address=1)
+    mc = session([device])
+    assert mc.get_parameter(parameter_name="Object Temperature", address=1) == device.get("Object Temperature")
+    assert mc.set_parameter(value=31.5, parameter_name="Target Object Temperature", address=1)
+    assert device.get("Target Object Temperature") == 31.5
+    assert mc.info(address=1).strip() == "SIMULATED MECOM"
@@ -0,0 +1,141 @@
+"""
+Lookup table downloads to a simulated device.
+"""
+
+import os
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from mecom import MeCom
+from mecom.exceptions import ResponseTimeout
+from mecom.lookup_table import LUT_DownloadEngine, LT_download_manager, LUT_MAX_FLOAT_COUNT, LUT_MAX_INST
+from mecom.retry import RetryPolicy
+from mecom.simulator import SimulatedDevice, FakeSerial, FaultInjector
+from pulses import pulses
+
+
+def engine(device, faults=None, **kwargs):
+    mc = MeCom(serial_instance=FakeSerial(device, timeout=0.01, faults=faults), metype="LDD")
+    return LUT_DownloadEngine(mc, address=1, **kwargs)
+
+
+def test_download_and_verify():
+    device = SimulatedDevice(address=1, metype="LDD")
+    lut = engine(device)
+    assert lut.download_tables({1: np.linspace(0, 1, 1000)})
+    assert lut.pages_sent == len(device.tables[1]) // lut.PAGE_SIZE
+    # an unchanged table is not sent again
+    assert lut.download_tables({1: np.linspace(0, 1, 1000)})
+    assert lut.pages_sent == 0
+
+
+def test_no_table_is_invalid():
+    device = SimulatedDevice(address=1, metype="LDD")
+    lut = engine(device)
+    assert not lut.verify()
+
+
+def test_lost_tables_are_sent_again():
+    device = SimulatedDevice(address=1, metype="LDD")
+    lut = engine(device)
+    assert lut.download_tables({1: np.linspace(0, 1, 1000)})
+    device.tables.clear()
+    assert lut.download_tables({1: np.linspace(0, 1, 1000)})
+    assert lut.pages_sent > 0 and 1 in device.tables
+
+
+def test_download_with_faults():
+    device = SimulatedDevice(address=1, metype="LDD")
+    lut = engine(device, faults=FaultInjector(drop=0.05, corrupt=0.05, seed=2), retries=10)
+    assert lut.download_tables({1: np.sin(np.linspace(0, 6, 2000)), 2: np.linspace(0, 1, 100)})
+
+
+def test_retries_back_off():
+    device = SimulatedDevice(address=1, metype="LDD")
+    lut = engine(device, faults=FaultInjector(drop=1.0), retries=3)
+    lut.session.retry = RetryPolicy(backoff=0.01, backoff_factor=2.0, max_backoff=1.0)
+    delays = []
+    sleep = time.sleep
+    time.sleep = lambda seconds: delays.append(seconds) or sleep(seconds)
+    try:
+        with pytest.raises(ResponseTimeout):
+            lut.download_tables({1: np.linspace(0, 1, 100)})
+    finally:
+        time.sleep = sleep
+    assert [delay for delay in delays if delay >= 0.01] == [0.01, 0.02, 0.04]
+
+
+def reference_images(path, max_count=LUT_MAX_FLOAT_COUNT, max_inst=LUT_MAX_INST):
+    """
+    The former LUT_OpenCSVFile: parses row by row, a column ends at its first field which is not a float, the
+    image is packed value by value and its CRC computed with the former bit loop.
+    Returns table instance -> image.
+    """
+    with open(path, 'r') as sr:
+        columns = sr.readline().strip().split(';')
+        assert columns[0] == "Table Instance"
+        instances = [int(column) for column in columns[1:]]
+        data = {instance: [] for instance in instances}
+        ended = set()
+        for line in sr:
+            columns = line.strip().split(';')
+            assert len(columns) == len(instances) + 1
+            for instance, field in zip(instances, columns[1:]):
+                if instance in ended:
+                    assert len(field) == 0
+                    continue
+                try:
+                    data[instance].append(float(field))
+                except ValueError:
+                    ended.add(instance)
+    assert all(len(values) <= max_count for values in data.values()) and len(instances) <= max_inst
+
+    images = {}
+    for instance, values in data.items():
+        length = len(values) * 4 + 12
+        image = [0] * length
+        image[4:8] = length.to_bytes(4, 'little')
+        image[8:12] = (0).to_bytes(4, 'little')
+        for i, value in enumerate(values):
+            image[12 + i * 4:16 + i * 4] = struct.unpack('<I', struct.pack('<f', value))[0].to_bytes(4, 'little')
+        crc = 0xFFFFFFFF
+        for byte in image[4:]:
+            crc ^= byte
+            for _ in range(32):
+                crc = ((crc << 1) ^ 0x04C11DB7) & 0xFFFFFFFF if crc & 0x80000000 else (crc << 1) & 0xFFFFFFFF
+        image[0:4] = crc.to_bytes(4, 'little')
+        images[instance] = bytes(image)
+    return images
+
+
+def loaded_images(path):
+    images, lengths, values = LT_download_manager(str(path), session=None).LUT_OpenCSVFile()
+    return {instance: images[instance - 1] for instance in range(1, LUT_MAX_INST + 1) if lengths[instance - 1] > 0}
+
+
+def test_csv_images_match_former_loader(tmp_path):
+    # the table shipped with the repo
+    bundled = os.path.join(os.path.dirname(__file__), os.pardir, "pulses", "LookupTable_test.csv")
+    assert loaded_images(bundled) == reference_images(bundled)
+
+    # a table written by pulses.py, with the header the former loader accepted
+    sequence = pulses.general_sigmoid_offset(100, 1000, 2000, 3.3, 10)
+    path = tmp_path / "pulse.csv"
+    pulses.write_csvfile(sequence, str(path), table_instance=2)
+    path.write_text(path.read_text().replace("Table Instance ; 2", "Table Instance;2"))
+    assert loaded_images(path) == reference_images(path)
+
+    # four full tables of random values, and columns of different lengths
+    rng = np.random.default_rng(9)
+    for rows, lengths in ((LUT_MAX_FLOAT_COUNT, (LUT_MAX_FLOAT_COUNT,) * 4), (50, (50, 2, 17, 49))):
+        values = rng.normal(0, 1e3, size=(rows, 4))
+        path = tmp_path / "random.csv"
+        with open(path, "w") as f:
+            f.write("Table Instance;3;1;4;2\n")
+            for row in range(rows):
+                f.write("".join([";{!r}".format(float(values[row, column])) if row < lengths[column] else ";"
+                                 for column in range(4)]) + "\n")
+        assert loaded_images(path) == reference_images(path)
@@ -0,0 +1,29 @@
+"""
+Metrics of a session shared by several threads.
+"""
+
+import threading
+
+from mecom import MeCom
+from mecom.metrics import Metrics
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def test_concurrent_queries_are_all_counted():
+    calls = []
+    metrics = Metrics(callback=lambda query, latency, error: calls.append(error))
+    mc = MeCom(serial_instance=FakeSerial(SimulatedDevice(address=1)), metype="TEC", metrics=metrics)
+
+    def work():
+        for i in range(200):
+            mc.get_parameter(parameter_id=1000, address=1)
+
+    threads = [threading.Thread(target=work) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = metrics.snapshot()
+    assert snapshot["latency"]["VR Object Temperature"]["count"] == 800
+    assert snapshot["lock_wait"]["count"] == 800
+    assert calls == [None] * 800
@@ -0,0 +1,53 @@
+"""
+Shared sessions of MeComPool on simulated ports.
+"""
+
+import threading
+import time
+
+from mecom import MeCom
+from mecom.pool import MeComPool
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def make_pool(**kwargs):
+    device = SimulatedDevice(address=1)
+    return MeComPool(factory=lambda serialport, **kw: MeCom(serial_instance=FakeSerial(device), **kw), **kwargs)
+
+
+def test_shared_session():
+    pool = make_pool()
+    with pool.acquire("sim", metype="TEC") as a, pool.acquire("sim", metype="TEC") as b:
+        assert a.session is b.session
+        assert a.get_parameter(parameter_id=1000, address=1) == 25.0
+    assert pool.opened == 1
+    pool.close()
+
+
+def test_invalidate_reopens():
+    pool = make_pool()
+    with pool.acquire("sim", metype="TEC") as mc:
+        first = mc.session
+        mc.invalidate()
+        assert not first.ser.is_open
+        assert mc.get_parameter(parameter_id=1000, address=1) == 25.0
+        assert mc.session is not first
+    assert pool.opened == 2
+    pool.close()
+
+
+def test_invalidate_waits_for_an_exchange():
+    pool = make_pool()
+    handle = pool.acquire("sim", metype="TEC")
+    session = handle.session
+    session.ser_lock.acquire()
+    closing = threading.Thread(target=handle.invalidate)
+    closing.start()
+    time.sleep(0.05)
+    # the port stays open while another thread holds the serial lock
+    assert session.ser.is_open
+    session.ser_lock.release()
+    closing.join()
+    assert not session.ser.is_open
+    handle.release()
+    pool.close()
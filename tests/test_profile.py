@@ -0,0 +1,43 @@
+"""
+Device profiles captured from and applied to simulated devices.
+"""
+
+import pytest
+
+from mecom import MeCom
+from mecom.exceptions import ResponseException
+from mecom.profile import DeviceProfile
+from mecom.retry import RetryPolicy
+from mecom.simulator import SimulatedDevice, FakeSerial, FaultInjector
+
+
+def session(device, faults=None, retry=None):
+    return MeCom(serial_instance=FakeSerial(device, timeout=0.01, faults=faults), metype="TEC", retry=retry)
+
+
+def test_capture_and_apply():
+    source = SimulatedDevice(address=1)
+    source.set(3000, 31.5)
+    profile = DeviceProfile.capture(session(source), address=1, instances=(1, 2))
+    target = SimulatedDevice(address=1)
+    mc = session(target)
+    assert profile.diff(mc, address=1)
+    results = profile.apply(mc, address=1, flash=False)
+    assert results and all(results.values())
+    assert target.get(3000, instance=2) == 31.5
+    assert profile.diff(mc, address=1) == {}
+
+
+def test_corrupted_replies_are_retried():
+    device = SimulatedDevice(address=1)
+    reference = DeviceProfile.capture(session(device), address=1)
+    profile = DeviceProfile.capture(session(device, FaultInjector(corrupt=0.2, seed=4), RetryPolicy(retries=10)),
+                                    address=1)
+    assert profile.values == reference.values
+
+
+def test_unread_parameters_raise():
+    device = SimulatedDevice(address=1)
+    mc = session(device, FaultInjector(corrupt=1.0, seed=4), RetryPolicy(retries=1))
+    with pytest.raises(ResponseException, match="instance 1"):
+        DeviceProfile.capture(mc, address=1)
@@ -0,0 +1,129 @@
+"""
+Pyramid and TelemetryReader: bounded folding, exact buckets, refresh and missing values.
+"""
+
+import numpy as np
+import pytest
+
+from mecom import MeCom
+from mecom.pyramid import TelemetryReader
+from mecom.recorder import TelemetryRecorder, TelemetryFile
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def recorder(tmp_path, **kwargs):
+    mc = MeCom(serial_instance=FakeSerial(SimulatedDevice(address=1)), metype="TEC")
+    rec = TelemetryRecorder(mc, str(tmp_path / "lab"), **kwargs)
+    rec.add("Object Temperature", address=1)
+    return rec
+
+
+def record_rows(rec, rows, start=0):
+    for i in range(start, start + rows):
+        rec.record([float(i)], timestamp=float(i))
+
+
+def expected(values, t0, t1, points):
+    """
+    The buckets of query() computed from all samples, the sample i is recorded at time i.
+    """
+    edges = t0 + np.arange(points + 1) * ((t1 - t0) / points)
+    edges[-1] = t1
+    times = np.arange(len(values), dtype=np.float64)
+    buckets = [(edge, values[(times >= edge) & (times < end)]) for edge, end in zip(edges, edges[1:])]
+    buckets = [(edge, bucket) for edge, bucket in buckets if len(bucket)]
+    return ([edge for edge, bucket in buckets], [np.nanmin(bucket) for edge, bucket in buckets],
+            [np.nanmax(bucket) for edge, bucket in buckets], [np.nanmean(bucket) for edge, bucket in buckets])
+
+
+def check(reader, values, t0, t1, points):
+    result = reader.query("Object Temperature", address=1, t0=t0, t1=t1, points=points)
+    for actual, wanted in zip(result, expected(values, t0, t1, points)):
+        assert actual == pytest.approx(wanted)
+
+
+def test_bins_straddling_the_window(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=100)
+    record_rows(rec, 5000)
+    rec.stop()
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=16)
+    times, minimum, maximum, mean = reader.query("Object Temperature", address=1, t0=1000, t1=1100, points=1)
+    assert (list(times), list(minimum), list(maximum), list(mean)) == ([1000.0], [1000.0], [1099.0], [1049.5])
+
+
+def test_windows(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=37)
+    record_rows(rec, 3000)
+    rec.stop()
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=4)
+    values = np.arange(3000, dtype=np.float64)
+    check(reader, values, 0.0, 3000.0, 7)
+    check(reader, values, -10.5, 3100.0, 50)
+    rng = np.random.default_rng(1)
+    for i in range(50):
+        t0, t1 = np.sort(rng.uniform(-10, 3010, 2))
+        check(reader, values, t0, t1, int(rng.integers(1, 40)))
+    # by default from the first to the last sample
+    times, minimum, maximum, mean = reader.query("Object Temperature", address=1, points=10)
+    assert list(times) == pytest.approx([299.9 * i for i in range(10)])
+    assert (minimum[0], maximum[-1]) == (0.0, 2999.0)
+
+
+def test_refresh(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=10)
+    record_rows(rec, 90)
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=4)
+    check(reader, np.arange(90.0), 0.0, 90.0, 3)
+    record_rows(rec, 205, start=90)
+    rec.stop()
+    reader.refresh()
+    check(reader, np.arange(295.0), 0.0, 295.0, 3)
+    check(reader, np.arange(295.0), 90.0, 200.0, 11)
+
+
+def test_missing_values(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=16)
+    values = np.arange(200, dtype=np.float64)
+    values[10:90] = np.nan
+    for i, value in enumerate(values):
+        rec.record([None if np.isnan(value) else value], timestamp=float(i))
+    rec.stop()
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=4)
+    times, minimum, maximum, mean = reader.query("Object Temperature", address=1, t0=0.0, t1=200.0, points=10)
+    # a bucket without valid samples is kept as NaN
+    assert np.isnan(minimum[1]) and np.isnan(maximum[2]) and np.isnan(mean[3])
+    check(reader, values, 5.0, 195.0, 4)
+
+
+def test_several_files(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=20, max_bytes=1000)
+    record_rows(rec, 400)
+    rec.stop()
+    assert len(rec.files) > 3
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=4)
+    check(reader, np.arange(400.0), 0.0, 400.0, 9)
+    check(reader, np.arange(400.0), 33.3, 333.3, 13)
+
+
+def test_update_reads_bounded_blocks(tmp_path, monkeypatch):
+    rec = recorder(tmp_path, chunk_rows=100)
+    record_rows(rec, 5000)
+    rec.stop()
+    reads = []
+    since = TelemetryFile.since
+
+    def recording_since(self, column, start, end=None):
+        reads.append((start, end))
+        return since(self, column, start, end)
+
+    monkeypatch.setattr(TelemetryFile, "since", recording_since)
+    reader = TelemetryReader(str(tmp_path / "lab-*.mtl"), factor=16)
+    reader.query("Object Temperature", address=1, points=10)
+    pyramid = reader._pyramid(rec.path, 0)
+    pyramid.block = 1024
+    pyramid.folded, pyramid.levels = 0, []
+    reads[:] = []
+    pyramid.update()
+    assert all(end is not None and end - start <= 1024 for start, end in reads)
+    assert pyramid.folded == 5000 // 16 * 16
+    check(reader, np.arange(5000.0), 123.0, 4321.0, 17)
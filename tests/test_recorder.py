@@ -0,0 +1,125 @@
+"""
+TelemetryRecorder and TelemetryFile: file format, chunks, rotation and missing values.
+"""
+
+import glob
+import time
+
+import numpy as np
+import pytest
+from serial import SerialException
+
+from mecom import MeCom
+from mecom.recorder import TelemetryRecorder, TelemetryFile, MISSING
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def recorder(tmp_path, device=None, **kwargs):
+    mc = MeCom(serial_instance=FakeSerial(device or SimulatedDevice(address=1)), metype="TEC")
+    rec = TelemetryRecorder(mc, str(tmp_path / "lab"), **kwargs)
+    rec.add("Object Temperature", address=1, instances=(1, 2))
+    rec.add("Device Status", address=1)
+    return rec
+
+
+def record_rows(rec, rows, start=0):
+    for i in range(start, start + rows):
+        rec.record([float(i), i + 0.5, i], timestamp=1000.0 + i)
+
+
+def test_round_trip(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=4)
+    record_rows(rec, 10)
+    rec.stop()
+    f = TelemetryFile(rec.path)
+    assert [column["name"] for column in f.columns] == ["Object Temperature"] * 2 + ["Device Status"]
+    assert len(f) == 10
+    assert [rows for offset, rows in f.chunks] == [4, 4, 2]
+    assert list(f.times()) == [1000.0 + i for i in range(10)]
+    times, values = f.read("Object Temperature", address=1, instance=2)
+    assert values.dtype == np.float32
+    assert list(values) == [i + 0.5 for i in range(10)]
+    times, values = f.read(104, address=1)
+    assert values.dtype == np.int32
+    assert list(values) == list(range(10))
+    with pytest.raises(KeyError):
+        f.read("Object Temperature", address=2)
+
+
+def test_window_across_chunks(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=4)
+    record_rows(rec, 20)
+    rec.stop()
+    f = TelemetryFile(rec.path)
+    times, values = f.read("Device Status", address=1, t0=1002.5, t1=1011.0)
+    assert list(values) == list(range(3, 11))
+    assert list(f.read("Device Status", address=1, t0=1018.0)[1]) == [18, 19]
+    assert list(f.read("Device Status", address=1, t1=1001.0)[1]) == [0]
+
+
+def test_missing_values(tmp_path):
+    rec = recorder(tmp_path)
+    rec.record([1.0, None, None], timestamp=1.0)
+    rec.record([None, 2.0, 3], timestamp=2.0)
+    rec.stop()
+    f = TelemetryFile(rec.path)
+    assert np.isnan(f.read("Object Temperature", address=1)[1][1])
+    assert list(np.isnan(f.read("Object Temperature", address=1, instance=2)[1])) == [True, False]
+    assert list(f.read("Device Status", address=1)[1]) == [MISSING[np.dtype(np.int32)], 3]
+
+
+def test_sample_records_unreadable_values_as_missing(tmp_path):
+    device = SimulatedDevice(address=1)
+    # instance 2 of the object temperature is not available
+    device.values.pop((1000, 2))
+    rec = recorder(tmp_path, device)
+    rec.sample()
+    transaction = rec.session.transaction
+
+    def disconnected(*args, **kwargs):
+        raise SerialException("device disconnected")
+
+    rec.session.transaction = disconnected
+    rec.sample()
+    rec.session.transaction = transaction
+    rec.sample()
+    rec.stop()
+    assert rec.errors == 3
+    f = TelemetryFile(rec.path)
+    assert len(f) == 2
+    assert list(f.read("Object Temperature", address=1)[1]) == [25.0, 25.0]
+    assert np.isnan(f.read("Object Temperature", address=1, instance=2)[1]).all()
+
+
+def test_refresh_and_truncated_chunks(tmp_path):
+    rec = recorder(tmp_path, chunk_rows=4)
+    record_rows(rec, 4)
+    f = TelemetryFile(rec.path)
+    assert len(f) == 4
+    record_rows(rec, 8, start=4)
+    # the start of a chunk, as seen while it is written
+    with open(rec.path, "rb") as source:
+        data = source.read()
+    start = f.chunks[0][0] - 16
+    with open(rec.path, "ab") as target:
+        target.write(data[start:start + 50])
+    assert f.refresh() == 2
+    assert len(f) == 12
+    assert f.refresh() == 0
+    assert list(f.read("Device Status", address=1)[1]) == list(range(12))
+
+
+def test_rotation(tmp_path, monkeypatch):
+    # all files are started within the same second
+    monkeypatch.setattr(time, "strftime", lambda format, t=None: "20260101-120000")
+    rec = recorder(tmp_path, chunk_rows=2, max_bytes=1)
+    record_rows(rec, 24)
+    rec.stop()
+    assert len(rec.files) == 12
+    assert sorted(glob.glob(str(tmp_path / "lab-*.mtl"))) == rec.files
+    times, values = TelemetryFile.load(str(tmp_path / "lab-*.mtl"), "Device Status", address=1)
+    assert list(values) == list(range(24))
+    assert (np.diff(times) > 0).all()
+    times, values = TelemetryFile.load(str(tmp_path / "lab-*.mtl"), "Device Status", address=1, t0=1005.0,
+                                       t1=1009.0)
+    assert list(values) == [5, 6, 7, 8]
@@ -0,0 +1,100 @@
+"""
+Retries and resynchronization after dropped, corrupted, stale and malformed replies.
+"""
+
+import pytest
+
+from mecom import MeCom
+from mecom.crc import crc16
+from mecom.exceptions import ResponseTimeout, WrongResponseSequence, MalformedResponse
+from mecom.mecom import ParameterList, VR
+from mecom.retry import RetryPolicy
+from mecom.simulator import SimulatedDevice, FakeSerial, FaultInjector
+
+PARAMETERS = ParameterList.get("TEC")
+
+
+def session(devices=None, timeout=1, faults=None, **kwargs):
+    devices = devices or [SimulatedDevice(address=1)]
+    return MeCom(serial_instance=FakeSerial(devices, timeout=timeout, faults=faults), metype="TEC", **kwargs)
+
+
+def test_no_retry_without_policy():
+    mc = session(timeout=0.01, faults=FaultInjector(drop=1.0))
+    with pytest.raises(ResponseTimeout):
+        mc.get_parameter(parameter_id=1000, address=1)
+
+
+@pytest.mark.parametrize("faults", [dict(drop=0.2), dict(corrupt=0.2), dict(drop=0.1, corrupt=0.1)])
+def test_retry(faults):
+    device = SimulatedDevice(address=1)
+    injector = FaultInjector(seed=3, **faults)
+    mc = session([device], timeout=0.01, faults=injector, retry=RetryPolicy(retries=10))
+    for i in range(50):
+        assert mc.get_parameter(parameter_id=1000, address=1) == device.get(1000)
+    assert mc.get_parameters([1000, 104, 1000, 104] * 10, address=1) == [device.get(1000), device.get(104)] * 20
+    assert injector.injected > 0
+
+
+def test_writes_are_not_retried():
+    mc = session(timeout=0.01, faults=FaultInjector(drop=1.0), retry=RetryPolicy(retries=10))
+    with pytest.raises(ResponseTimeout):
+        mc.set_parameter(value=20.0, parameter_name="Target Object Temperature", address=1)
+
+
+def test_retry_backoff():
+    policy = RetryPolicy(retries=5, backoff=0.01, backoff_factor=2.0, max_backoff=0.03)
+    assert [policy.delay(attempt) for attempt in (1, 2, 3, 4)] == [0.01, 0.02, 0.03, 0.03]
+
+
+@pytest.mark.parametrize("faults", [dict(wrong_sequence=0.2), dict(noise=0.2), dict(drop=0.1, noise=0.2)])
+def test_stale_replies_are_dropped(faults):
+    device = SimulatedDevice(address=1)
+    mc = session([device], timeout=0.01, faults=FaultInjector(seed=5, **faults), retry=RetryPolicy(retries=10))
+    for i in range(10):
+        assert mc.get_parameters([1000, 104, 1000] * 4, address=1) == [device.get(1000), device.get(104),
+                                                                      device.get(1000)] * 4
+
+
+def test_reply_must_fit_the_query():
+    query = VR(PARAMETERS.get_by_id(1000), address=1)
+    query.set_sequence(7)
+    # an ACK with the right sequence and checksum
+    frame = b"!010007"
+    frame += b"%04X" % crc16(frame)
+    with pytest.raises(WrongResponseSequence):
+        query.set_response(frame[1:])
+
+
+class GarblingDevice(SimulatedDevice):
+    """
+    Answers the first queries with frames which have a valid checksum but a payload which is not hex.
+    """
+
+    def __init__(self, garbled, **kwargs):
+        super(GarblingDevice, self).__init__(**kwargs)
+        self.garbled = garbled
+
+    def handle(self, frame):
+        response = super(GarblingDevice, self).handle(frame)
+        if response is None or self.garbled == 0:
+            return response
+        self.garbled -= 1
+        return self._frame(int(frame[3:7], 16), b"ZZZZZZZZ")
+
+
+def test_malformed_reply():
+    mc = session([GarblingDevice(garbled=1, address=1)])
+    with pytest.raises(MalformedResponse):
+        mc.get_parameter(parameter_id=1000, address=1)
+    assert mc.get_parameter(parameter_id=1000, address=1) == 25.0
+
+
+@pytest.mark.parametrize("depth", [1, 4])
+def test_malformed_replies_are_retried(depth):
+    device = GarblingDevice(garbled=3, address=1)
+    mc = session([device], retry=RetryPolicy(retries=5))
+    assert mc.get_parameters([1000, 104] * 4, address=1, depth=depth) == [25.0, device.get(104)] * 4
+    assert device.garbled == 0
+    device.garbled = 2
+    assert mc.get_parameter(parameter_id=1000, address=1) == 25.0
@@ -0,0 +1,136 @@
+"""
+mecom-server and RemoteMeCom against simulated devices.
+"""
+
+import socket
+import threading
+
+import pytest
+
+from mecom import MeCom, RemoteMeCom
+from mecom.exceptions import ResponseException
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+PORT = "/dev/ttySIM0"
+
+
+@pytest.fixture
+def devices():
+    return [SimulatedDevice(address=1), SimulatedDevice(address=2)]
+
+
+@pytest.fixture
+def server(devices, tmp_path):
+    from mecom.server import MeComServer
+
+    def factory(serialport, **kwargs):
+        kwargs.pop("timeout", None)
+        kwargs.pop("baudrate", None)
+        return MeCom(serial_instance=FakeSerial(devices), **kwargs)
+
+    with MeComServer({PORT: {"metype": "TEC"}}, socket_path=str(tmp_path / "mecom.sock"), factory=factory) as s:
+        yield s
+
+
+@pytest.fixture
+def client(server):
+    mc = RemoteMeCom(PORT, socket_path=server.socket_path)
+    yield mc
+    mc.stop()
+
+
+def test_read_and_write(client, devices):
+    assert client.get_parameter(parameter_name="Object Temperature", address=1) == devices[0].get(1000)
+    assert client.set_parameter(value=30.5, parameter_name="Target Object Temperature", address=2)
+    assert devices[1].get("Target Object Temperature") == 30.5
+    assert client.get_parameter(parameter_name="Target Object Temperature", address=2, use_cache=False) == 30.5
+    assert client.get_parameters(["Object Temperature", "Device Status"], address=1) == \
+        [devices[0].get(1000), devices[0].get(104)]
+
+
+def test_info_and_identify(client):
+    assert client.info(address=1).strip() == "SIMULATED MECOM"
+    assert client.identify(address=2) == 2
+
+
+def test_device_error(client, devices):
+    devices[0].values.pop((3000, 1))
+    with pytest.raises(ResponseException):
+        client.set_parameter(value=20.0, parameter_id=3000, address=1)
+    # the connection is still usable
+    assert client.identify(address=1) == 1
+
+
+def test_unserved_port(server):
+    with pytest.raises(ResponseException):
+        RemoteMeCom("/dev/nope", socket_path=server.socket_path)
+
+
+def test_metype_mismatch(server):
+    with pytest.raises(ValueError):
+        RemoteMeCom(PORT, socket_path=server.socket_path, metype="LDD")
+
+
+def test_concurrent_clients(server, devices):
+    clients = [RemoteMeCom(PORT, socket_path=server.socket_path) for i in range(4)]
+    results = []
+
+    def work(mc):
+        for i in range(20):
+            results.append(mc.get_parameters(["Object Temperature", "Device Status"], address=1, use_cache=False))
+
+    threads = [threading.Thread(target=work, args=(mc,)) for mc in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = clients[0].stats()
+    for mc in clients:
+        mc.stop()
+    assert results == [[devices[0].get(1000), devices[0].get(104)]] * 80
+    assert stats["queries"] == 160
+    assert stats["sent"] + stats["shared"] + stats["cached"] == 160
+
+
+def test_cached_reads(client):
+    client.get_parameter(parameter_id=1000, address=1)
+    client.get_parameter(parameter_id=1000, address=1)
+    assert client.stats()["cached"] >= 1
+
+
+def test_dispatcher_survives_errors(server, client):
+    session = server.dispatcher(PORT).handle.session
+    transaction = session.transaction
+
+    def broken(*args, **kwargs):
+        session.transaction = transaction
+        raise RuntimeError("decoder bug")
+
+    session.transaction = broken
+    with pytest.raises(ResponseException):
+        client.get_parameter(parameter_id=1000, address=1, use_cache=False)
+    # the dispatcher keeps serving
+    assert client.identify(address=1) == 1
+
+
+def test_socket_of_running_server_is_kept(server):
+    from mecom.server import MeComServer
+    with pytest.raises(OSError, match="another mecom-server"):
+        MeComServer({PORT: {"metype": "TEC"}}, socket_path=server.socket_path)
+    # the running server still answers
+    mc = RemoteMeCom(PORT, socket_path=server.socket_path)
+    assert mc.identify(address=1) == 1
+    mc.stop()
+
+
+def test_stale_socket_is_replaced(tmp_path, devices):
+    from mecom.server import MeComServer
+    path = str(tmp_path / "mecom.sock")
+    # bound by a server which was killed, nobody listens
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    with MeComServer({PORT: {"metype": "TEC"}}, socket_path=path) as s:
+        assert s.socket_path == path
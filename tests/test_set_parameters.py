@@ -0,0 +1,86 @@
+"""
+MeCom.set_parameters() against simulated devices.
+"""
+
+import pytest
+
+from mecom import MeCom, ParameterCache
+from mecom.mecom import ParameterList
+from mecom.simulator import SimulatedDevice, FakeSerial, EER_FORMAT
+
+PARAMETERS = ParameterList.get("TEC")
+
+
+class PickyDevice(SimulatedDevice):
+    """
+    Refuses to set the parameters in rejected and stores the values of FLOAT32 parameters rounded to 1/4096.
+    """
+
+    def __init__(self, rejected=(), **kwargs):
+        super(PickyDevice, self).__init__(**kwargs)
+        self.rejected = rejected
+
+    def handle(self, frame):
+        payload = frame[7:-4]
+        if payload.startswith(b"VS"):
+            parameter_id = int(payload[2:6], 16)
+            if parameter_id in self.rejected:
+                return self._error(int(frame[3:7], 16), EER_FORMAT)
+        response = super(PickyDevice, self).handle(frame)
+        for key, value in self.values.items():
+            if isinstance(value, float):
+                self.values[key] = round(value * 4096) / 4096
+        return response
+
+
+def session(device, **kwargs):
+    return MeCom(serial_instance=FakeSerial(device), metype="TEC", **kwargs)
+
+
+def test_set_parameters():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    results = mc.set_parameters({"Target Object Temp (Set)": 30.0, 2030: 2.5, "Status": 1}, address=1)
+    assert results == {"Target Object Temp (Set)": True, 2030: True, "Status": True}
+    assert (device.get(3000), device.get(2030), device.get(2010)) == (30.0, 2.5, 1)
+
+
+@pytest.mark.parametrize("values", [{"Status": 2.5}, {"Current Limitation": "high"},
+                                    {"Current Limitation": 1e39}, {"Status": 2 ** 31}])
+def test_invalid_values_are_not_sent(values):
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    with pytest.raises(ValueError):
+        mc.set_parameters(dict({"Target Object Temp (Set)": 30.0}, **values), address=1)
+    # nothing was sent, not even the valid value
+    assert mc.ser.bytes_written == 0
+    assert device.get(3000) == 25.0
+
+
+def test_result_per_parameter():
+    device = PickyDevice(rejected=(2030,), address=1)
+    mc = session(device)
+    results = mc.set_parameters({3000: 30.0, 2030: 2.5, 2010: 1}, address=1)
+    assert results == {3000: True, 2030: False, 2010: True}
+    assert device.get(2010) == 1
+
+
+def test_verify():
+    device = PickyDevice(rejected=(2030,), address=1)
+    mc = session(device)
+    values = {3000: 30.1, 2030: 2.5, 2031: 0.1}
+    # the device rounds 30.1 and 0.1 to multiples of 1/4096
+    assert mc.set_parameters(values, address=1, verify=True) == {3000: True, 2030: False, 2031: True}
+    assert mc.set_parameters(values, address=1, verify=True, tolerance=1e-6) == {3000: False, 2030: False,
+                                                                                  2031: False}
+
+
+def test_only_acknowledged_values_are_written_through():
+    device = PickyDevice(rejected=(2030,), address=1)
+    cache = ParameterCache(default_ttl=10, write_through=True)
+    mc = session(device, cache=cache)
+    cache.put(1, PARAMETERS.get_by_id(2030), 1, 1.0)
+    mc.set_parameters({3000: 30.0, 2030: 2.5}, address=1)
+    assert cache.get(1, PARAMETERS.get_by_id(3000), 1) == 30.0
+    # refused: the cached value is dropped, not replaced
+    assert cache.get(1, PARAMETERS.get_by_id(2030), 1) is None
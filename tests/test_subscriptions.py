@@ -0,0 +1,141 @@
+"""
+MeCom.subscribe() against a simulated device.
+"""
+
+import threading
+import time
+
+from serial import SerialException
+
+from mecom import MeCom
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def session(device):
+    mc = MeCom(serial_instance=FakeSerial(device), metype="TEC")
+    transaction = mc.transaction
+    # number of queries of every transaction
+    mc.transactions = []
+
+    def counting_transaction(queries, *args, **kwargs):
+        mc.transactions.append(len(queries))
+        return transaction(queries, *args, **kwargs)
+
+    mc.transaction = counting_transaction
+    return mc
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.002)
+
+
+def wait_for_polls(mc, n=2):
+    # n polls started after the call, the last one read the current value
+    count = len(mc.transactions)
+    wait_until(lambda: len(mc.transactions) >= count + n)
+
+
+def test_first_value():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    first, second = [], []
+    mc.subscribe("Object Temperature", first.append, interval=10.0, deadband=100.0, address=1)
+    wait_until(lambda: first)
+    # a later listener gets the current value right away, not after the interval
+    mc.subscribe("Object Temperature", second.append, interval=10.0, deadband=100.0, address=1)
+    wait_until(lambda: second)
+    mc.stop()
+    assert first == second == [25.0]
+
+
+def test_deadband():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    values = []
+    mc.subscribe("Object Temperature", values.append, interval=0.005, deadband=0.5, address=1)
+    wait_until(lambda: values)
+    for value in (25.25, 25.75, 25.5, 25.0):
+        device.set("Object Temperature", value, instance=1)
+        wait_for_polls(mc)
+    mc.stop()
+    # changes are measured from the value notified last
+    assert values == [25.0, 25.75, 25.0]
+
+
+def test_listeners_share_reads():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    values = [[] for i in range(5)]
+    for listener in values:
+        mc.subscribe("Object Temperature", listener.append, interval=0.005, address=1)
+    mc.subscribe("Device Status", lambda value: None, interval=0.005, address=1)
+    wait_until(lambda: all(values))
+    device.set("Object Temperature", 30.0, instance=1)
+    wait_for_polls(mc)
+    mc.stop()
+    assert values == [[25.0, 30.0]] * 5
+    # one read of each value per poll, no matter how many listeners
+    assert max(mc.transactions) == 2
+
+
+def test_cancel():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    kept, cancelled = [], []
+    subscription = mc.subscribe("Object Temperature", cancelled.append, interval=0.005, address=1)
+    mc.subscribe("Device Status", kept.append, interval=0.005, address=1)
+    wait_until(lambda: cancelled and kept)
+    subscription.cancel()
+    device.set("Object Temperature", 30.0, instance=1)
+    wait_for_polls(mc)
+    assert cancelled == [25.0]
+    # the value without listeners is no longer read
+    assert mc.transactions[-1] == 1
+    mc.stop()
+
+
+def test_serial_errors():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    values = []
+    transaction = mc.transaction
+    failures = []
+
+    def failing_transaction(queries, *args, **kwargs):
+        if values and len(failures) < 2:
+            failures.append(None)
+            raise SerialException("device disconnected")
+        return transaction(queries, *args, **kwargs)
+
+    mc.transaction = failing_transaction
+    mc.subscribe("Object Temperature", values.append, interval=0.005, address=1)
+    wait_until(lambda: len(values) == 3)
+    mc.stop()
+    # unreadable while disconnected, notified again once it can be read
+    assert values == [25.0, None, 25.0]
+    assert mc._subscriptions.errors == 2
+
+
+def test_stop_from_callback():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    errors = []
+    stopped = threading.Event()
+
+    def stop(value):
+        try:
+            mc._subscriptions.stop()
+        except Exception as ex:
+            errors.append(ex)
+        stopped.set()
+
+    mc.subscribe("Object Temperature", stop, interval=0.005, address=1)
+    thread = mc._subscriptions._thread
+    assert stopped.wait(2.0)
+    thread.join(2.0)
+    assert not thread.is_alive()
+    assert errors == []
+    mc.stop()
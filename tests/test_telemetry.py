@@ -0,0 +1,105 @@
+"""
+RingBuffer and TelemetryPoller against a simulated device.
+"""
+
+import time
+
+import numpy as np
+import pytest
+from serial import SerialException
+
+from mecom import MeCom
+from mecom.telemetry import RingBuffer, TelemetryPoller
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+
+def filled(capacity, count, spare=None):
+    buffer = RingBuffer(capacity, spare=spare)
+    for i in range(count):
+        buffer.append(float(i), 10.0 * i)
+    return buffer
+
+
+@pytest.mark.parametrize("count", [3, 4, 5, 6, 7, 23, 24, 25])
+def test_wraparound(count):
+    buffer = filled(4, count, spare=2)
+    times, values = buffer.latest()
+    expected = np.arange(max(0, count - 4), count, dtype=float)
+    assert len(buffer) == min(count, 4)
+    assert list(times) == list(expected)
+    assert list(values) == list(10.0 * expected)
+    assert list(buffer.latest(2)[0]) == list(expected[-2:])
+
+
+def test_views_are_not_copied():
+    buffer = filled(4, 9, spare=2)
+    times, values = buffer.latest()
+    assert np.shares_memory(times, buffer.times) and np.shares_memory(values, buffer.values)
+    assert not values.flags.writeable
+    window = buffer.window(6.0, 8.0)[1]
+    assert np.shares_memory(window, buffer.values)
+    assert list(window) == [60.0, 70.0]
+
+
+def test_views_survive_spare_appends():
+    buffer = filled(4, 9, spare=2)
+    times, values = buffer.latest()
+    kept = values.copy()
+    for i in range(9, 11):
+        buffer.append(float(i), 10.0 * i)
+    assert list(values) == list(kept)
+
+
+def test_window():
+    buffer = filled(5, 12)
+    assert list(buffer.window(8.0, 10.0)[0]) == [8.0, 9.0]
+    assert list(buffer.window(t0=9.5)[0]) == [10.0, 11.0]
+    assert list(buffer.window(t1=7.5)[0]) == [7.0]
+    assert len(buffer.window(20.0)[0]) == 0
+
+
+def poller(device, **kwargs):
+    mc = MeCom(serial_instance=FakeSerial(device), metype="TEC")
+    return TelemetryPoller(mc, address=1, **kwargs)
+
+
+def wait_for_samples(telemetry, parameter, n, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(telemetry.buffer(parameter)) < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_poller_samples():
+    device = SimulatedDevice(address=1)
+    telemetry = poller(device, capacity=100)
+    telemetry.add("Object Temperature", interval=0.002, instances=(1, 2))
+    telemetry.add("Device Status", interval=0.004)
+    with telemetry:
+        wait_for_samples(telemetry, "Object Temperature", 20)
+    times, values = telemetry.latest("Object Temperature", instance=2)
+    assert (np.diff(times) > 0).all()
+    assert (values == device.get("Object Temperature", instance=2)).all()
+    assert values.dtype == np.float32
+    assert telemetry.latest("Device Status")[1].dtype == np.int32
+    snapshot = telemetry.snapshot(10)
+    assert set(snapshot) == {("Object Temperature", 1), ("Object Temperature", 2), ("Device Status", 1)}
+    assert np.shares_memory(snapshot[("Device Status", 1)][1], telemetry.buffer("Device Status").values)
+
+
+def test_poller_survives_serial_errors():
+    telemetry = poller(SimulatedDevice(address=1))
+    telemetry.add("Object Temperature", interval=0.002)
+    transaction = telemetry.session.transaction
+    failures = []
+
+    def failing_transaction(queries, *args, **kwargs):
+        if len(failures) < 3:
+            failures.append(None)
+            raise SerialException("device disconnected")
+        return transaction(queries, *args, **kwargs)
+
+    telemetry.session.transaction = failing_transaction
+    with telemetry:
+        wait_for_samples(telemetry, "Object Temperature", 5)
+    assert telemetry.errors == 3
@@ -0,0 +1,54 @@
+"""
+Pipelined transactions and get_parameters() against a simulated device.
+"""
+
+import pytest
+
+from mecom import MeCom
+from mecom.exceptions import ResponseException
+from mecom.mecom import ParameterList, VR, VRResponse, DeviceError
+from mecom.simulator import SimulatedDevice, FakeSerial
+
+PARAMETERS = ParameterList.get("TEC")
+
+
+def session(devices):
+    return MeCom(serial_instance=FakeSerial(devices), metype="TEC")
+
+
+def test_pipelined_transaction():
+    device = SimulatedDevice(address=1)
+    for i, instance in enumerate((1, 2)):
+        device.set("Object Temperature", 20.0 + i, instance=instance)
+    mc = session([device])
+    writes = []
+    write = mc.ser.write
+    mc.ser.write = lambda data: writes.append(data) or write(data)
+
+    queries = [VR(PARAMETERS.get_by_name(name), address=1, parameter_instance=instance)
+               for i in range(4) for name in ("Object Temperature", "Device Status") for instance in (1, 2)]
+    mc.transaction(queries, depth=4)
+    assert [query.RESPONSE.PAYLOAD[0] for query in queries] == [20.0, 21.0, 2, 2] * 4
+    # the first four frames are sent together, then one frame per reply
+    assert len(writes) == len(queries) - 3
+    assert writes[0].count(b"\r") == 4
+
+
+def test_transaction_device_errors():
+    device = SimulatedDevice(address=1)
+    device.values.pop((1000, 2))
+    mc = session([device])
+    queries = [VR(PARAMETERS.get_by_id(1000), address=1, parameter_instance=instance) for instance in (1, 2)]
+    with pytest.raises(ResponseException):
+        mc.transaction(queries)
+    mc.transaction(queries, raise_errors=False)
+    assert type(queries[0].RESPONSE) is VRResponse
+    assert type(queries[1].RESPONSE) is DeviceError
+
+
+@pytest.mark.parametrize("depth", [1, 3, 8])
+def test_get_parameters_keeps_order(depth):
+    device = SimulatedDevice(address=1)
+    mc = session([device])
+    values = mc.get_parameters(["Object Temperature", 104, 1000] * 5, address=1, depth=depth)
+    assert values == [device.get(1000), device.get(104), device.get(1000)] * 5
@@ -0,0 +1,73 @@
+"""
+Polling with wait_for() and the helpers built on it.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from mecom import MeCom
+from mecom.async_mecom import AsyncMeCom
+from mecom.exceptions import ResponseTimeout
+from mecom.simulator import SimulatedDevice, FakeSerial, PtySimulator
+
+
+def session(device):
+    return MeCom(serial_instance=FakeSerial(device), metype="TEC")
+
+
+def test_wait_for_value():
+    device = SimulatedDevice(address=1)
+    device.set("Temperature is Stable", 1)
+    mc = session(device)
+    threading.Timer(0.05, device.set, ("Temperature is Stable", 2)).start()
+    value, elapsed = mc.wait_for("Temperature is Stable", 2, timeout=2.0, address=1)
+    assert value == 2
+    assert 0.04 < elapsed < 1.0
+
+
+def test_wait_for_predicate():
+    device = SimulatedDevice(address=1)
+    mc = session(device)
+    threading.Timer(0.05, device.set, ("Object Temperature", 31.0), {"instance": 2}).start()
+    value, elapsed = mc.wait_for(1000, lambda value: value > 30, timeout=2.0, address=1, parameter_instance=2)
+    assert value == 31.0
+
+
+def test_wait_for_timeout():
+    mc = session(SimulatedDevice(address=1))
+    with pytest.raises(ResponseTimeout):
+        mc.wait_for("Device Status", 0, timeout=0.05, address=1)
+
+
+def test_query_arguments_are_keyword_only():
+    mc = session(SimulatedDevice(address=1))
+    with pytest.raises(TypeError):
+        mc.wait_for("Device Status", 2, 1.0, 0.005, 0.5, 1)
+    with pytest.raises(TypeError):
+        mc.wait_until_stable(1.0, 1)
+
+
+def test_write_to_flash():
+    device = SimulatedDevice(address=1, flash_time=0.05)
+    mc = session([device])
+    assert mc.write_to_flash(timeout=1.0, address=1)
+    assert device.get("Save Data to Flash") == 1
+    with pytest.raises(TypeError):
+        # arguments of the queries are keyword-only
+        mc.write_to_flash(5, 1)
+
+
+def test_async_wait_for():
+    device = SimulatedDevice(address=1)
+    device.set("Temperature is Stable", 1)
+    with PtySimulator(device) as sim:
+        async def run():
+            async with AsyncMeCom(sim.port, metype="TEC") as mc:
+                asyncio.get_running_loop().call_later(0.05, device.set, "Temperature is Stable", 2)
+                return await mc.wait_for("Temperature is Stable", 2, timeout=2.0, address=1)
+
+        value, elapsed = asyncio.run(run())
+    assert value == 2
+    assert elapsed > 0.04
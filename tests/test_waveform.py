@@ -0,0 +1,90 @@
+"""
+Rendering, checking and compiling waveforms.
+"""
+
+import numpy as np
+import pytest
+
+from mecom.lookup_table import LT_download_manager, LUT_MAX_FLOAT_COUNT
+from mecom.waveform import Waveform
+
+LIMITS = (0.0, 12.0)
+
+
+def test_render_segments():
+    pulse = Waveform().plateau(20, 1.0).ramp(40, 1.0, 5.0).plateau(30).ramp(10, 5.0, 0.0)
+    table = pulse.render(interval=10)
+    assert table.dtype == np.float32
+    assert list(table) == [1.0, 1.0, 1.0, 2.0, 3.0, 4.0, 5.0, 5.0, 5.0, 5.0]
+    assert pulse.duration == 100.0
+    assert pulse.end == 0.0
+
+
+@pytest.mark.parametrize("kind", ["sin2", "sigmoid"])
+def test_render_smooth_ramps(kind):
+    table = getattr(Waveform(), kind)(1000, 2.0, 10.0).plateau(10).render(interval=10)
+    assert len(table) == 101
+    assert table[0] == pytest.approx(2.0)
+    assert table[-1] == 10.0
+    assert (np.diff(table) >= 0).all()
+    # symmetric around the middle
+    assert table[50] == pytest.approx(6.0)
+
+
+def test_render_samples():
+    table = Waveform().samples([0.0, 1.0, 2.0, 3.0], sampling_time=20).render(interval=10)
+    assert list(table) == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.0]
+
+
+def test_concatenation():
+    rise = Waveform().ramp(20, 0.0, 2.0)
+    fall = Waveform().ramp(20, 2.0, 0.0)
+    assert list((rise + fall).render(10)) == [0.0, 1.0, 2.0, 1.0]
+    assert len(rise.segments) == 1
+
+
+@pytest.mark.parametrize("table, message", [
+    (np.zeros(1), "values"),
+    (np.zeros(LUT_MAX_FLOAT_COUNT + 1), "values"),
+    (np.array([0.0, np.nan]), "finite"),
+    (np.array([0.0, 12.5]), "limits"),
+    (np.array([-0.1, 1.0]), "limits"),
+])
+def test_check(table, message):
+    with pytest.raises(ValueError, match=message):
+        Waveform().check(table, LIMITS)
+
+
+def test_limits_are_required():
+    with pytest.raises(TypeError):
+        Waveform().plateau(100, 1.0).compile(10)
+
+
+def test_compile():
+    pulse = Waveform().plateau(100, 0.0).sin2(500, 0.0, 10.0).plateau(1000).sin2(500, 10.0, 0.0)
+    image = pulse.compile(10, LIMITS)
+    assert image == LT_download_manager.LUT_BuildTableImage(pulse.render(10))
+    with pytest.raises(ValueError):
+        pulse.compile(10, (0.0, 5.0))
+
+
+def test_compile_cache(monkeypatch):
+    monkeypatch.setattr(Waveform, "_cache", type(Waveform._cache)())
+    monkeypatch.setattr(Waveform, "CACHE_SIZE", 2)
+    renders = []
+    render = Waveform.render
+    monkeypatch.setattr(Waveform, "render", lambda self, interval: renders.append(interval) or render(self, interval))
+
+    image = Waveform().ramp(100, 0.0, 1.0).compile(10, LIMITS)
+    # the same shape built again is not rendered again
+    assert Waveform().ramp(100, 0.0, 1.0).compile(10, LIMITS) is image
+    assert renders == [10]
+    # another interval, other limits or another shape are compiled
+    Waveform().ramp(100, 0.0, 1.0).compile(20, LIMITS)
+    Waveform().ramp(100, 0.0, 1.0).compile(10, (0.0, 2.0))
+    assert Waveform().ramp(100, 0.0, 2.0).key(10, LIMITS) != Waveform().ramp(100, 0.0, 1.0).key(10, LIMITS)
+    assert renders == [10, 20, 10]
+    # least recently used images are dropped
+    assert len(Waveform._cache) == 2
+    Waveform().ramp(100, 0.0, 1.0).compile(10, LIMITS)
+    assert renders == [10, 20, 10, 10]